@@ -0,0 +1,203 @@
+"""
+Overview
+benchmark of the stages of generate_fighter_stats.py on synthetic data at several scales
+
+for every scale, synthetic data is generated once with generate_synthetic_data.py and kept
+under .cache/synthetic, then every stage runs in a process of its own, with its inputs loaded
+from the stage cache, and is timed and measured for peak memory
+'inputs MB' is the memory of the process once the inputs of a stage are loaded, 'peak MB'
+the peak while the stage ran
+'scaling' is how the time of a stage grows with the number of fights between two scales,
+1 for linear and 2 for quadratic stages, so a stage that stops scaling shows up here first
+
+usage:
+python ./benchmark_feature_pipeline.py
+python ./benchmark_feature_pipeline.py --scales 10000 100000 1000000 --workers 4
+python ./benchmark_feature_pipeline.py --save before.json
+python ./benchmark_feature_pipeline.py --compare before.json
+"""
+
+# imports
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+
+# stages that are not part of the stage cache, they run after its last stage
+FINAL_STAGES = ["fight_stats_with_history", "write"]
+
+
+# run one stage in this process and print its measurements as json
+# the working directory is the directory of the synthetic data
+def measure_stage(name, workers):
+    import psutil
+    import generate_fighter_stats as GFS
+
+    pipeline = GFS.get_pipeline()
+    if name in FINAL_STAGES:
+        fighter_stats_df = pipeline.run("fighter_stats")
+        cumulative_history, fighter_history_df = pipeline.run("fighter_history")
+        inputs = [fighter_stats_df, fighter_history_df]
+        if name == "write":
+            inputs = [GFS.get_fight_stats_with_history(*inputs)]
+            del fighter_stats_df, fighter_history_df
+    else:
+        inputs = pipeline.inputs(name)
+    inputs_memory = psutil.Process().memory_info().rss
+
+    start = time.perf_counter()
+    if name == "fight_stats_with_history":
+        result = GFS.get_fight_stats_with_history(*inputs)
+    elif name == "write":
+        inputs[0].to_parquet(GFS.FIGHTER_STATS_FILE, index=False)
+        result = inputs[0]
+    else:
+        result = pipeline.compute(name, inputs, workers=workers)
+    elapsed = time.perf_counter() - start
+
+    if name not in FINAL_STAGES:
+        pipeline.save(name, result)
+    rows = len(result[0] if isinstance(result, tuple) else result)
+    print(
+        json.dumps(
+            {
+                "seconds": elapsed,
+                "inputs_mb": inputs_memory / 2**20,
+                "peak_mb": GFS.peak_memory() / 2**20,
+                "rows": rows,
+            }
+        )
+    )
+
+
+arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+arg_parser.add_argument(
+    "--scales", type=int, nargs="+", default=[10000, 100000], help="numbers of fights"
+)
+arg_parser.add_argument("--seed", type=int, default=0, help="random seed of the data")
+arg_parser.add_argument(
+    "--workers", type=int, default=1, help="--workers of the history stage"
+)
+arg_parser.add_argument(
+    "--data-dir",
+    default=os.path.join(".cache", "synthetic"),
+    help="synthetic data directory",
+)
+arg_parser.add_argument("--save", help="write the results to this json file")
+arg_parser.add_argument(
+    "--compare", help="compare the times with the results of --save"
+)
+arg_parser.add_argument("--stage", help=argparse.SUPPRESS)
+args = arg_parser.parse_args()
+
+if args.stage:
+    measure_stage(args.stage, args.workers)
+    sys.exit(0)
+
+import generate_fighter_stats as GFS
+
+baseline = {}
+if args.compare:
+    for result in json.load(open(args.compare)):
+        baseline[(result["fights"], result["stage"])] = result["seconds"]
+
+print(
+    "%9s %-26s %9s %9s %9s %9s %8s %9s"
+    % (
+        "fights",
+        "stage",
+        "rows",
+        "seconds",
+        "inputs MB",
+        "peak MB",
+        "scaling",
+        "vs saved",
+    )
+)
+results = []
+previous = {}
+for fights in sorted(args.scales):
+    directory = os.path.abspath(
+        os.path.join(args.data_dir, "%d-%d" % (fights, args.seed))
+    )
+    if not os.path.exists(os.path.join(directory, "ufc_fight_stats.csv")):
+        # in a process of its own too, as processes start with the peak memory of their parent
+        start = time.perf_counter()
+        subprocess.run(
+            [
+                sys.executable,
+                "generate_synthetic_data.py",
+                "--fights",
+                str(fights),
+                "--seed",
+                str(args.seed),
+                "--out",
+                directory,
+            ],
+            check=True,
+        )
+        print(
+            "%9d %-26s %9s %9.2f"
+            % (fights, "generate data", "", time.perf_counter() - start)
+        )
+
+    # every stage is computed again, the stage cache only passes results on to the next stage
+    working_directory = os.getcwd()
+    os.chdir(directory)
+    stage_names = GFS.get_pipeline(use_cache=False).names() + FINAL_STAGES
+    os.chdir(working_directory)
+    for name in stage_names:
+        process = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--stage",
+                name,
+                "--workers",
+                str(args.workers),
+            ],
+            cwd=directory,
+            env={**os.environ, "DATA_SOURCE": "csv"},
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            print("%9d %-26s failed" % (fights, name))
+            print(process.stderr.strip().split("\n")[-1])
+            break
+        result = json.loads(process.stdout.strip().split("\n")[-1])
+        result.update({"fights": fights, "stage": name})
+        results.append(result)
+
+        scaling = ""
+        if name in previous:
+            before = previous[name]
+            if before["seconds"] > 0 and result["seconds"] > 0:
+                scaling = "%.2f" % (
+                    math.log(result["seconds"] / before["seconds"])
+                    / math.log(fights / before["fights"])
+                )
+        compared = ""
+        if (fights, name) in baseline and baseline[(fights, name)] > 0:
+            compared = "%.2fx" % (result["seconds"] / baseline[(fights, name)])
+        previous[name] = result
+        print(
+            "%9d %-26s %9d %9.2f %9.1f %9.1f %8s %9s"
+            % (
+                fights,
+                name,
+                result["rows"],
+                result["seconds"],
+                result["inputs_mb"],
+                result["peak_mb"],
+                scaling,
+                compared,
+            )
+        )
+
+if args.save:
+    with open(args.save, "w") as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,138 @@
+"""
+Overview
+micro-benchmark of html parser backends over a corpus of saved pages
+
+pages are read from the scraper's response cache, so run the scraper at least once first
+for each type of page, every backend is timed building the soup alone ('soups/sec')
+and building the soup plus running the parse_* functions ('pages/sec')
+the output of every backend is compared with the output of 'html.parser' parsing the full page,
+which is how pages were always parsed, and any page with a different result is reported
+
+usage:
+python ./benchmark_html_parsers.py
+python ./benchmark_html_parsers.py --corpus .cache/ufcstats --limit 500 --repeat 3
+"""
+
+# imports
+import argparse
+import time
+
+# import library
+import scrape_ufc_stats_library as LIB
+from scrape_ufc_stats_cache import ResponseCache
+
+# import config
+import yaml
+
+config = yaml.safe_load(open("scrape_ufc_stats_config.yaml"))
+
+# backends to compare, as (parser, restricted)
+# the first backend is the reference the others are checked against
+BACKENDS = [
+    ("html.parser", False),
+    ("html.parser", True),
+    ("lxml", False),
+    ("lxml", True),
+]
+
+
+# parse a soup the same way the scraper does for each type of page
+def parse_page(page_type, url, soup):
+    if page_type == "event_listing":
+        return LIB.parse_event_details(soup).to_csv(index=False)
+    if page_type == "event":
+        return LIB.parse_fight_details(soup).to_csv(index=False)
+    if page_type == "fight":
+        fight_results_df, fight_stats_df = LIB.parse_organise_fight_results_and_stats(
+            soup,
+            url,
+            config["fight_results_column_names"],
+            config["totals_column_names"],
+            config["significant_strikes_column_names"],
+        )
+        return fight_results_df.to_csv(index=False) + fight_stats_df.to_csv(index=False)
+    if page_type == "fighter_listing":
+        fighter_details_df = LIB.parse_fighter_details(
+            soup, config["fighter_details_column_names"]
+        )
+        return fighter_details_df.to_csv(index=False) + str(
+            LIB.parse_fighter_listing_signatures(soup)
+        )
+    if page_type == "fighter":
+        fighter_tott = LIB.parse_fighter_tott(soup)
+        return LIB.organise_fighter_tott(
+            fighter_tott, config["fighter_tott_column_names"], url
+        ).to_csv(index=False)
+    return None
+
+
+# parse a page with a backend and return its output, or the error it raised
+def run_backend(page_type, url, content, parser, restricted):
+    try:
+        soup = LIB.make_soup(content, page_type, parser, restricted)
+        return parse_page(page_type, url, soup)
+    except Exception as e:
+        return "error: %r" % e
+
+
+arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+arg_parser.add_argument("--corpus", default=config["cache_dir"], help="response cache directory")
+arg_parser.add_argument("--limit", type=int, default=200, help="pages per page type")
+arg_parser.add_argument("--repeat", type=int, default=1, help="timed passes per backend")
+args = arg_parser.parse_args()
+
+corpus = ResponseCache(args.corpus, "replay")
+
+print(
+    "%-16s %-12s %-10s %7s %10s %10s %10s"
+    % ("page type", "parser", "restricted", "pages", "soups/sec", "pages/sec", "mismatch")
+)
+for page_type in ["event_listing", "event", "fight", "fighter_listing", "fighter"]:
+    # load pages of this type
+    pages = []
+    for url, content in corpus.items(page_type):
+        if len(pages) >= args.limit:
+            break
+        pages.append((url, content))
+    if not pages:
+        continue
+
+    # reference output
+    expected = [run_backend(page_type, url, content, *BACKENDS[0]) for url, content in pages]
+
+    for backend_parser, restricted in BACKENDS:
+        # check output against reference
+        mismatched = [
+            url
+            for (url, content), reference in zip(pages, expected)
+            if run_backend(page_type, url, content, backend_parser, restricted) != reference
+        ]
+
+        # time building soups only
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for url, content in pages:
+                LIB.make_soup(content, page_type, backend_parser, restricted)
+        soup_elapsed = time.perf_counter() - start
+
+        # time building and parsing soups
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for url, content in pages:
+                run_backend(page_type, url, content, backend_parser, restricted)
+        elapsed = time.perf_counter() - start
+
+        print(
+            "%-16s %-12s %-10s %7d %10.1f %10.1f %10d"
+            % (
+                page_type,
+                backend_parser,
+                restricted,
+                len(pages),
+                len(pages) * args.repeat / soup_elapsed,
+                len(pages) * args.repeat / elapsed,
+                len(mismatched),
+            )
+        )
+        for url in mismatched[:5]:
+            print("    mismatch: %s" % url)
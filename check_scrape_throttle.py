@@ -0,0 +1,158 @@
+"""
+Overview
+checks the fetcher's throttling, retries and error handling against a local fake server
+
+the server answers every page with its path, but injects the responses ufcstats.com sends when it is struggling
+a share of requests gets a 429 with a Retry-After header or a 503, paths under /missing always get a 404,
+paths under /broken always get a 503 and every path under /down of a second host always fails
+the fetcher is run with a fast throttle, so the checks take seconds, and each check prints ok or FAILED:
+- throttled pages are retried and every page comes back in order with its content
+- the rate of the host is lowered by the throttled responses
+- a page answering 404, or still failing after its retries, is handed to on_error and skipped,
+  while the pages around it are returned
+- a host that keeps failing stops the crawl with a CircuitOpenError instead of being skipped page by page
+
+usage:
+python ./check_scrape_throttle.py
+python ./check_scrape_throttle.py --pages 500 --throttled 0.3
+"""
+
+# imports
+import argparse
+import random
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# import fetcher
+from scrape_ufc_stats_fetcher import Fetcher
+from scrape_ufc_stats_throttle import CircuitOpenError, FetchError, Throttle
+
+
+# fake site, answers every page with its path unless an error is injected
+class FakeSite(BaseHTTPRequestHandler):
+    # share of requests answered 429 or 503, set from the arguments
+    throttled = 0.2
+    random = random.Random(0)
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            throttled = self.random.random() < self.throttled
+            status = self.random.choice([429, 503])
+        if self.path.startswith("/missing"):
+            return self.reply(404)
+        if self.path.startswith(("/broken", "/down")):
+            return self.reply(503)
+        if throttled:
+            return self.reply(status, {"Retry-After": "0"})
+        self.reply(200, body=self.path.encode())
+
+    def reply(self, status, headers={}, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# start a fake site on a free port and return its base url
+def start_site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSite)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:%d" % server.server_port
+
+
+# print outcome of a check
+def check(name, passed):
+    print("%-60s %s" % (name, "ok" if passed else "FAILED"))
+    return passed
+
+
+arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+arg_parser.add_argument("--pages", type=int, default=200, help="pages to fetch")
+arg_parser.add_argument(
+    "--throttled", type=float, default=0.2, help="share of requests answered 429 or 503"
+)
+arg_parser.add_argument("--workers", type=int, default=8, help="pages fetched at once")
+args = arg_parser.parse_args()
+
+FakeSite.throttled = args.throttled
+# two hosts, so the failing host does not trip the breaker of the other
+site, base_url = start_site()
+down_site, down_url = start_site()
+
+# fast settings, a slow start rate so throttling can only lower it to min_rate
+throttle = Throttle(
+    rate=100,
+    burst=20,
+    min_rate=10,
+    max_rate=200,
+    retries=8,
+    backoff_base=0.01,
+    backoff_max=0.05,
+    failure_threshold=5,
+    cooldown=0.05,
+    max_trips=3,
+)
+
+passed = True
+with Fetcher(max_workers=args.workers, timeout=5, throttle=throttle) as fetcher:
+    # pages with a missing and a broken page in the middle
+    urls = ["%s/page/%d" % (base_url, i) for i in range(args.pages)]
+    failing = [base_url + "/missing/1", base_url + "/broken/1"]
+    urls[len(urls) // 3 : len(urls) // 3] = failing[:1]
+    urls[2 * len(urls) // 3 : 2 * len(urls) // 3] = failing[1:]
+
+    skipped = {}
+    pages = list(fetcher.map(urls, on_error=lambda url, e: skipped.update({url: e})))
+    expected = [url for url in urls if url not in failing]
+    passed &= check(
+        "throttled pages are retried and returned in order",
+        [url for url, content in pages] == expected
+        and all(content == url[len(base_url) :].encode() for url, content in pages),
+    )
+    passed &= check(
+        "rate is lowered by throttled responses",
+        args.throttled == 0 or throttle.rate(base_url) < 100,
+    )
+    passed &= check(
+        "404 and failing pages are skipped with their status",
+        {url: e.status_code for url, e in skipped.items()}
+        == {base_url + "/missing/1": 404, base_url + "/broken/1": 503},
+    )
+
+    # without on_error the first failing page stops the list
+    try:
+        list(fetcher.map(failing))
+        raised = None
+    except FetchError as e:
+        raised = e
+    passed &= check(
+        "without on_error a failing page raises FetchError",
+        isinstance(raised, FetchError) and raised.url == failing[0],
+    )
+
+    # a host that keeps failing is not skipped page by page
+    try:
+        list(
+            fetcher.map(
+                ["%s/down/%d" % (down_url, i) for i in range(50)],
+                on_error=lambda url, e: None,
+            )
+        )
+        raised = None
+    except CircuitOpenError as e:
+        raised = e
+    passed &= check(
+        "a host that keeps failing raises CircuitOpenError",
+        isinstance(raised, CircuitOpenError),
+    )
+
+site.shutdown()
+down_site.shutdown()
+sys.exit(0 if passed else 1)
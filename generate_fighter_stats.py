@@ -1,420 +1,414 @@
+import argparse
+import os
+import sys
 import pandas as pd
 import numpy as np
-
-events_df = pd.read_csv("ufc_event_details.csv")
-
-column_mapping = {}
-for col in events_df.columns:
-    column_mapping[col] = col.lower()
-events_df = events_df.rename(mapper=column_mapping, errors="raise", axis=1)
-
-events_df["event"] = (
-    events_df["event"]
-    .str.replace(r"\s+", " ", regex=True)
-    .str.strip()
-    .str.lower()
-    .dropna()
-)
-events_df["date"] = pd.to_datetime(events_df["date"]).dropna()
-
-fight_results_df = pd.read_csv("./ufc_fight_results.csv")
-
-column_mapping = {}
-for col in fight_results_df.columns:
-    column_mapping[col] = col.lower()
-fight_results_df = fight_results_df.rename(
-    mapper=column_mapping, errors="raise", axis=1
-)
-
-fight_results_df = fight_results_df.dropna(
-    subset=["outcome", "weightclass", "bout", "event"]
-)
-fight_results_df = fight_results_df[
-    (~fight_results_df["outcome"].isin(["D/D", "NC/NC"]))
-]
-relevant_weight_classes = [
-    "Flyweight",
-    "Bantamweight",
-    "Featherweight",
-    "Lightweight",
-    "Welterweight",
-    "Middleweight",
-    "Light Heavyweight",
-]
-modded_relevant_weight_classes = []
-for weight_class in relevant_weight_classes:
-    modded_relevant_weight_classes.append(weight_class + " Bout")
-    modded_relevant_weight_classes.append("UFC " + weight_class + " Title Bout")
-    modded_relevant_weight_classes.append("UFC Interim " + weight_class + " Title Bout")
-fight_results_df = fight_results_df[
-    (fight_results_df["weightclass"].isin(modded_relevant_weight_classes))
-]
-weightclass_mapping = {
-    "Featherweight Bout": 145,
-    "UFC Featherweight Title Bout": 145,
-    "UFC Interim Featherweight Title Bout": 145,
-    "Bantamweight Bout": 135,
-    "UFC Bantamweight Title Bout": 135,
-    "UFC Interim Bantamweight Title Bout": 135,
-    "Lightweight Bout": 155,
-    "UFC Lightweight Title Bout": 155,
-    "UFC Interim Lightweight Title Bout": 155,
-    "Welterweight Bout": 170,
-    "UFC Welterweight Title Bout": 170,
-    "UFC Interim Welterweight Title Bout": 170,
-    "Middleweight Bout": 185,
-    "UFC Middleweight Title Bout": 185,
-    "UFC Interim Middleweight Title Bout": 185,
-    "Light Heavyweight Bout": 205,
-    "UFC Light Heavyweight Title Bout": 205,
-    "UFC Interim Light Heavyweight Title Bout": 205,
-    "Flyweight Bout": 125,
-    "UFC Flyweight Title Bout": 125,
-    "UFC Interim Flyweight Title Bout": 125,
-    "Heavyweight Bout": 255,
-    "UFC Heavyweight Title Bout": 255,
-    "UFC Interim Heavyweight Title Bout": 255,
-}
-fight_results_df["weightclass"] = fight_results_df["weightclass"].map(
-    weightclass_mapping
-)
-fight_results_df[["fighter_a", "fighter_b"]] = fight_results_df["bout"].str.split(
-    " vs. ", expand=True
-)
-fight_results_df["fighter_a"] = (
-    fight_results_df["fighter_a"].str.replace(r"\s+", " ", regex=True).str.strip()
-)
-fight_results_df["fighter_b"] = (
-    fight_results_df["fighter_b"].str.replace(r"\s+", " ", regex=True).str.strip()
-)
-fight_results_df["outcome"] = fight_results_df["outcome"].apply(
-    lambda x: 1 if x == "W/L" else 0
-)
-fight_results_df = fight_results_df[(fight_results_df["method"] != "dq ")]
-fight_results_df = fight_results_df.drop("referee", axis=1)
-fight_results_df = fight_results_df.drop("details", axis=1)
-fight_results_df["event"] = (
-    fight_results_df["event"]
-    .str.replace(r"\s+", " ", regex=True)
-    .str.strip()
-    .str.lower()
-)
-fight_results_df["bout"] = (
-    fight_results_df["bout"]
-    .str.replace(r"\s+", " ", regex=True)
-    .str.strip()
-    .str.lower()
-)
-fight_results_df["method"] = (
-    fight_results_df["method"]
-    .str.replace(r"\s+", " ", regex=True)
-    .str.strip()
-    .str.lower()
-    .apply(lambda x: "decision" if "decision" in x else x)
-)
-fight_results_df = fight_results_df[
-    (~fight_results_df["method"].isin(["tko - doctor's stoppage", "dq"]))
-]
-
-fight_results_df = pd.merge(
-    fight_results_df, events_df[["event", "date"]], on="event", how="left"
-).dropna()
-
-
-def time_to_seconds(t):
-    if pd.isnull(t):
-        return np.nan
-    if t == "0:00":
-        return 0
-    if "--" in t:
-        return np.nan
-    t = t.split(":")
-    return int(t[0]) * 60 + int(t[1])
-
-
-def fight_results_time(row):
-    returner = time_to_seconds(row["time"])
-    if pd.isnull(returner):
-        returner = row["round"] * 300
-    row["time"] = returner
-    return row
+import staging
+import lib.parsers as parsers
+import lib.stages as stages
+from concurrent.futures import ProcessPoolExecutor
+
+if sys.platform == "win32":
+    import psutil
+else:
+    import resource
+
+# feature matrix, typed and compressed so readers can load only the columns they need
+FIGHTER_STATS_FILE = "fighter_stats.parquet"
+FIGHTER_STATS_CSV_FILE = "fighter_stats.csv"
+# state of the last run, used to only add new fights in incremental mode
+FEATURE_STORE_FILE = "fighter_stats_store.pkl"
+# results of the stages of the last run, see get_pipeline()
+STAGE_CACHE_DIRECTORY = os.path.join(".cache", "fighter_stats")
+
+
+def peak_memory():
+    # peak resident memory of this process so far, in bytes
+    # worker processes of --workers are not included
+    if sys.platform == "win32":
+        return psutil.Process().memory_info().peak_wset
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macos reports bytes, linux kilobytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def print_peak_memory(stage):
+    # for --memory-report
+    print("%s: peak rss %.1f MB" % (stage, peak_memory() / 2**20))
+
+
+def read_events():
+    events_df = staging.read("event_details", "ufc_event_details.csv")
+
+    column_mapping = {}
+    for col in events_df.columns:
+        column_mapping[col] = col.lower()
+    events_df = events_df.rename(mapper=column_mapping, errors="raise", axis=1)
+
+    events_df["event"] = (
+        events_df["event"]
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.lower()
+        .dropna()
+    )
+    events_df["date"] = pd.to_datetime(events_df["date"]).dropna()
+    return events_df
 
 
-fight_results_df = (
-    fight_results_df.apply(fight_results_time, axis=1).apply(pd.Series).dropna()
-)
+def read_fight_results(events_df):
+    fight_results_df = staging.read("fight_results", "./ufc_fight_results.csv")
 
+    column_mapping = {}
+    for col in fight_results_df.columns:
+        column_mapping[col] = col.lower()
+    fight_results_df = fight_results_df.rename(
+        mapper=column_mapping, errors="raise", axis=1
+    )
 
-def total_duration(row):
-    returner = 0
-    if row["round"] == 1:
-        returner = row["time"]
-    returner = row["time"] + (row["round"] - 1) * 300
-    row["total_time"] = returner
-    return row
+    fight_results_df = fight_results_df.dropna(
+        subset=["outcome", "weightclass", "bout", "event"]
+    )
+    fight_results_df = fight_results_df[
+        (~fight_results_df["outcome"].isin(["D/D", "NC/NC"]))
+    ]
+    relevant_weight_classes = [
+        "Flyweight",
+        "Bantamweight",
+        "Featherweight",
+        "Lightweight",
+        "Welterweight",
+        "Middleweight",
+        "Light Heavyweight",
+    ]
+    modded_relevant_weight_classes = []
+    for weight_class in relevant_weight_classes:
+        modded_relevant_weight_classes.append(weight_class + " Bout")
+        modded_relevant_weight_classes.append("UFC " + weight_class + " Title Bout")
+        modded_relevant_weight_classes.append(
+            "UFC Interim " + weight_class + " Title Bout"
+        )
+    fight_results_df = fight_results_df[
+        (fight_results_df["weightclass"].isin(modded_relevant_weight_classes))
+    ]
+    weightclass_mapping = {
+        "Featherweight Bout": 145,
+        "UFC Featherweight Title Bout": 145,
+        "UFC Interim Featherweight Title Bout": 145,
+        "Bantamweight Bout": 135,
+        "UFC Bantamweight Title Bout": 135,
+        "UFC Interim Bantamweight Title Bout": 135,
+        "Lightweight Bout": 155,
+        "UFC Lightweight Title Bout": 155,
+        "UFC Interim Lightweight Title Bout": 155,
+        "Welterweight Bout": 170,
+        "UFC Welterweight Title Bout": 170,
+        "UFC Interim Welterweight Title Bout": 170,
+        "Middleweight Bout": 185,
+        "UFC Middleweight Title Bout": 185,
+        "UFC Interim Middleweight Title Bout": 185,
+        "Light Heavyweight Bout": 205,
+        "UFC Light Heavyweight Title Bout": 205,
+        "UFC Interim Light Heavyweight Title Bout": 205,
+        "Flyweight Bout": 125,
+        "UFC Flyweight Title Bout": 125,
+        "UFC Interim Flyweight Title Bout": 125,
+        "Heavyweight Bout": 255,
+        "UFC Heavyweight Title Bout": 255,
+        "UFC Interim Heavyweight Title Bout": 255,
+    }
+    fight_results_df["weightclass"] = fight_results_df["weightclass"].map(
+        weightclass_mapping
+    )
+    fight_results_df[["fighter_a", "fighter_b"]] = fight_results_df["bout"].str.split(
+        " vs. ", expand=True
+    )
+    fight_results_df["fighter_a"] = (
+        fight_results_df["fighter_a"].str.replace(r"\s+", " ", regex=True).str.strip()
+    )
+    fight_results_df["fighter_b"] = (
+        fight_results_df["fighter_b"].str.replace(r"\s+", " ", regex=True).str.strip()
+    )
+    fight_results_df["outcome"] = fight_results_df["outcome"].apply(
+        lambda x: 1 if x == "W/L" else 0
+    )
+    fight_results_df = fight_results_df[(fight_results_df["method"] != "dq ")]
+    fight_results_df = fight_results_df.drop("referee", axis=1)
+    fight_results_df = fight_results_df.drop("details", axis=1)
+    fight_results_df["event"] = (
+        fight_results_df["event"]
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.lower()
+    )
+    fight_results_df["bout"] = (
+        fight_results_df["bout"]
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.lower()
+    )
+    fight_results_df["method"] = (
+        fight_results_df["method"]
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.lower()
+        .apply(lambda x: "decision" if "decision" in x else x)
+    )
+    fight_results_df = fight_results_df[
+        (~fight_results_df["method"].isin(["tko - doctor's stoppage", "dq"]))
+    ]
 
+    fight_results_df = pd.merge(
+        fight_results_df, events_df[["event", "date"]], on="event", how="left"
+    ).dropna()
 
-fight_results_df = fight_results_df.apply(total_duration, axis=1)
+    fight_results_df["time"] = parsers.time_to_seconds(fight_results_df["time"])
+    # fights without a time went the distance
+    fight_results_df["time"] = fight_results_df["time"].fillna(
+        fight_results_df["round"] * 300
+    )
+    fight_results_df = fight_results_df.dropna()
+    fight_results_df["total_time"] = (
+        fight_results_df["time"] + (fight_results_df["round"] - 1) * 300
+    )
 
-fight_results_df = fight_results_df.drop(columns=["url", "time format"], axis=1)
+    fight_results_df = fight_results_df.drop(columns=["url", "time format"], axis=1)
+    return fight_results_df
+
+
+def read_fighters():
+    fighters_df = staging.read("fighter_tott", "./ufc_fighter_tott.csv")
+    column_mapping = {}
+    for col in fighters_df.columns:
+        column_mapping[col] = col.lower()
+    fighters_df = fighters_df.rename(mapper=column_mapping, errors="raise", axis=1)
+    # Remove Bruno Silvas
+    fighters_df = fighters_df[fighters_df["fighter"] != "Bruno Silva"]
+    fighters_df = fighters_df[
+        (~fighters_df["dob"].isna())
+        & (fighters_df["dob"].str.len() > 3)
+        & (~fighters_df["height"].isna())
+        & (~fighters_df["reach"].isna())
+    ]
+    fighters_df["dob"] = pd.to_datetime(fighters_df["dob"], errors="coerce")
+    fighters_df["weight"] = parsers.weight_to_num(fighters_df["weight"])
+    fighters_df["height"] = parsers.height_to_inches(fighters_df["height"])
+    fighters_df["reach"] = parsers.reach_to_inches(fighters_df["reach"])
+    fighters_df = fighters_df.dropna(subset=["height", "weight", "reach", "dob"])
+    # tales of the tape are whole numbers, which float32 holds exactly
+    fighters_df = fighters_df.astype(
+        {col: np.float32 for col in ["weight", "height", "reach"]}
+    )
+    fighters_df = fighters_df.drop(columns=["stance", "url"])
+    fighters_df = fighters_df.drop_duplicates(subset=["fighter", "dob"])
+    fighters_df["fighter"] = (
+        fighters_df["fighter"].str.replace(r"\s+", " ", regex=True).str.strip().dropna()
+    )
+    return fighters_df
+
+
+def read_fight_stats():
+    fight_stats_df = staging.read("fight_stats", "./ufc_fight_stats.csv")
+    fight_stats_df["ROUND"] = parsers.round_to_int(fight_stats_df["ROUND"])
+
+    for after, before in [
+        ["SIG_STR_", "SIG.STR."],
+        ["TOTAL_STR_", "TOTAL STR."],
+        ["TD_", "TD"],
+        ["HEAD_", "HEAD"],
+        ["BODY_", "BODY"],
+        ["LEG_", "LEG"],
+        ["DISTANCE_", "DISTANCE"],
+        ["CLINCH_", "CLINCH"],
+        ["GROUND_", "GROUND"],
+    ]:
+        fight_stats_df[[after + "LANDED", after + "ATTEMPTED"]] = (
+            parsers.landed_of_attempted(fight_stats_df[before]).to_numpy()
+        )
+        fight_stats_df.drop(columns=[before], inplace=True)
+
+    fight_stats_df["CTRL"] = parsers.time_to_seconds(fight_stats_df["CTRL"])
+    fight_stats_df.drop(columns=["SIG.STR. %", "TD %"], inplace=True)
+    fight_stats_df["EVENT"] = (
+        fight_stats_df["EVENT"]
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.lower()
+        .reset_index(drop=True)
+    )
 
+    fight_stats_df["BOUT"] = (
+        fight_stats_df["BOUT"]
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.lower()
+        .reset_index(drop=True)
+    )
 
-def height_to_inches(height):
-    if height == "--":
-        return None
-    feet, inches = height.split("' ")
-    inches = inches.replace('"', "")
-    return int(feet) * 12 + int(inches)
+    column_mapping = {}
+    for col in fight_stats_df.columns:
+        column_mapping[col] = col.lower()
+
+    column_mapping["REV."] = "reversals"
+    column_mapping["CTRL"] = "control_time"
+    column_mapping["SUB.ATT"] = "sub_attempted"
+    column_mapping["KD"] = "knockdowns"
+
+    fight_stats_df = fight_stats_df.rename(
+        mapper=column_mapping, errors="raise", axis=1
+    ).reset_index(drop=True)
+    return fight_stats_df
+
+
+def get_fighter_results(fight_results_df):
+    # one row per fighter of each fight, with their opponent, date, outcome and method
+    # fighter_b's outcome is flipped, as fight results record outcomes from fighter_a's side
+    columns = ["fighter", "opponent", "event", "bout", "date", "outcome", "method"]
+    fighter_a_results = fight_results_df.rename(
+        columns={"fighter_a": "fighter", "fighter_b": "opponent"}
+    )[columns]
+    fighter_b_results = fight_results_df.rename(
+        columns={"fighter_b": "fighter", "fighter_a": "opponent"}
+    )[columns]
+    fighter_b_results["outcome"] = (fighter_b_results["outcome"] == 0).astype(int)
+    fighter_results = pd.concat(
+        [
+            fighter_a_results.assign(
+                position=np.arange(len(fighter_a_results)), side=0
+            ),
+            fighter_b_results.assign(
+                position=np.arange(len(fighter_b_results)), side=1
+            ),
+        ]
+    )
+    # a fighter's first result of a bout wins, in the order of fight_results_df
+    return (
+        fighter_results.sort_values(["position", "side"], kind="stable")
+        .drop_duplicates(subset=["fighter", "event", "bout"])
+        .drop(columns=["position", "side"])
+    )
 
 
-def reach_to_inches(reach):
-    if reach == "--":
-        return None
-    return int(reach.replace('"', ""))
+def join_fight_data(fight_stats_df, fight_results_df):
+    # attach opponent, date, outcome and method to every round of every fighter
+    # rounds without a fight result are dropped
+    fighter_results = get_fighter_results(fight_results_df)
+    returner = fight_stats_df.merge(
+        fighter_results, on=["fighter", "event", "bout"], how="left"
+    )
+    returner.index = fight_stats_df.index
+    return returner.dropna()
+
+
+def is_stat_column(col):
+    return (
+        col.endswith("landed")
+        or col.endswith("attempted")
+        or col
+        in [
+            "knockdowns",
+            "reversals",
+            "control_time",
+        ]
+    )
 
 
-def weight_to_num(weight):
-    if not " lbs." in weight:
-        return None
-    return int(weight.replace(" lbs.", ""))
-
-
-fighters_df = pd.read_csv("./ufc_fighter_tott.csv")
-column_mapping = {}
-for col in fighters_df.columns:
-    column_mapping[col] = col.lower()
-fighters_df = fighters_df.rename(mapper=column_mapping, errors="raise", axis=1)
-# Remove Bruno Silvas
-fighters_df = fighters_df[fighters_df["fighter"] != "Bruno Silva"]
-fighters_df = fighters_df[
-    (~fighters_df["dob"].isna())
-    & (fighters_df["dob"].str.len() > 3)
-    & (~fighters_df["height"].isna())
-    & (~fighters_df["reach"].isna())
-]
-fighters_df["dob"] = pd.to_datetime(fighters_df["dob"], errors="coerce")
-fighters_df["weight"] = fighters_df["weight"].apply(weight_to_num).astype(float)
-fighters_df["height"] = fighters_df["height"].apply(height_to_inches).astype(float)
-fighters_df["reach"] = fighters_df["reach"].apply(reach_to_inches).astype(float)
-fighters_df = fighters_df.dropna(subset=["height", "weight", "reach", "dob"])
-fighters_df = fighters_df.drop(columns=["stance", "url"])
-fighters_df = fighters_df.drop_duplicates(subset=["fighter", "dob"])
-fighters_df["fighter"] = (
-    fighters_df["fighter"].str.replace(r"\s+", " ", regex=True).str.strip().dropna()
-)
-
-fight_stats_df = pd.read_csv("./ufc_fight_stats.csv")
-
-
-def round_to_int(round):
-    if pd.isnull(round):
-        return None
-    return int(round.split(" ")[1])
+def get_fighter_dtype(*fighters):
+    # one category per fighter name, shared by every column of fighters so they can be joined
+    # on each other, sorted so fighters sort by name
+    return pd.CategoricalDtype(
+        pd.Index(pd.concat(fighters).unique()).dropna().sort_values()
+    )
 
 
-def get_stat_part(key, stat):
-    if not isinstance(stat, str):
-        return None
-    if pd.isnull(stat):
-        return None
-    splitted = stat.split(" of ")
-    if len(splitted) == 2:
-        return splitted[key]
-    return None
-
-
-def get_left_stat(stat):
-    return get_stat_part(0, stat)
-
-
-def get_right_stat(stat):
-    return get_stat_part(1, stat)
-
-
-fight_stats_df["ROUND"] = fight_stats_df["ROUND"].apply(round_to_int)
-fight_stats_df["ROUND"] = fight_stats_df["ROUND"].replace([np.inf, -np.inf], np.nan)
-fight_stats_df["ROUND"] = fight_stats_df["ROUND"].dropna()
-
-for after, before in [
-    ["SIG_STR_", "SIG.STR."],
-    ["TOTAL_STR_", "TOTAL STR."],
-    ["TD_", "TD"],
-    ["HEAD_", "HEAD"],
-    ["BODY_", "BODY"],
-    ["LEG_", "LEG"],
-    ["DISTANCE_", "DISTANCE"],
-    ["CLINCH_", "CLINCH"],
-    ["GROUND_", "GROUND"],
-]:
-    fight_stats_df[after + "LANDED"] = (
-        fight_stats_df[before].apply(get_left_stat).astype(float)
-    )
-    fight_stats_df[after + "LANDED"] = fight_stats_df[after + "LANDED"].astype(float)
-    fight_stats_df[after + "ATTEMPTED"] = fight_stats_df[before].apply(get_right_stat)
-    fight_stats_df[after + "ATTEMPTED"] = fight_stats_df[after + "ATTEMPTED"].astype(
-        float
-    )
-    fight_stats_df.drop(columns=[before], inplace=True)
-
-fight_stats_df["CTRL"] = (
-    fight_stats_df["CTRL"].apply(time_to_seconds).dropna().astype(float)
-)
-fight_stats_df.drop(columns=["SIG.STR. %", "TD %"], inplace=True)
-fight_stats_df["EVENT"] = (
-    fight_stats_df["EVENT"]
-    .str.replace(r"\s+", " ", regex=True)
-    .str.strip()
-    .str.lower()
-    .reset_index(drop=True)
-)
-
-fight_stats_df["BOUT"] = (
-    fight_stats_df["BOUT"]
-    .str.replace(r"\s+", " ", regex=True)
-    .str.strip()
-    .str.lower()
-    .reset_index(drop=True)
-)
-
-column_mapping = {}
-for col in fight_stats_df.columns:
-    column_mapping[col] = col.lower()
-
-column_mapping["REV."] = "reversals"
-column_mapping["CTRL"] = "control_time"
-column_mapping["SUB.ATT"] = "sub_attempted"
-column_mapping["KD"] = "knockdowns"
-
-fight_stats_df = fight_stats_df.rename(
-    mapper=column_mapping, errors="raise", axis=1
-).reset_index(drop=True)
-
-
-def get_fight_data(fighter, event, bout):
-    fight_results_row = fight_results_df[
-        ["fighter_a", "fighter_b", "date", "outcome", "method"]
-    ][
-        (
-            (fight_results_df["fighter_a"] == fighter)
-            | (fight_results_df["fighter_b"] == fighter)
-        )
-        & (fight_results_df["event"] == event)
-        & (fight_results_df["bout"] == bout)
-    ]
-    if fight_results_row.empty:
-        return [None, None, None, None]
-    outcome = fight_results_row["outcome"].values[0]
-    method = fight_results_row["method"].values[0]
-    if fight_results_row["fighter_a"].values[0] == fighter:
-        return [
-            fight_results_row["fighter_b"].values[0],
-            fight_results_row["date"].values[0],
-            outcome,
-            method,
-        ]
-    return [
-        fight_results_row["fighter_a"].values[0],
-        fight_results_row["date"].values[0],
-        1 if outcome == 0 else 0,
-        method,
-    ]
+def compact_fight_stats(fight_stats_df, fighter_dtype):
+    # names repeat on every round, so they are stored once as categories
+    # stats are counts, which float32 holds exactly
+    return fight_stats_df.astype(
+        {
+            "fighter": fighter_dtype,
+            "opponent": fighter_dtype,
+            "event": "category",
+            "bout": "category",
+            "method": "category",
+            **{
+                col: np.float32
+                for col in filter(is_stat_column, fight_stats_df.columns)
+            },
+        }
+    )
 
 
-def apply_fight_data(row):
-    row["opponent"], row["date"], row["outcome"], row["method"] = get_fight_data(
-        row["fighter"], row["event"], row["bout"]
+def get_fight_stats(fight_results_df):
+    # every round of every fighter with the result of its fight, in compact dtypes
+    fight_stats_df = join_fight_data(read_fight_stats(), fight_results_df)
+    return compact_fight_stats(
+        fight_stats_df,
+        get_fighter_dtype(fight_stats_df["fighter"], fight_stats_df["opponent"]),
     )
-    return row
-
 
-fight_stats_df = fight_stats_df.apply(apply_fight_data, axis=1).dropna()
 
-missing_fight_details = 0
-missing_fighter_results = 0
-missing_opp_results = 0
-missing_fighter_stats = 0
-missing_opp_stats = 0
+def safe_ratio(numerator, denominator):
+    # numerator / denominator, 0 where the denominator is 0
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros_like(numerator),
+        where=denominator != 0,
+    )
 
-# fighter_stats_df = pd.read_csv('fighter_stats.csv')
 
+def get_fighter_stats(fight_stats_df, fighters_df):
+    # one row per fighter of each fight, with their rounds summed into fight totals,
+    # their opponent's totals and both tales of the tape
+    # fights are kept in the order they first appear in fight_stats_df, fights of fighters
+    # without a tale of the tape or whose opponent has no stats are dropped
+    keys = ["fighter", "event", "bout"]
+    stat_columns = list(filter(is_stat_column, fight_stats_df.columns))
+    aggregations = {col: "first" for col in ["date", "outcome", "method", "opponent"]}
+    aggregations.update({col: "sum" for col in stat_columns})
+    fights = (
+        fight_stats_df.groupby(keys, sort=False, observed=True)
+        .agg(aggregations)
+        .reset_index()
+        .astype({"outcome": float})
+    )
+    opponent_fights = fights[keys + stat_columns].rename(
+        columns={
+            "fighter": "opponent",
+            **{col: "opponent_" + col for col in stat_columns},
+        }
+    )
+    tott_columns = ["weight", "height", "reach", "dob"]
+    tott = (
+        fighters_df.drop_duplicates(subset=["fighter"])[["fighter"] + tott_columns]
+        .astype({"fighter": fights["fighter"].dtype})
+        .dropna(subset=["fighter"])
+    )
+    opponent_tott = tott.rename(
+        columns={
+            "fighter": "opponent",
+            **{col: "opponent_" + col for col in tott_columns},
+        }
+    )
+    fights = (
+        fights.merge(tott, on="fighter", how="inner")
+        .merge(opponent_fights, on=["opponent", "event", "bout"], how="inner")
+        .merge(opponent_tott, on="opponent", how="inner")
+    )
+    fights["age"] = (fights["date"] - fights["dob"]).dt.days / 365.25
+    fights["opponent_age"] = (fights["date"] - fights["opponent_dob"]).dt.days / 365.25
 
-def get_fighter_stats(fighter, event, bout):
-    global missing_fight_details
-    global missing_fighter_results
-    global missing_opp_results
-    global missing_fighter_stats
-    global missing_opp_stats
-    fighter_results = fight_stats_df[
-        (fight_stats_df["fighter"] == fighter)
-        & (fight_stats_df["event"] == event)
-        & (fight_stats_df["bout"] == bout)
-    ]
-    if fighter_results.shape[0] == 0:
-        missing_fighter_results += 1
-        return None
-    fight_date = fighter_results["date"].head(1).item()
-    fighter_results = fighter_results.drop(
-        columns=["fighter", "event", "bout", "round"]
-    )
-    fighter_stats = fighters_df[["weight", "height", "reach", "dob"]][
-        fighters_df["fighter"] == fighter
-    ].head(1)
-    if fighter_stats.shape[0] == 0:
-        missing_fighter_stats += 1
-        return None
-    opponent_name = fighter_results["opponent"].head(1).item()
-    opp_results = fight_stats_df[
-        (fight_stats_df["fighter"] == opponent_name)
-        & (fight_stats_df["event"] == event)
-        & (fight_stats_df["bout"] == bout)
-    ]
-    opp_results = opp_results.drop(columns=["fighter", "event", "bout", "round"])
-    if opp_results.shape[0] == 0:
-        missing_opp_results += 1
-        return None
-    opp_stats = fighters_df[["weight", "height", "reach", "dob"]][
-        fighters_df["fighter"] == opponent_name
-    ].head(1)
-    if opp_stats.shape[0] == 0:
-        missing_opp_stats += 1
-        return None
-    age = fight_date - fighter_stats["dob"].item()
-    age = age.days / 365.25
-    opponent_age = fight_date - opp_stats["dob"].item()
-    opponent_age = opponent_age.days / 365.25
     returner = {
-        "date": fight_date,
-        "event": event,
-        "bout": bout,
-        "fighter": fighter,
-        "weight": float(fighter_stats["weight"].astype(float).values[0]),
-        "height": float(fighter_stats["height"].astype(float).values[0]),
-        "reach": float(fighter_stats["reach"].astype(float).values[0]),
-        "age": float(age),
-        "outcome": float(fighter_results["outcome"].astype(float).values[0]),
-        "method": fighter_results["method"].values[0],
-        "opponent": opponent_name,
+        col: fights[col]
+        for col in ["date", "event", "bout", "fighter"]
+        + ["weight", "height", "reach", "age", "outcome", "method", "opponent"]
+        + stat_columns
+        + ["opponent_" + col for col in stat_columns]
+        + ["opponent_weight", "opponent_height", "opponent_reach", "opponent_age"]
     }
-    for col in filter(
-        lambda x: x.endswith("landed")
-        or x.endswith("attempted")
-        or x in ["knockdowns", "reversals", "control_time"],
-        fighter_results.columns,
-    ):
-        returner[col] = float(fighter_results[col].sum())
-    for col in filter(
-        lambda x: x.endswith("landed")
-        or x.endswith("attempted")
-        or x in ["knockdowns", "reversals", "control_time"],
-        opp_results.columns,
-    ):
-        returner["opponent_" + col] = float(opp_results[col].sum())
-    returner["opponent_weight"] = float(opp_stats["weight"].astype(float).values[0])
-    returner["opponent_height"] = float(opp_stats["height"].astype(float).values[0])
-    returner["opponent_reach"] = float(opp_stats["reach"].astype(float).values[0])
-    returner["opponent_age"] = float(
-        (fight_date - opp_stats["dob"].item()).days / 365.25
-    )
     for key in [
         "height",
         "weight",
@@ -424,10 +418,9 @@ def get_fighter_stats(fighter, event, bout):
         "reversals",
         "knockdowns",
     ]:
-        numerator = float(returner[key] - returner["opponent_" + key])
-        denominator = float(returner[key] + returner["opponent_" + key])
-        returner[key + "_diff"] = (numerator if denominator != 0 else 0) / (
-            denominator if denominator != 0 else 1
+        returner[key + "_diff"] = safe_ratio(
+            fights[key] - fights["opponent_" + key],
+            fights[key] + fights["opponent_" + key],
         )
     for key in [
         "total_str",
@@ -440,75 +433,46 @@ def get_fighter_stats(fighter, event, bout):
         "distance",
         "clinch",
     ]:
-        landed_numerator = float(
-            returner[key + "_landed"] - returner["opponent_" + key + "_landed"]
-        )
-        landed_denominator = float(
-            returner[key + "_landed"] + returner["opponent_" + key + "_landed"]
-        )
-        returner[key + "_landed_diff"] = (
-            landed_numerator if landed_denominator != 0 else 0
-        ) / (landed_denominator if landed_denominator != 0 else 1)
-        attempted_numerator = float(
-            returner[key + "_attempted"] - returner["opponent_" + key + "_attempted"]
-        )
-        attempted_denominator = float(
-            returner[key + "_attempted"] + returner["opponent_" + key + "_attempted"]
-        )
-        returner[key + "_attempted_diff"] = (
-            attempted_numerator if attempted_denominator != 0 else 0
-        ) / (attempted_denominator if attempted_denominator != 0 else 1)
-        absorbed = float(returner["opponent_" + key + "_landed"])
-        defended = float(returner["opponent_" + key + "_attempted"]) - absorbed
-        if defended < 0:
-            defended = 0
+        for suffix in ["_landed", "_attempted"]:
+            returner[key + suffix + "_diff"] = safe_ratio(
+                fights[key + suffix] - fights["opponent_" + key + suffix],
+                fights[key + suffix] + fights["opponent_" + key + suffix],
+            )
+        absorbed = fights["opponent_" + key + "_landed"]
+        defended = (fights["opponent_" + key + "_attempted"] - absorbed).clip(lower=0)
         returner[key + "_absorbed"] = absorbed
         returner[key + "_defended"] = defended
-        absorbed_numerator = float(absorbed - defended)
-        absorbed_denominator = float(absorbed + defended)
-        returner[key + "_absorbed_diff"] = (
-            absorbed_numerator if absorbed_denominator != 0 else 0
-        ) / (absorbed_denominator if absorbed_denominator != 0 else 1)
-        returner[key + "_defended_diff"] = (defended if defended != 0 else 0) / (
-            absorbed + defended if absorbed + defended != 0 else 1
+        returner[key + "_absorbed_diff"] = safe_ratio(
+            absorbed - defended, absorbed + defended
         )
-    knockdowns_absorbed = float(returner["opponent_knockdowns"])
-    knockdowns_numerator = float(returner["knockdowns"] - knockdowns_absorbed)
-    knockdowns_denominator = float(returner["knockdowns"] + knockdowns_absorbed)
-    returner["knockdowns_diff"] = (
-        knockdowns_numerator if knockdowns_denominator != 0 else 0
-    ) / (knockdowns_denominator if knockdowns_denominator != 0 else 1)
-    return returner
+        returner[key + "_defended_diff"] = safe_ratio(defended, absorbed + defended)
+    return pd.DataFrame(returner).dropna()
 
 
-def apply_get_fighter_stats(row):
-    return get_fighter_stats(row["fighter"], row["event"], row["bout"])
+# fights up to this many days before a fight count as recent history
+RECENT_DAYS = 730
 
-
-unique_fights = fight_stats_df[["fighter", "event", "bout"]].drop_duplicates()
-unique_fights["fighter"] = unique_fights["fighter"].str.strip().dropna()
-unique_fights["event"] = unique_fights["event"].str.strip().dropna()
-unique_fights["bout"] = unique_fights["bout"].str.strip().dropna()
-
-fighter_stats_df = (
-    unique_fights.apply(apply_get_fighter_stats, axis=1).apply(pd.Series).dropna()
-)
+METHODS = [
+    ["t/ko", "ko"],
+    ["submission", "sub"],
+    ["decision", "dec"],
+]
 
 
-def fighter_history_by_date(fighter, date):
-    full_history = fighter_stats_df[
-        (fighter_stats_df["fighter"] == fighter) & (fighter_stats_df["date"] < date)
-    ]
-    recent_history = full_history[full_history["date"] >= date - pd.Timedelta(days=730)]
-    returner = {}
-    for key in ["weight", "height", "reach", "age"]:
-        returner["avg_" + key + "_diff"] = (
-            full_history[key + "_diff"].mean() if full_history.shape[0] > 0 else 0.0
-        )
-        returner["recent_avg_" + key + "_diff"] = (
-            recent_history[key + "_diff"].mean() if recent_history.shape[0] > 0 else 0.0
-        )
-    to_do = []
+def get_history_keys(
+    strike_suffixes=(
+        "landed_diff",
+        "attempted_diff",
+        "absorbed_diff",
+        "defended_diff",
+        "landed",
+        "attempted",
+        "absorbed",
+        "defended",
+    )
+):
+    # stats whose average, peak, valley and recent average make up a fighter's history
+    keys = []
     for key in [
         "knockdowns",
         "reversals",
@@ -518,7 +482,7 @@ def fighter_history_by_date(fighter, date):
         "reach",
         "height",
     ]:
-        to_do += [key, key + "_diff"]
+        keys += [key, key + "_diff"]
     for key in [
         "total_str",
         "sig_str",
@@ -530,171 +494,467 @@ def fighter_history_by_date(fighter, date):
         "distance",
         "clinch",
     ]:
-        for suffix in [
-            "landed_diff",
-            "attempted_diff",
-            "absorbed_diff",
-            "defended_diff",
-            "landed",
-            "attempted",
-            "absorbed",
-            "defended",
-        ]:
-            to_do.append("_".join([key, suffix]))
-    for key in to_do:
+        for suffix in strike_suffixes:
+            keys.append("_".join([key, suffix]))
+    return keys
+
+
+def get_cumulative_history(fighter_stats_df, keys, previous=None):
+    # running totals, peaks and valleys of every fighter, one row per fighter and fight date
+    # fights on the same date are folded into one row, so a row covers every fight up to its date
+    # with a previous cumulative history, the fights are added on top of it and must all be
+    # dated after it
+    fights = fighter_stats_df[["fighter", "date"] + keys].assign(fights=1.0)
+    is_win = fighter_stats_df["outcome"] == 1
+    is_loss = fighter_stats_df["outcome"] == 0
+    fights["wins"] = is_win.astype(float)
+    fights["losses"] = is_loss.astype(float)
+    for method, transformed in METHODS:
+        is_method = fighter_stats_df["method"] == method
+        fights[transformed + "_wins"] = (is_method & is_win).astype(float)
+        fights[transformed + "_losses"] = (is_method & is_loss).astype(float)
+        # method losses sum the outcome of lost fights, which is always 0
+        fights[transformed + "_loss_outcomes"] = fighter_stats_df["outcome"].where(
+            is_method & is_loss, 0.0
+        )
+    total_columns = [col for col in fights.columns if col not in ["fighter", "date"]]
+    max_columns = [key + "_max" for key in keys]
+    min_columns = [key + "_min" for key in keys]
+    by_date = fights.groupby(["fighter", "date"], sort=True, observed=True)
+    history = pd.concat(
+        [
+            by_date[total_columns].sum(),
+            by_date[keys].max().add_suffix("_max"),
+            by_date[keys].min().add_suffix("_min"),
+        ],
+        axis=1,
+    ).reset_index()
+    if previous is not None:
+        # carry on from the last row of each fighter in the previous history
+        history = pd.concat(
+            [
+                previous.groupby("fighter", observed=True).tail(1).assign(carried=True),
+                history.assign(carried=False),
+            ]
+        ).sort_values(["fighter", "date"], kind="stable")
+    by_fighter = history.groupby("fighter", sort=False, observed=True)
+    history[total_columns] = by_fighter[total_columns].cumsum()
+    history[max_columns] = by_fighter[max_columns].cummax()
+    history[min_columns] = by_fighter[min_columns].cummin()
+    if previous is not None:
+        history = pd.concat(
+            [previous, history[~history["carried"]].drop(columns=["carried"])]
+        )
+    return history.sort_values(["date", "fighter"], kind="stable").reset_index(
+        drop=True
+    )
+
+
+def trim_cumulative_history(cumulative_history):
+    # the rows later fights can still look up, i.e. every row inside the recent window of
+    # the latest date and the last row of each fighter before that window
+    window_start = cumulative_history["date"].max() - pd.Timedelta(days=RECENT_DAYS)
+    is_old = cumulative_history["date"] < window_start
+    return pd.concat(
+        [
+            cumulative_history[is_old].groupby("fighter", observed=True).tail(1),
+            cumulative_history[~is_old],
+        ]
+    ).sort_values(["date", "fighter"], kind="stable")
+
+
+def history_as_of(cumulative_history, queries, dates):
+    # the last cumulative history row of each query's fighter strictly before dates,
+    # queries without earlier fights get 0
+    as_of = pd.merge_asof(
+        queries[["fighter"]]
+        .assign(date=dates, query=np.arange(len(queries)))
+        .sort_values("date", kind="stable"),
+        cumulative_history,
+        on="date",
+        by="fighter",
+        allow_exact_matches=False,
+    )
+    history_columns = cumulative_history.columns.drop(["fighter", "date"])
+    as_of[history_columns] = as_of[history_columns].fillna(0.0)
+    return as_of.sort_values("query").reset_index(drop=True)
+
+
+def get_fighter_history(cumulative_history, queries):
+    # history of the fighter of each row of queries before its date, i.e. the averages, peaks,
+    # valleys, recent averages and win counts of all their fights before that date
+    # recent history covers the fights of the RECENT_DAYS days before the date
+    # returns one row per query, indexed by its fighter and date
+    keys = get_history_keys()
+    full = history_as_of(cumulative_history, queries, queries["date"])
+    window_start = history_as_of(
+        cumulative_history,
+        queries,
+        queries["date"] - pd.Timedelta(days=RECENT_DAYS),
+    )
+    # peaks and valleys do not add up, only totals are taken over the recent window
+    total_columns = [
+        col
+        for col in full.columns.drop(["fighter", "date", "query"])
+        if not col.endswith(("_max", "_min"))
+    ]
+    recent = full[total_columns] - window_start[total_columns]
+    # the difference can leave a rounding residue where the recent fights add up to 0,
+    # e.g. x + 1/3 - 1/3 - x, snap it to the 0 a sum over the recent fights gives
+    recent = recent.mask(
+        np.isclose(full[total_columns], window_start[total_columns], rtol=1e-9, atol=0),
+        0.0,
+    )
+    full_fights = full["fights"].to_numpy()
+    recent_fights = recent["fights"].to_numpy()
+    returner = {}
+    for key in ["weight", "height", "reach", "age"]:
+        returner["avg_" + key + "_diff"] = safe_ratio(full[key + "_diff"], full_fights)
+        returner["recent_avg_" + key + "_diff"] = safe_ratio(
+            recent[key + "_diff"], recent_fights
+        )
+    for key in keys:
         avgK = "_".join(["avg", key])
         peakK = "_".join([key, "peak"])
         valleyK = "_".join([key, "valley"])
         recentAvgK = "_".join(["recent_avg", key])
-        returner[avgK] = full_history[key].mean() if full_history.shape[0] > 0 else 0.0
-        returner[recentAvgK] = (
-            recent_history[key].mean() if recent_history.shape[0] > 0 else 0.0
-        )
+        returner[avgK] = safe_ratio(full[key], full_fights)
+        returner[recentAvgK] = safe_ratio(recent[key], recent_fights)
+        # absorbed stats are better when lower, so their peak is the lowest value
         if "absorbed" in key:
-            returner[peakK] = (
-                full_history[key].min() if full_history.shape[0] > 0 else 0.0
-            )
-            returner[valleyK] = (
-                full_history[key].max() if full_history.shape[0] > 0 else 0.0
-            )
+            returner[peakK] = full[key + "_min"].to_numpy()
+            returner[valleyK] = full[key + "_max"].to_numpy()
         else:
-            returner[peakK] = (
-                full_history[key].max() if full_history.shape[0] > 0 else 0.0
-            )
-            returner[valleyK] = (
-                full_history[key].min() if full_history.shape[0] > 0 else 0.0
-            )
-        returner[recentAvgK + "_vs_peak"] = (
-            returner[recentAvgK] / returner[peakK] if returner[peakK] != 0 else 0.0
+            returner[peakK] = full[key + "_max"].to_numpy()
+            returner[valleyK] = full[key + "_min"].to_numpy()
+        returner[recentAvgK + "_vs_peak"] = safe_ratio(
+            returner[recentAvgK], returner[peakK]
         )
-        returner[recentAvgK + "_vs_valley"] = (
-            returner[recentAvgK] / returner[valleyK] if returner[valleyK] != 0 else 0.0
+        returner[recentAvgK + "_vs_valley"] = safe_ratio(
+            returner[recentAvgK], returner[valleyK]
         )
-        returner[avgK + "_vs_peak"] = (
-            returner[avgK] / returner[peakK] if returner[peakK] != 0 else 0.0
+        returner[avgK + "_vs_peak"] = safe_ratio(returner[avgK], returner[peakK])
+        returner[avgK + "_vs_valley"] = safe_ratio(returner[avgK], returner[valleyK])
+    returner["recent_wins"] = recent["wins"].astype(int).to_numpy()
+    returner["recent_losses"] = recent["losses"].astype(int).to_numpy()
+    returner["wins"] = full["wins"].to_numpy()
+    returner["losses"] = full["losses"].to_numpy()
+    returner["win_ratio"] = safe_ratio(
+        returner["wins"], returner["wins"] + returner["losses"]
+    )
+    for method, transformed in METHODS:
+        wins = full[transformed + "_wins"].to_numpy()
+        losses = full[transformed + "_loss_outcomes"].to_numpy()
+        returner[transformed + "_wins"] = wins
+        returner[transformed + "_losses"] = losses
+        returner[transformed + "_win_ratio"] = safe_ratio(wins, wins + losses)
+        returner[transformed + "_loss_ratio"] = safe_ratio(losses, losses + wins)
+        returner["recent_" + transformed + "_wins"] = (
+            recent[transformed + "_wins"].astype(int).to_numpy()
         )
-        returner[avgK + "_vs_valley"] = (
-            returner[avgK] / returner[valleyK] if returner[valleyK] != 0 else 0.0
+        returner["recent_" + transformed + "_losses"] = (
+            recent[transformed + "_losses"].astype(int).to_numpy()
         )
-    returner["recent_wins"] = recent_history[recent_history["outcome"] == 1].shape[0]
-    returner["recent_losses"] = recent_history[recent_history["outcome"] == 0].shape[0]
-    returner["wins"] = float(full_history[full_history["outcome"] == 1].shape[0])
-    returner["losses"] = float(full_history[full_history["outcome"] == 0].shape[0])
-    returner["win_ratio"] = (
-        returner["wins"] / (returner["wins"] + returner["losses"])
-        if (returner["wins"] + returner["losses"]) != 0
-        else 0.0
-    )
-    for method, transformed in [
-        ["t/ko", "ko"],
-        ["submission", "sub"],
-        ["decision", "dec"],
-    ]:
-        returner[transformed + "_wins"] = full_history[
-            (full_history["method"] == method) & (full_history["outcome"] == 1)
-        ]["outcome"].sum()
-        returner[transformed + "_losses"] = full_history[
-            (full_history["method"] == method) & (full_history["outcome"] == 0)
-        ]["outcome"].sum()
-        returner[transformed + "_win_ratio"] = (
-            returner[transformed + "_wins"]
-            / (returner[transformed + "_wins"] + returner[transformed + "_losses"])
-            if (returner[transformed + "_wins"] + returner[transformed + "_losses"])
-            != 0
-            else 0.0
+    return pd.DataFrame(
+        returner,
+        index=pd.MultiIndex.from_frame(queries[["fighter", "date"]]),
+    )
+
+
+def get_fight_stats_with_history(fighter_stats_df, fighter_history_df):
+    # every fight with the fighter's and the opponent's history at its date, and the
+    # difference between both histories
+    # both histories are rows of fighter_history_df, fights without either are dropped
+    # histories are computed in float64 but stored in float32, the precision xgboost trains on
+    fighter_rows = fighter_history_df.index.get_indexer(
+        pd.MultiIndex.from_arrays(
+            [fighter_stats_df["fighter"], fighter_stats_df["date"]]
         )
-        returner[transformed + "_loss_ratio"] = (
-            returner[transformed + "_losses"]
-            / (returner[transformed + "_losses"] + returner[transformed + "_wins"])
-            if (returner[transformed + "_losses"] + returner[transformed + "_wins"])
-            != 0
-            else 0.0
+    )
+    opponent_rows = fighter_history_df.index.get_indexer(
+        pd.MultiIndex.from_arrays(
+            [fighter_stats_df["opponent"], fighter_stats_df["date"]]
         )
-        returner["recent_" + transformed + "_wins"] = recent_history[
-            (recent_history["method"] == method) & (recent_history["outcome"] == 1)
-        ]["outcome"].shape[0]
-        returner["recent_" + transformed + "_losses"] = recent_history[
-            (recent_history["method"] == method) & (recent_history["outcome"] == 0)
-        ]["outcome"].shape[0]
-    return returner
+    )
+    found = (fighter_rows >= 0) & (opponent_rows >= 0)
+    fighter_rows = fighter_rows[found]
+    opponent_rows = opponent_rows[found]
+    vs_opp_columns = []
+    for key in get_history_keys(
+        ["landed_diff", "attempted_diff", "landed", "attempted", "absorbed", "defended"]
+    ):
+        avgK = "_".join(["avg", key])
+        peakK = "_".join([key, "peak"])
+        valleyK = "_".join([key, "valley"])
+        recentAvgK = "_".join(["recent_avg", key])
+        vs_opp_columns += [avgK, peakK, valleyK, recentAvgK]
+    # columns are taken one at a time, so only one float64 column of each side is alive
+    precomp = {}
+    opponent_precomp = {}
+    vs_opp = {}
+    for col in fighter_history_df.columns:
+        values = fighter_history_df[col].to_numpy()
+        fighter_values = values[fighter_rows]
+        opponent_values = values[opponent_rows]
+        if col in vs_opp_columns:
+            vs_opp[col] = (fighter_values - opponent_values).astype(np.float32)
+        if values.dtype == np.float64:
+            fighter_values = fighter_values.astype(np.float32)
+            opponent_values = opponent_values.astype(np.float32)
+        precomp["precomp_" + col] = fighter_values
+        opponent_precomp["opponent_precomp_" + col] = opponent_values
+    return pd.concat(
+        [
+            fighter_stats_df[found].reset_index(drop=True),
+            pd.DataFrame(precomp),
+            pd.DataFrame(opponent_precomp),
+            pd.DataFrame(
+                {"precomp_" + col + "_vs_opp": vs_opp[col] for col in vs_opp_columns}
+            ),
+        ],
+        axis=1,
+    )
 
 
-def apply_fighter_history(row):
-    row = row.to_dict()
-    history_data = fighter_history_by_date(row["fighter"], row["date"])
-    for key in history_data:
-        row["precomp_" + key] = history_data[key]
-    return row
+def load_feature_store(path):
+    # fights already in fighter_stats.parquet and the cumulative history they left behind,
+    # None if there is no feature store yet
+    if not os.path.exists(path):
+        return None
+    return pd.read_pickle(path)
 
 
-fight_stats_with_history_df = (
-    fighter_stats_df.apply(apply_fighter_history, axis=1).apply(pd.Series).dropna()
-)
+def save_feature_store(path, fights, cumulative_history):
+    pd.to_pickle(
+        {
+            "fights": fights[["fighter", "event", "bout", "date"]],
+            "cumulative_history": trim_cumulative_history(cumulative_history),
+        },
+        path,
+    )
 
 
-def get_history_diffs(fighter, opponent, date):
-    returner = {}
-    fighter_history = fighter_history_by_date(fighter, date)
-    for key in fighter_history:
-        returner["precomp_" + key] = fighter_history[key]
-    opponent_history = fighter_history_by_date(opponent, date)
-    for key in opponent_history:
-        returner["opponent_precomp_" + key] = opponent_history[key]
-    to_do = []
-    for key in [
-        "knockdowns",
-        "reversals",
-        "control_time",
-        "age",
-        "weight",
-        "reach",
-        "height",
-    ]:
-        to_do += [key, key + "_diff"]
-    for key in [
-        "total_str",
-        "sig_str",
-        "td",
-        "ground",
-        "head",
-        "body",
-        "leg",
-        "distance",
-        "clinch",
-    ]:
-        for suffix in [
-            "landed_diff",
-            "attempted_diff",
-            "landed",
-            "attempted",
-            "absorbed",
-            "defended",
-        ]:
-            to_do.append("_".join([key, suffix]))
-    for key in to_do:
-        avgK = "_".join(["avg", key])
-        peakK = "_".join([key, "peak"])
-        valleyK = "_".join([key, "valley"])
-        recentAvgK = "_".join(["recent_avg", key])
-        for k in [avgK, peakK, valleyK, recentAvgK]:
-            returner["precomp_" + k + "_vs_opp"] = (
-                returner["precomp_" + k] - returner["opponent_precomp_" + k]
+def get_partition_history(fighter_stats_df, queries, previous=None):
+    # cumulative history of the fighters in fighter_stats_df and previous, and the history
+    # of each row of queries
+    cumulative_history = get_cumulative_history(
+        fighter_stats_df, get_history_keys(), previous
+    )
+    return cumulative_history, get_fighter_history(cumulative_history, queries)
+
+
+def build_fighter_history(fighter_stats_df, queries, previous=None, workers=1):
+    # the same as get_partition_history, split over a pool of worker processes
+    # a fighter's history only depends on their own fights, so fighters are split into
+    # partitions that are computed independently and merged back in a fixed order,
+    # which gives the same result as computing every fighter in one go
+    if workers <= 1:
+        return get_partition_history(fighter_stats_df, queries, previous)
+    fighters = [fighter_stats_df["fighter"], queries["fighter"]]
+    if previous is not None:
+        fighters.append(previous["fighter"])
+    fighters = pd.Index(pd.concat(fighters).unique()).sort_values()
+    # sorted fighters are dealt to partitions in turn, a few partitions per worker
+    # keep workers busy when some partitions take longer than others
+    partitions = max(1, min(len(fighters), workers * 4))
+    partition_of = pd.Series(np.arange(len(fighters)) % partitions, index=fighters)
+    stats_partition = fighter_stats_df["fighter"].map(partition_of)
+    queries_partition = queries["fighter"].map(partition_of)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                get_partition_history,
+                fighter_stats_df[stats_partition == partition],
+                queries[queries_partition == partition],
+                (
+                    previous[previous["fighter"].map(partition_of) == partition]
+                    if previous is not None
+                    else None
+                ),
             )
-    return returner
+            for partition in range(partitions)
+        ]
+        results = [future.result() for future in futures]
+    cumulative_history = (
+        pd.concat([result[0] for result in results if len(result[0])])
+        .sort_values(["date", "fighter"], kind="stable")
+        .reset_index(drop=True)
+    )
+    fighter_history_df = pd.concat(
+        [result[1] for result in results if len(result[1])]
+    ).reindex(pd.MultiIndex.from_frame(queries[["fighter", "date"]]))
+    return cumulative_history, fighter_history_df
+
+
+def get_history(fighter_stats_df, previous=None, workers=1):
+    # cumulative history of every fighter, on top of previous if given, and the history of
+    # every fighter and opponent at the date of each fight of fighter_stats_df
+    return build_fighter_history(
+        fighter_stats_df,
+        pd.concat(
+            [
+                fighter_stats_df[["fighter", "date"]],
+                fighter_stats_df[["opponent", "date"]].rename(
+                    columns={"opponent": "fighter"}
+                ),
+            ]
+        ).drop_duplicates(),
+        previous,
+        workers,
+    )
 
 
-def apply_history_diffs(row):
-    row = row.to_dict()
-    history_diff = get_history_diffs(row["fighter"], row["opponent"], row["date"])
-    for k in history_diff:
-        row[k] = history_diff[k]
-    return row
+def get_pipeline(use_cache=True, on_stage=None):
+    # stages of the feature matrix, each one cached until its code or its data changes
+    pipeline = stages.Pipeline(STAGE_CACHE_DIRECTORY, use_cache, on_stage)
+    pipeline.stage(
+        "events",
+        read_events,
+        sources=[staging.fingerprint("event_details", "ufc_event_details.csv")],
+    )
+    pipeline.stage(
+        "fight_results",
+        read_fight_results,
+        inputs=["events"],
+        sources=[staging.fingerprint("fight_results", "./ufc_fight_results.csv")],
+    )
+    pipeline.stage(
+        "fighters",
+        read_fighters,
+        sources=[staging.fingerprint("fighter_tott", "./ufc_fighter_tott.csv")],
+    )
+    pipeline.stage(
+        "fight_stats",
+        get_fight_stats,
+        inputs=["fight_results"],
+        sources=[staging.fingerprint("fight_stats", "./ufc_fight_stats.csv")],
+    )
+    pipeline.stage(
+        "fighter_stats", get_fighter_stats, inputs=["fight_stats", "fighters"]
+    )
+    pipeline.stage("fighter_history", get_history, inputs=["fighter_stats"])
+    return pipeline
+
 
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="generate fighter_stats.parquet from the scraped ufc stats"
+    )
+    arg_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only add fights that are not in fighter_stats.parquet yet, on top of the feature store",
+    )
+    arg_parser.add_argument(
+        "--csv",
+        action="store_true",
+        help="also write the feature matrix to fighter_stats.csv",
+    )
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes computing fighter histories, 1 computes them in this process",
+    )
+    arg_parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="print the peak resident memory of this process after each stage",
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="compute every stage without reading or writing the stage cache",
+    )
+    args = arg_parser.parse_args()
+    report = print_peak_memory if args.memory_report else lambda stage: None
+    pipeline = get_pipeline(not args.no_cache, report)
+
+    feature_store = None
+    if args.incremental:
+        feature_store = load_feature_store(FEATURE_STORE_FILE)
+        if feature_store is None or not os.path.exists(FIGHTER_STATS_FILE):
+            print("no feature store found, building every feature")
+            feature_store = None
+
+    fighter_stats_df = pipeline.run("fighter_stats")
+
+    new_fighter_stats_df = fighter_stats_df
+    if feature_store is not None:
+        # fighters of the feature store keep their names in the categories of this run
+        fighter_dtype = get_fighter_dtype(
+            fighter_stats_df["fighter"],
+            *[frame["fighter"] for frame in feature_store.values()],
+        )
+        recast_fighter_stats_df = fighter_stats_df.astype(
+            {"fighter": fighter_dtype, "opponent": fighter_dtype}
+        )
+        for frame in feature_store.values():
+            frame["fighter"] = frame["fighter"].astype(fighter_dtype)
+        fight_keys = ["fighter", "event", "bout"]
+        new_fighter_stats_df = recast_fighter_stats_df[
+            ~recast_fighter_stats_df.set_index(fight_keys).index.isin(
+                feature_store["fights"].set_index(fight_keys).index
+            )
+        ]
+        # history only grows forward, a fight dated before the latest stored fight changes
+        # the history of fights that are already written
+        if (
+            new_fighter_stats_df["date"] <= feature_store["fights"]["date"].max()
+        ).any():
+            print("found fights older than the feature store, building every feature")
+            feature_store = None
+            new_fighter_stats_df = fighter_stats_df
+        else:
+            fighter_stats_df = recast_fighter_stats_df
+        del recast_fighter_stats_df
+
+    # fights of this run, recorded in the feature store for the next incremental run
+    stored_fights = fighter_stats_df[["fighter", "event", "bout", "date"]]
+    if feature_store is not None:
+        stored_fights = pd.concat(
+            [feature_store["fights"], new_fighter_stats_df[stored_fights.columns]]
+        )
+    del fighter_stats_df
+
+    # history of every fighter and opponent at the date of each of their new fights
+    if feature_store is not None:
+        cumulative_history, fighter_history_df = get_history(
+            new_fighter_stats_df, feature_store["cumulative_history"], args.workers
+        )
+        report("fighter_history")
+    else:
+        cumulative_history, fighter_history_df = pipeline.run(
+            "fighter_history", workers=args.workers
+        )
+
+    fight_stats_with_history_df = get_fight_stats_with_history(
+        new_fighter_stats_df, fighter_history_df
+    )
+    del new_fighter_stats_df, fighter_history_df
+    report("fight_stats_with_history")
+
+    # new fights are added to the end of fighter_stats.parquet in incremental mode
+    if feature_store is not None:
+        print("appending %d new rows" % len(fight_stats_with_history_df))
+        fight_stats_with_history_df = pd.concat(
+            [pd.read_parquet(FIGHTER_STATS_FILE), fight_stats_with_history_df],
+            ignore_index=True,
+        )
+        # both files have their own categories, which pandas joins into plain strings
+        fight_stats_with_history_df = fight_stats_with_history_df.astype(
+            {
+                col: "category"
+                for col in ["event", "bout", "fighter", "method", "opponent"]
+            }
+        )
+    fight_stats_with_history_df.to_parquet(FIGHTER_STATS_FILE, index=False)
+    if args.csv:
+        fight_stats_with_history_df.to_csv(FIGHTER_STATS_CSV_FILE, index=False)
+    del fight_stats_with_history_df
+    save_feature_store(FEATURE_STORE_FILE, stored_fights, cumulative_history)
+    report("write")
 
-fight_stats_with_history_diffs_df = (
-    fight_stats_with_history_df.apply(apply_history_diffs, axis=1)
-    .apply(pd.Series)
-    .dropna()
-)
 
-fight_stats_with_history_diffs_df.to_csv("fighter_stats.csv", index=False)
+if __name__ == "__main__":
+    main()
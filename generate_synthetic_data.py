@@ -0,0 +1,457 @@
+"""
+Overview
+generate synthetic scraped data at any scale, to benchmark the feature pipeline
+
+writes the six csv files the scraper writes, with the same columns and value formats,
+so generate_fighter_stats.py reads them as if they had been scraped from ufcstats.com
+fighters have a weight class and a career, and only fight active fighters of their class
+about 12 fights make up an event, and events are spread over 30 years
+the data is as dirty as the real data: draws and no contests, disqualifications and doctor's
+stoppages, bouts outside the weight classes the model uses, missing tales of the tape,
+unparseable times and doubled whitespace in names
+
+usage:
+python ./generate_synthetic_data.py --fights 10000 --out synthetic/10k
+python ./generate_synthetic_data.py --fights 1000000 --seed 1 --out synthetic/1m
+"""
+
+# imports
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# import config
+import yaml
+
+config = yaml.safe_load(open("scrape_ufc_stats_config.yaml"))
+
+# weight classes as (name, pounds, share of fights)
+WEIGHT_CLASSES = [
+    ("Flyweight", 125, 0.08),
+    ("Bantamweight", 135, 0.12),
+    ("Featherweight", 145, 0.13),
+    ("Lightweight", 155, 0.18),
+    ("Welterweight", 170, 0.17),
+    ("Middleweight", 185, 0.12),
+    ("Light Heavyweight", 205, 0.07),
+    ("Heavyweight", 255, 0.06),
+    ("Women's Strawweight", 115, 0.04),
+    ("Catch Weight", 160, 0.03),
+]
+
+# methods as they are scraped, trailing space included, and their share of fights
+METHODS = [
+    ("KO/TKO ", 0.31),
+    ("Submission ", 0.19),
+    ("Decision - Unanimous ", 0.34),
+    ("Decision - Split ", 0.10),
+    ("Decision - Majority ", 0.03),
+    ("TKO - Doctor's Stoppage ", 0.02),
+    ("DQ ", 0.01),
+]
+
+# outcomes from fighter_a's side and their share of fights
+OUTCOMES = [("W/L", 0.96), ("L/W", 0.01), ("D/D", 0.015), ("NC/NC", 0.015)]
+
+FIRST_NAMES = (
+    "Alex Ben Carlos Dan Eddie Frank Gabriel Henry Ivan Jose Kevin Luis Mark Nate Oscar "
+    "Paulo Quinn Rafael Sean Tony Umar Victor Walt Xavier Yan Zach Amanda Cris Holly Joanna"
+).split()
+LAST_NAMES = (
+    "Silva Santos Johnson Smith Miller Garcia Nurmagomedov Diaz Lee Kim Oliveira Jones "
+    "Rodriguez Costa Pereira Adesanya Volkov Holloway Poirier Gaethje Usman Edwards Covington "
+    "Masvidal Whittaker Blachowicz Ankalaev Procházka Aldo Moreno Figueiredo Sterling Dvalishvili"
+).split()
+STANCES = ["Orthodox", "Southpaw", "Switch", "Open Stance"]
+REFEREES = [
+    "Herb Dean",
+    "Marc Goddard",
+    "Jason Herzog",
+    "Keith Peterson",
+    "Mike Beltran",
+]
+LOCATIONS = [
+    "Las Vegas, Nevada, USA",
+    "Abu Dhabi, Abu Dhabi, United Arab Emirates",
+    "London, England, United Kingdom",
+    "Rio de Janeiro, Rio de Janeiro, Brazil",
+    "Sydney, New South Wales, Australia",
+]
+FIRST_EVENT = pd.Timestamp("1994-03-11")
+YEARS = 30
+# fights made at a time
+CHUNK_FIGHTS = 100000
+
+
+# random choice of labels by their share, for n draws
+def choose(rng, choices, n):
+    labels = np.array([choice[0] for choice in choices], dtype=object)
+    shares = np.array([choice[-1] for choice in choices], dtype=float)
+    return labels[rng.choice(len(choices), size=n, p=shares / shares.sum())]
+
+
+# "12 of 30" strings of landed and attempted counts
+def of(landed, attempted):
+    return pd.Series(landed).astype(str) + " of " + pd.Series(attempted).astype(str)
+
+
+# "4:05" strings of seconds
+def clock(seconds):
+    seconds = pd.Series(seconds)
+    return (seconds // 60).astype(str) + ":" + (seconds % 60).astype(str).str.zfill(2)
+
+
+# middle initials telling apart the fighters of the nth round of names, "" for the first round
+def initial(n):
+    returner = ""
+    while n > 0:
+        n, letter = divmod(n - 1, 26)
+        returner = chr(65 + letter) + returner
+    return returner + ". " if returner else ""
+
+
+# fighters with a unique name, a weight class and a career, one row per fighter
+def make_fighters(rng, n):
+    # names count up through every first and last name, then get a middle initial
+    index = np.arange(n)
+    first = np.array(FIRST_NAMES, dtype=object)[index % len(FIRST_NAMES)]
+    last = np.array(LAST_NAMES, dtype=object)[
+        index // len(FIRST_NAMES) % len(LAST_NAMES)
+    ]
+    generation = index // (len(FIRST_NAMES) * len(LAST_NAMES))
+    initials = pd.Series(generation).map(initial)
+    fighters = pd.DataFrame(
+        {
+            "first": first,
+            "last": initials.to_numpy() + last,
+            "weight_class": rng.choice(
+                len(WEIGHT_CLASSES),
+                size=n,
+                p=[weight_class[2] for weight_class in WEIGHT_CLASSES],
+            ),
+            # careers start anywhere in the timeline and last 2 to 15 years
+            "debut": rng.uniform(-0.1, 1.0, size=n),
+            "career": rng.uniform(2, 15, size=n) / YEARS,
+            "url": ["http://ufcstats.com/fighter-details/%016x" % i for i in index],
+        }
+    )
+    fighters["name"] = fighters["first"] + " " + fighters["last"]
+    # careers start at 21 to 30 years of age
+    fighters["dob"] = (
+        FIRST_EVENT
+        + pd.to_timedelta(fighters["debut"] * YEARS * 365.25, unit="D").round("D")
+        - pd.to_timedelta(rng.uniform(21, 30, size=n) * 365.25, unit="D").round("D")
+    )
+    return fighters
+
+
+# two different active fighters of the weight class of each fight at its time
+def pair_fighters(rng, fighters, weight_class, when):
+    fighter_a = np.zeros(len(when), dtype=int)
+    fighter_b = np.zeros(len(when), dtype=int)
+    for c in range(len(WEIGHT_CLASSES)):
+        pool = fighters.index[fighters["weight_class"] == c].to_numpy()
+        fights = np.flatnonzero(weight_class == c)
+        if len(pool) < 2 or len(fights) == 0:
+            continue
+        pool = pool[np.argsort(fighters["debut"].to_numpy()[pool], kind="stable")]
+        debuts = fighters["debut"].to_numpy()[pool]
+        # fighters who debuted before the fight, the latest of them are still active
+        debuted = np.searchsorted(debuts, when[fights], side="right")
+        # about this many fighters of the class are active at any time
+        active = max(2, int(fighters["career"].to_numpy()[pool].mean() * len(pool)))
+        window = np.clip(debuted, 2, active)
+        for side in [fighter_a, fighter_b]:
+            offset = (rng.uniform(size=len(fights)) * window).astype(int)
+            side[fights] = np.clip(debuted - 1 - offset, 0, len(pool) - 1)
+        # a fighter can not fight themselves
+        same = fighter_a[fights] == fighter_b[fights]
+        fighter_b[fights[same]] = np.where(
+            fighter_b[fights[same]] > 0, fighter_b[fights[same]] - 1, 1
+        )
+        fighter_a[fights] = pool[fighter_a[fights]]
+        fighter_b[fights] = pool[fighter_b[fights]]
+    return fighter_a, fighter_b
+
+
+# n events spread over the timeline, and when they took place between 0 and 1
+def make_events(rng, n):
+    event_when = np.sort(rng.uniform(0, 1, size=n))
+    events = pd.DataFrame(
+        {
+            "EVENT": ["UFC  Synthetic %d: Card %d" % (e, e % 97) for e in range(n)],
+            "URL": ["http://ufcstats.com/event-details/%016x" % e for e in range(n)],
+            "DATE": (
+                FIRST_EVENT
+                + pd.to_timedelta(event_when * YEARS * 365.25, unit="D").round("D")
+            ).strftime("%B %d, %Y"),
+            "LOCATION": np.array(LOCATIONS, dtype=object)[
+                rng.integers(0, len(LOCATIONS), size=n)
+            ],
+        }
+    )
+    return events, event_when
+
+
+# fight details and fight results of fights at the given events, numbered from first
+def make_fights(rng, fighters, events, event_when, event, first):
+    n = len(event)
+    weight_class = rng.choice(
+        len(WEIGHT_CLASSES),
+        size=n,
+        p=[weight_class[2] for weight_class in WEIGHT_CLASSES],
+    )
+    fighter_a, fighter_b = pair_fighters(rng, fighters, weight_class, event_when[event])
+    names = fighters["name"].to_numpy()
+    bout = pd.Series(names[fighter_a]) + " vs. " + pd.Series(names[fighter_b])
+    # some bouts are scraped with doubled whitespace
+    doubled = rng.uniform(size=n) < 0.01
+    bout[doubled] = bout[doubled].str.replace(" vs. ", "  vs. ", regex=False)
+
+    title = rng.uniform(size=n) < 0.04
+    class_names = np.array(
+        [weight_class[0] for weight_class in WEIGHT_CLASSES], dtype=object
+    )
+    weight_class_names = np.where(
+        title,
+        "UFC " + class_names[weight_class] + " Title Bout",
+        class_names[weight_class] + " Bout",
+    )
+    scheduled = np.where(title, 5, 3)
+    method = choose(rng, METHODS, n)
+    decision = pd.Series(method).str.startswith("Decision").to_numpy()
+    finish_round = np.minimum(rng.geometric(0.45, size=n), scheduled)
+    rounds = np.where(decision, scheduled, finish_round)
+    seconds = np.where(decision, 300, rng.integers(5, 300, size=n))
+    time = clock(seconds)
+    # a few times were not recorded
+    time[rng.uniform(size=n) < 0.005] = "--"
+
+    urls = pd.Series(
+        ["http://ufcstats.com/fight-details/%016x" % i for i in range(first, first + n)]
+    )
+    fight_details = pd.DataFrame(
+        {"EVENT": events["EVENT"].to_numpy()[event], "BOUT": bout, "URL": urls}
+    )
+    fight_results = pd.DataFrame(
+        {
+            "EVENT": events["EVENT"].to_numpy()[event],
+            "BOUT": bout,
+            "OUTCOME": choose(rng, OUTCOMES, n),
+            "WEIGHTCLASS": weight_class_names,
+            "METHOD": method,
+            "ROUND": rounds,
+            "TIME": time,
+            "TIME FORMAT": np.where(title, "5 Rnd (5-5-5-5-5)", "3 Rnd (5-5-5)"),
+            "REFEREE": np.array(REFEREES, dtype=object)[
+                rng.integers(0, len(REFEREES), size=n)
+            ],
+            "DETAILS": "",
+            "URL": urls,
+        }
+    )
+    rounds_of = pd.DataFrame(
+        {
+            "event": event,
+            "fighter_a": fighter_a,
+            "fighter_b": fighter_b,
+            "rounds": rounds,
+            "seconds": seconds,
+        }
+    )
+    return fight_details, fight_results, rounds_of
+
+
+# one row per fighter of every round of every fight
+def make_fight_stats(rng, fighters, fight_results, rounds_of):
+    fight = np.repeat(np.arange(len(rounds_of)), rounds_of["rounds"].to_numpy())
+    # number of each round within its fight
+    starts = np.repeat(
+        np.cumsum(rounds_of["rounds"].to_numpy()) - rounds_of["rounds"].to_numpy(),
+        rounds_of["rounds"].to_numpy(),
+    )
+    round_number = np.arange(len(fight)) - starts + 1
+    last_round = round_number == rounds_of["rounds"].to_numpy()[fight]
+    round_seconds = np.where(last_round, rounds_of["seconds"].to_numpy()[fight], 300)
+    # both fighters of a round follow each other
+    fight = np.repeat(fight, 2)
+    round_number = np.repeat(round_number, 2)
+    round_seconds = np.repeat(round_seconds, 2)
+    side = np.tile([0, 1], len(fight) // 2)
+    fighter = np.where(
+        side == 0,
+        rounds_of["fighter_a"].to_numpy()[fight],
+        rounds_of["fighter_b"].to_numpy()[fight],
+    )
+    n = len(fight)
+    pace = round_seconds / 300 * rng.gamma(2.0, 0.5, size=n)
+
+    def attempts(mean):
+        attempted = rng.poisson(mean * pace)
+        landed = rng.binomial(attempted, rng.uniform(0.25, 0.65, size=n))
+        return landed, attempted
+
+    head = attempts(25)
+    body = attempts(6)
+    leg = attempts(6)
+    sig_landed = head[0] + body[0] + leg[0]
+    sig_attempted = head[1] + body[1] + leg[1]
+    # significant strikes split again by position
+    clinch_landed = rng.binomial(sig_landed, 0.12)
+    ground_landed = rng.binomial(sig_landed - clinch_landed, 0.15)
+    clinch_attempted = clinch_landed + rng.binomial(sig_attempted - sig_landed, 0.12)
+    ground_attempted = ground_landed + rng.binomial(
+        sig_attempted - sig_landed - (clinch_attempted - clinch_landed), 0.15
+    )
+    distance = (
+        sig_landed - clinch_landed - ground_landed,
+        sig_attempted - clinch_attempted - ground_attempted,
+    )
+    extra = rng.poisson(8 * pace)
+    takedowns = attempts(0.8)
+
+    def percent(landed, attempted):
+        returner = (
+            pd.Series(
+                np.round(100 * landed / np.maximum(attempted, 1)).astype(int)
+            ).astype(str)
+            + "%"
+        )
+        returner[attempted == 0] = "---"
+        return returner
+
+    control = np.minimum(
+        round_seconds, (rng.exponential(40, size=n) * (takedowns[0] + 0.3)).astype(int)
+    )
+    ctrl = clock(control)
+    # control time was not recorded for early fights
+    ctrl[rng.uniform(size=n) < 0.02] = "--"
+    return pd.DataFrame(
+        {
+            "EVENT": fight_results["EVENT"].to_numpy()[fight],
+            "BOUT": fight_results["BOUT"].to_numpy()[fight],
+            "ROUND": "Round " + pd.Series(round_number).astype(str),
+            "FIGHTER": fighters["name"].to_numpy()[fighter],
+            "KD": rng.binomial(1, 0.04 * np.minimum(pace, 3) / 3, size=n),
+            "SIG.STR.": of(sig_landed, sig_attempted),
+            "SIG.STR. %": percent(sig_landed, sig_attempted),
+            "TOTAL STR.": of(sig_landed + extra, sig_attempted + extra),
+            "TD": of(*takedowns),
+            "TD %": percent(*takedowns),
+            "SUB.ATT": rng.poisson(0.15, size=n),
+            "REV.": rng.binomial(1, 0.03, size=n),
+            "CTRL": ctrl,
+            "HEAD": of(*head),
+            "BODY": of(*body),
+            "LEG": of(*leg),
+            "DISTANCE": of(*distance),
+            "CLINCH": of(clinch_landed, clinch_attempted),
+            "GROUND": of(ground_landed, ground_attempted),
+        }
+    )
+
+
+# fighter details and tales of the tape of every fighter
+def make_fighter_tables(rng, fighters):
+    n = len(fighters)
+    pounds = np.array([weight_class[1] for weight_class in WEIGHT_CLASSES])[
+        fighters["weight_class"].to_numpy()
+    ]
+    # fighters weigh in around the limit of their class
+    weight = pounds + rng.integers(-10, 1, size=n)
+    height = np.clip(
+        np.round(62 + (pounds - 115) / 10 + rng.normal(0, 2, size=n)), 58, 84
+    )
+    reach = np.clip(np.round(height + rng.normal(1, 2.5, size=n)), 58, 86).astype(int)
+    height = height.astype(int)
+    height_text = (
+        pd.Series(height // 12).astype(str)
+        + "' "
+        + pd.Series(height % 12).astype(str)
+        + '"'
+    )
+    reach_text = pd.Series(reach).astype(str) + '"'
+    dob_text = pd.Series(fighters["dob"].dt.strftime("%b %d, %Y"))
+    # tales of the tape of early fighters are often incomplete
+    height_text[rng.uniform(size=n) < 0.02] = "--"
+    reach_text[rng.uniform(size=n) < 0.15] = "--"
+    dob_text[rng.uniform(size=n) < 0.05] = "--"
+    fighter_details = pd.DataFrame(
+        {
+            "FIRST": fighters["first"],
+            "LAST": fighters["last"],
+            "NICKNAME": "",
+            "URL": fighters["url"],
+        }
+    )
+    fighter_tott = pd.DataFrame(
+        {
+            "FIGHTER": fighters["name"],
+            "HEIGHT": height_text,
+            "WEIGHT": pd.Series(weight).astype(str) + " lbs.",
+            "REACH": reach_text,
+            "STANCE": np.array(STANCES, dtype=object)[
+                rng.choice(len(STANCES), size=n, p=[0.72, 0.22, 0.05, 0.01])
+            ],
+            "DOB": dob_text,
+            "URL": fighters["url"],
+        }
+    )
+    return fighter_details, fighter_tott
+
+
+# generate n fights and write the six csv files into out
+def generate(n, out, seed=0):
+    rng = np.random.default_rng(seed)
+    # about two fights per fighter, the same as the real data
+    fighters = make_fighters(rng, max(20, n // 2))
+    n_events = max(1, int(np.ceil(n / 12)))
+    events, event_when = make_events(rng, n_events)
+    event = np.sort(rng.integers(0, n_events, size=n))
+
+    os.makedirs(out, exist_ok=True)
+    paths = {
+        name: os.path.join(out, config[name + "_file_name"])
+        for name in [
+            "event_details",
+            "fight_details",
+            "fight_results",
+            "fight_stats",
+            "fighter_details",
+            "fighter_tott",
+        ]
+    }
+    fighter_details, fighter_tott = make_fighter_tables(rng, fighters)
+    fighter_details.to_csv(paths["fighter_details"], index=False)
+    fighter_tott.to_csv(paths["fighter_tott"], index=False)
+    # the scraper lists the latest events, fights and rounds first
+    events[::-1].to_csv(paths["event_details"], index=False)
+    # fights are made in chunks from the latest one, so a million fights fit in memory
+    for end in range(n, 0, -CHUNK_FIGHTS):
+        start = max(0, end - CHUNK_FIGHTS)
+        fight_details, fight_results, rounds_of = make_fights(
+            rng, fighters, events, event_when, event[start:end], start
+        )
+        fight_stats = make_fight_stats(rng, fighters, fight_results, rounds_of)
+        for df, name in [
+            (fight_details, "fight_details"),
+            (fight_results, "fight_results"),
+            (fight_stats, "fight_stats"),
+        ]:
+            df[::-1].to_csv(
+                paths[name], index=False, mode="w" if end == n else "a", header=end == n
+            )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    arg_parser.add_argument(
+        "--fights", type=int, default=10000, help="number of fights"
+    )
+    arg_parser.add_argument("--seed", type=int, default=0, help="random seed")
+    arg_parser.add_argument(
+        "--out", default=".", help="directory to write the csv files to"
+    )
+    args = arg_parser.parse_args()
+    generate(args.fights, args.out, args.seed)
@@ -0,0 +1,65 @@
+import pandas as pd
+
+# fighter names to fighter ids, held in dicts so resolving a name costs neither a scan of a
+# dataframe nor a database call
+# names are matched exactly first, like fighters.name is unique on the exact string, then
+# normalized, as the scraped data is not consistent about whitespace and case
+# a normalized name shared by two different names is ambiguous and only matches exactly
+
+
+def normalize(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    return names.str.replace(r"\s+", " ", regex=True).str.strip().str.casefold()
+
+
+class FighterIds:
+    def get(self, name: str) -> int | None:
+        if not isinstance(name, str):
+            return None
+        if name in self._ids:
+            return self._ids[name]
+        return self._normalized_ids.get(normalize(name))
+
+    def map(self, names: pd.Series) -> pd.Series:
+        # ids of a column of names, NaN for names that are not known
+        return names.map(self._ids).fillna(
+            normalize_names(names).map(self._normalized_ids)
+        )
+
+    def add(self, name: str, id: int) -> None:
+        self._ids[name] = id
+        key = normalize(name)
+        if key in self._ambiguous:
+            return
+        if key in self._normalized_names and self._normalized_names[key] != name:
+            print(
+                "ambiguous fighter name",
+                {"names": [self._normalized_names[key], name], "key": key},
+            )
+            self._ambiguous.add(key)
+            del self._normalized_names[key]
+            del self._normalized_ids[key]
+            return
+        self._normalized_names[key] = name
+        self._normalized_ids[key] = id
+
+    def update(self, rows: list[tuple[int, str]]) -> None:
+        for id, name in rows:
+            self.add(name, id)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __init__(self, rows: list[tuple[int, str]] | None = None):
+        # rows of (id, name), e.g. of the fighters table
+        self._ids = {}
+        self._normalized_ids = {}
+        self._normalized_names = {}
+        self._ambiguous = set()
+        self.update(rows or [])
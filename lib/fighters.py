@@ -2,6 +2,9 @@ from datetime import datetime
 import pandas as pd
 from postgres import Postgres
 import lib.sql as sql
+import lib.parsers as parsers
+import staging
+from lib.fighter_ids import FighterIds
 
 
 class Fighters:
@@ -19,26 +22,6 @@ class Fighters:
     properties = ["height", "weight", "reach"]
     types = ["total", "zscore"]
 
-    @staticmethod
-    def height_to_inches(height: str) -> int | None:
-        if height == "--":
-            return None
-        feet, inches = height.split("' ")
-        inches = inches.replace('"', "")
-        return int(feet) * 12 + int(inches)
-
-    @staticmethod
-    def reach_to_inches(reach: str) -> int | None:
-        if reach == "--":
-            return None
-        return int(reach.replace('"', ""))
-
-    @staticmethod
-    def weight_to_num(weight: str) -> int | None:
-        if not " lbs." in weight:
-            return None
-        return int(weight.replace(" lbs.", ""))
-
     @staticmethod
     def weight_to_class(weight: int) -> str | None:
         if weight > 205:
@@ -48,8 +31,15 @@ class Fighters:
                 return class_name
         return None
 
-    def get_fighter_id(self, name: str) -> int:
-        return self._pg.one(sql.get("fighter.id.by.name"), (name,))
+    def ids(self) -> FighterIds:
+        # loaded from the fighters table once, then kept up to date by _create_fighters()
+        if self._ids is None:
+            rows = self._pg.query(sql.get("fighters.all")) or []
+            self._ids = FighterIds([(row[0], row[1]) for row in rows])
+        return self._ids
+
+    def get_fighter_id(self, name: str) -> int | None:
+        return self.ids().get(name)
 
     def get_precomp_stat_recent_average(
         self,
@@ -484,41 +474,13 @@ class Fighters:
         return synthesized_df
 
     def get_by_name(self, name: str) -> pd.DataFrame:
-        columns = [
-            "row_id",
-            "name",
-            "date_of_birth",
-            "weight_class",
-        ]
-        returner = pd.DataFrame(
-            [],
-            columns=columns,
-        )
-        row = self._pg.row(sql.get("fighter.by.name"), (name,))
-        if not row or len(row) == 0:
-            return returner
-        (row_id, name, date_of_birth, weight_class) = row
-        date_of_birth = pd.to_datetime(date_of_birth)
-        fighter_stats_rows = self._pg.query(sql.get("fighter.stats.by.id"), (row_id,))
-        if not fighter_stats_rows or len(fighter_stats_rows) == 0:
-            returner = pd.DataFrame(
-                [row_id, name, date_of_birth, weight_class],
-                columns=columns,
+        row_id = self.ids().get(name)
+        if row_id is None:
+            return pd.DataFrame(
+                [],
+                columns=["row_id", "name", "date_of_birth", "weight_class"],
             )
-            return returner
-        data = (
-            row_id,
-            name,
-            date_of_birth,
-            weight_class,
-        )
-        for property, type, value in fighter_stats_rows:
-            columns.append(f"{property}_{type}" if type != "total" else property)
-            data = data + (value,)
-        return pd.DataFrame(
-            [data],
-            columns=columns,
-        )
+        return self.get_by_id(row_id)
 
     def get_by_id(self, id: int) -> pd.DataFrame:
         columns = [
@@ -576,47 +538,65 @@ class Fighters:
             columns=columns,
         )
         rows["date_of_birth"] = pd.to_datetime(rows["date_of_birth"])
-        returner = []
-        for row in rows.iterrows():
-            returner.append(self.get_by_id(row[0]))
-        returner = pd.concat(returner)
+        # stats of every fighter in one query, a column per property and type like get_by_id()
+        stats = pd.DataFrame(
+            self._pg.query(sql.get("fighters.stats.all")) or [],
+            columns=["row_id", "property", "type", "value"],
+        )
+        stats["column"] = stats["property"].where(
+            stats["type"] == "total", stats["property"] + "_" + stats["type"]
+        )
+        stats = stats.pivot(index="row_id", columns="column", values="value")
+        returner = rows.merge(stats, left_on="row_id", right_index=True, how="left")
         return returner
 
-    def _create_fighter(self, row):
-        returner = row
-        returner["row_id"] = self._pg.insert(
-            "INSERT INTO fighters (name, date_of_birth, weight_class) VALUES (%s, %s, %s) ON CONFLICT (name) DO UPDATE SET date_of_birth = EXCLUDED.date_of_birth, weight_class = EXCLUDED.weight_class RETURNING id",
-            (returner["name"], returner["date_of_birth"], returner["weight_class"]),
+    def _create_fighters(self) -> None:
+        # z-scores of height, weight and reach within each weight class, in one pass
+        by_class = self._fighters_df.groupby("weight_class")[Fighters.properties]
+        stddev = by_class.transform("std")
+        zscores_df = (
+            self._fighters_df[Fighters.properties] - by_class.transform("mean")
+        ) / stddev
+
+        # the last row of a name wins, like it did when rows were upserted one by one
+        last = ~self._fighters_df.duplicated(subset=["name"], keep="last")
+        fighters_df = self._fighters_df[last]
+        rows = self._pg.values(
+            "INSERT INTO fighters (name, date_of_birth, weight_class) VALUES %s ON CONFLICT (name) DO UPDATE SET date_of_birth = EXCLUDED.date_of_birth, weight_class = EXCLUDED.weight_class RETURNING id, name",
+            list(
+                fighters_df[["name", "date_of_birth", "weight_class"]].itertuples(
+                    index=False, name=None
+                )
+            ),
         )
-        for stat in ["height", "weight", "reach"]:
-            self._pg.insert(
-                "INSERT INTO fighter_stats (property, type, value, fighter_id) VALUES (%s, %s, %s, %s) ON CONFLICT (fighter_id, property, type) DO UPDATE SET value = EXCLUDED.value RETURNING id",
-                (stat, "total", returner[stat], returner["row_id"]),
-            )
-        return returner
+        if rows is None:
+            raise RuntimeError("could not upsert fighters")
+        ids = {name: row_id for row_id, name in rows}
+        self._fighters_df["row_id"] = self._fighters_df["name"].map(ids)
+        self.ids().update(rows)
 
-    def _create_fighter_zscores(self, row):
-        returner = row
-        if not returner["row_id"]:
-            return returner
-        subset = self._fighters_df[
-            (self._fighters_df["weight_class"] == returner["weight_class"])
-        ]
-        for stat in ["height", "weight", "reach"]:
-            stddev = subset[stat].std()
-            if stddev == 0:
-                continue
-            mean = subset[stat].mean()
-            zscore = (returner[stat] - mean) / stddev
-            self._pg.insert(
-                "INSERT INTO fighter_stats (property, type, value, fighter_id) VALUES (%s, %s, %s, %s) ON CONFLICT (fighter_id, property, type) DO UPDATE SET value = EXCLUDED.value RETURNING id",
-                (stat, "zscore", zscore, returner["row_id"]),
-            )
+        stats = []
+        for stat in Fighters.properties:
+            for name, value in zip(fighters_df["name"], fighters_df[stat]):
+                stats.append((stat, "total", value, ids[name]))
+            # no z-score where all fighters of a weight class have the same value
+            for name, value, skip in zip(
+                fighters_df["name"], zscores_df[last][stat], stddev[last][stat] == 0
+            ):
+                if not skip:
+                    stats.append((stat, "zscore", value, ids[name]))
+        rows = self._pg.values(
+            "INSERT INTO fighter_stats (property, type, value, fighter_id) VALUES %s ON CONFLICT (fighter_id, property, type) DO UPDATE SET value = EXCLUDED.value RETURNING id",
+            stats,
+        )
+        if rows is None:
+            raise RuntimeError("could not upsert fighter stats")
 
     def __init__(self, skip_create: bool = False):
         self._pg = Postgres()
+        self._ids = None
         if not skip_create:
-            self._fighters_df = pd.read_csv("./ufc_fighter_tott.csv")
+            self._fighters_df = staging.read("fighter_tott", "./ufc_fighter_tott.csv")
             column_mapping = {}
             for col in self._fighters_df.columns:
                 column_mapping[col] = col.lower()
@@ -636,16 +616,14 @@ class Fighters:
             self._fighters_df["date_of_birth"] = pd.to_datetime(
                 self._fighters_df["dob"], errors="coerce"
             )
-            self._fighters_df["weight"] = (
-                self._fighters_df["weight"].apply(Fighters.weight_to_num).astype(float)
+            self._fighters_df["weight"] = parsers.weight_to_num(
+                self._fighters_df["weight"]
             )
-            self._fighters_df["height"] = (
+            self._fighters_df["height"] = parsers.height_to_inches(
                 self._fighters_df["height"]
-                .apply(Fighters.height_to_inches)
-                .astype(float)
             )
-            self._fighters_df["reach"] = (
-                self._fighters_df["reach"].apply(Fighters.reach_to_inches).astype(float)
+            self._fighters_df["reach"] = parsers.reach_to_inches(
+                self._fighters_df["reach"]
             )
             self._fighters_df = self._fighters_df.dropna(
                 subset=["height", "weight", "reach", "date_of_birth"]
@@ -663,6 +641,4 @@ class Fighters:
             self._fighters_df["weight_class"] = self._fighters_df["weight"].apply(
                 Fighters.weight_to_class
             )
-            self._fighters_df = self._fighters_df.apply(
-                self._create_fighter, axis=1
-            ).apply(self._create_fighter_zscores, axis=1)
+            self._create_fighters()
@@ -1,9 +1,12 @@
 import pandas as pd
 import numpy as np
 import lib.sql as sql
+import lib.parsers as parsers
+import staging
 
 from postgres import Postgres
 from lib.fighters import Fighters
+from lib.fighter_ids import FighterIds
 
 
 class Fights:
@@ -26,58 +29,35 @@ class Fights:
 
     modifiers = ["landed", "attempted", "absorbed"]
 
-    @staticmethod
-    def time_to_seconds(t: str) -> int:
-        if pd.isnull(t):
-            return np.nan
-        if t == "0:00":
-            return 0
-        if "--" in t:
-            return np.nan
-        t = t.split(":")
-        return int(t[0]) * 60 + int(t[1])
-
-    @staticmethod
-    def fight_results_time(row):
-        returner = Fights.time_to_seconds(row["time"])
-        if pd.isnull(returner):
-            returner = row["round"] * 300
-        row["time"] = returner
-        return row
-
-    @staticmethod
-    def total_duration(row):
-        returner = 0
-        if row["round"] == 1:
-            returner = row["time"]
-        returner = row["time"] + (row["round"] - 1) * 300
-        row["total_time"] = returner
-        return row
-
-    @staticmethod
-    def round_to_int(round):
-        if pd.isnull(round):
-            return None
-        return int(round.split(" ")[1])
-
-    @staticmethod
-    def get_stat_part(key, stat):
-        if not isinstance(stat, str):
-            return None
-        if pd.isnull(stat):
-            return None
-        splitted = stat.split(" of ")
-        if len(splitted) == 2:
-            return splitted[key]
-        return None
-
-    @staticmethod
-    def get_left_stat(stat):
-        return Fights.get_stat_part(0, stat)
-
-    @staticmethod
-    def get_right_stat(stat):
-        return Fights.get_stat_part(1, stat)
+    # values of e_fight_method, fights with any other method can't be stored
+    methods = ["decision", "submission", "ko/tko", "draw", "no_contest"]
+
+    # columns of fights_df stored in fight_stats, as (property, modifier)
+    stat_columns = {
+        "total_str_attempted": ("total_strikes", "attempted"),
+        "total_str_landed": ("total_strikes", "landed"),
+        "sig_str_attempted": ("significant_strikes", "attempted"),
+        "sig_str_landed": ("significant_strikes", "landed"),
+        "td_attempted": ("takedowns", "attempted"),
+        "td_landed": ("takedowns", "landed"),
+        "head_attempted": ("head_strikes", "attempted"),
+        "head_landed": ("head_strikes", "landed"),
+        "body_attempted": ("body_strikes", "attempted"),
+        "body_landed": ("body_strikes", "landed"),
+        "leg_attempted": ("leg_strikes", "attempted"),
+        "leg_landed": ("leg_strikes", "landed"),
+        "distance_attempted": ("distance_strikes", "attempted"),
+        "distance_landed": ("distance_strikes", "landed"),
+        "clinch_attempted": ("clinch_strikes", "attempted"),
+        "clinch_landed": ("clinch_strikes", "landed"),
+        "ground_attempted": ("ground_strikes", "attempted"),
+        "ground_landed": ("ground_strikes", "landed"),
+        "submissions_attempted": ("submissions", "attempted"),
+        "reversals_landed": ("reversals", "landed"),
+        "knockdowns_landed": ("knockdowns", "landed"),
+        "control_time": ("control_time", None),
+        "age": ("age", None),
+    }
 
     def all(self) -> pd.DataFrame:
         returner = pd.DataFrame(
@@ -111,11 +91,110 @@ class Fights:
         )
         return returner
 
+    def _upsert(self, fights_df: pd.DataFrame, ids: FighterIds) -> None:
+        # fights_df has a row per fighter per fight, both rows of a fight go into one row of
+        # fights, oriented like the first of them
+        # all rows are loaded into temporary tables with COPY and upserted from there with one
+        # statement per table, in one transaction
+        fights_df = fights_df.assign(
+            fighter_id=ids.map(fights_df["fighter"]),
+            opponent_id=ids.map(fights_df["opponent"]),
+        )
+        fights_df = fights_df[fights_df["method"].isin(Fights.methods)].dropna(
+            subset=["fighter_id", "opponent_id"]
+        )
+        fights_df = fights_df.astype({"fighter_id": int, "opponent_id": int})
+        fights_df["ord"] = range(len(fights_df))
+        fights_df["date"] = fights_df["date"].dt.strftime("%Y-%m-%d")
+        fights_df["winner_id"] = fights_df["fighter_id"].where(
+            fights_df["outcome"] < 1.0, fights_df["opponent_id"]
+        )
+
+        keys = ["ord", "date", "fighter_id", "opponent_id"]
+        stat_columns = [col for col in Fights.stat_columns if col in fights_df.columns]
+        stats_df = fights_df[keys + stat_columns].melt(
+            id_vars=keys, var_name="column", value_name="value"
+        )
+        stats_df = stats_df.dropna(subset=["value"])
+        stats_df["property"] = stats_df["column"].map(
+            {col: property for col, (property, _) in Fights.stat_columns.items()}
+        )
+        stats_df["modifier"] = stats_df["column"].map(
+            {col: modifier for col, (_, modifier) in Fights.stat_columns.items()}
+        )
+
+        fight_columns = ["ord", "date", "method", "total_time"]
+        fight_columns += ["fighter_id", "opponent_id", "winner_id"]
+        stat_columns = keys + ["property", "modifier", "value"]
+        print(
+            "upserting fights of %d fighters with %d stats"
+            % (fights_df.shape[0], stats_df.shape[0])
+        )
+        if not self._pg.copy_in(
+            [
+                (
+                    "COPY fights_staging FROM STDIN WITH CSV",
+                    fights_df[fight_columns].to_csv(header=False, index=False),
+                ),
+                (
+                    "COPY fight_stats_staging FROM STDIN WITH CSV",
+                    stats_df[stat_columns].to_csv(header=False, index=False),
+                ),
+            ],
+            queries=[
+                (
+                    "CREATE TEMPORARY TABLE fights_staging (ord INTEGER, date DATE, method e_fight_method, duration FLOAT(53), fighter_id INTEGER, opponent_id INTEGER, winner_id INTEGER) ON COMMIT DROP",
+                    None,
+                ),
+                (
+                    "CREATE TEMPORARY TABLE fight_stats_staging (ord INTEGER, date DATE, fighter_id INTEGER, opponent_id INTEGER, property e_fight_property, modifier e_fight_property_modifier, value FLOAT(53)) ON COMMIT DROP",
+                    None,
+                ),
+            ],
+            after=[
+                # a fight is the same fight whichever of its fighters is fighter_id, which
+                # fights_fighters_date_idx enforces, so fights already stored either way are
+                # left as they are
+                (
+                    """
+                    INSERT INTO fights (date, method, duration, fighter_id, opponent_id, winner_id)
+                    SELECT DISTINCT ON (s.date, LEAST(s.fighter_id, s.opponent_id), GREATEST(s.fighter_id, s.opponent_id))
+                      s.date, s.method, s.duration, s.fighter_id, s.opponent_id, s.winner_id
+                    FROM fights_staging s
+                    ORDER BY s.date, LEAST(s.fighter_id, s.opponent_id), GREATEST(s.fighter_id, s.opponent_id), s.ord
+                    ON CONFLICT (LEAST(fighter_id, opponent_id), GREATEST(fighter_id, opponent_id), date) DO NOTHING
+                    """,
+                    None,
+                ),
+                # the last value of a stat wins, like it did when rows were upserted one by one
+                (
+                    """
+                    INSERT INTO fight_stats (property, modifier, type, value, fighter_id, fight_id)
+                    SELECT DISTINCT ON (f.id, s.fighter_id, s.property, s.modifier)
+                      s.property, s.modifier, 'total', s.value, s.fighter_id, f.id
+                    FROM fight_stats_staging s
+                    JOIN fights f
+                      ON f.date = s.date
+                      AND LEAST(f.fighter_id, f.opponent_id) = LEAST(s.fighter_id, s.opponent_id)
+                      AND GREATEST(f.fighter_id, f.opponent_id) = GREATEST(s.fighter_id, s.opponent_id)
+                    ORDER BY f.id, s.fighter_id, s.property, s.modifier, s.ord DESC
+                    ON CONFLICT (fight_id, fighter_id, property, modifier, type) DO UPDATE SET value = EXCLUDED.value
+                    """,
+                    None,
+                ),
+            ],
+        ):
+            raise RuntimeError("could not upsert fights")
+
     def __init__(self, skip_creation=False):
         self._pg = Postgres()
         if not skip_creation:
-            fighters_df = Fighters(True).all()
-            events_df = pd.read_csv("./ufc_event_details.csv")
+            fighters = Fighters(True)
+            ids = fighters.ids()
+            fighters_df = (
+                fighters.all().drop_duplicates(subset=["row_id"]).set_index("row_id")
+            )
+            events_df = staging.read("event_details", "./ufc_event_details.csv")
             events_column_mapping = {}
             for col in events_df.columns:
                 events_column_mapping[col] = col.lower()
@@ -131,7 +210,7 @@ class Fights:
             )
             events_df["date"] = pd.to_datetime(events_df["date"]).dropna()
 
-            fight_results_df = pd.read_csv("./ufc_fight_results.csv")
+            fight_results_df = staging.read("fight_results", "./ufc_fight_results.csv")
             fight_results_column_mapping = {}
             for col in fight_results_df.columns:
                 fight_results_column_mapping[col] = col.lower()
@@ -241,22 +320,21 @@ class Fights:
             fight_results_df = pd.merge(
                 fight_results_df, events_df[["event", "date"]], on="event", how="left"
             ).dropna()
-            fight_results_df = (
-                fight_results_df.apply(Fights.fight_results_time, axis=1)
-                .apply(pd.Series)
-                .dropna()
+            fight_results_df["time"] = parsers.time_to_seconds(fight_results_df["time"])
+            # fights without a time went the distance
+            fight_results_df["time"] = fight_results_df["time"].fillna(
+                fight_results_df["round"] * 300
+            )
+            fight_results_df = fight_results_df.dropna()
+            fight_results_df["total_time"] = (
+                fight_results_df["time"] + (fight_results_df["round"] - 1) * 300
             )
-            fight_results_df = fight_results_df.apply(Fights.total_duration, axis=1)
             fight_results_df = fight_results_df.drop(
                 columns=["url", "time format"], axis=1
             )
 
-            fight_stats_df = pd.read_csv("./ufc_fight_stats.csv")
-            fight_stats_df["ROUND"] = fight_stats_df["ROUND"].apply(Fights.round_to_int)
-            fight_stats_df["ROUND"] = fight_stats_df["ROUND"].replace(
-                [np.inf, -np.inf], np.nan
-            )
-            fight_stats_df["ROUND"] = fight_stats_df["ROUND"].dropna()
+            fight_stats_df = staging.read("fight_stats", "./ufc_fight_stats.csv")
+            fight_stats_df["ROUND"] = parsers.round_to_int(fight_stats_df["ROUND"])
 
             for after, before in [
                 ["SIG_STR_", "SIG.STR."],
@@ -269,26 +347,12 @@ class Fights:
                 ["CLINCH_", "CLINCH"],
                 ["GROUND_", "GROUND"],
             ]:
-                fight_stats_df[after + "LANDED"] = (
-                    fight_stats_df[before].apply(Fights.get_left_stat).astype(float)
-                )
-                fight_stats_df[after + "LANDED"] = fight_stats_df[
-                    after + "LANDED"
-                ].astype(float)
-                fight_stats_df[after + "ATTEMPTED"] = fight_stats_df[before].apply(
-                    Fights.get_right_stat
+                fight_stats_df[[after + "LANDED", after + "ATTEMPTED"]] = (
+                    parsers.landed_of_attempted(fight_stats_df[before]).to_numpy()
                 )
-                fight_stats_df[after + "ATTEMPTED"] = fight_stats_df[
-                    after + "ATTEMPTED"
-                ].astype(float)
                 fight_stats_df.drop(columns=[before], inplace=True)
 
-            fight_stats_df["CTRL"] = (
-                fight_stats_df["CTRL"]
-                .apply(Fights.time_to_seconds)
-                .dropna()
-                .astype(float)
-            )
+            fight_stats_df["CTRL"] = parsers.time_to_seconds(fight_stats_df["CTRL"])
             fight_stats_df.drop(columns=["SIG.STR. %", "TD %"], inplace=True)
             fight_stats_df["EVENT"] = (
                 fight_stats_df["EVENT"]
@@ -319,207 +383,93 @@ class Fights:
                 mapper=fight_stats_column_mapping, errors="raise", axis=1
             ).reset_index(drop=True)
 
-            def get_fight_data(fighter, event, bout):
-                fight_results_row = fight_results_df[
+            # one row per fighter of each fight, with their opponent and the result of the fight
+            # fighter_b's outcome is flipped, as fight results record outcomes from fighter_a's side
+            fight_keys = ["fighter", "event", "bout"]
+            result_columns = ["date", "opponent", "outcome", "method", "total_time"]
+            fighter_a_results = fight_results_df.rename(
+                columns={"fighter_a": "fighter", "fighter_b": "opponent"}
+            )[fight_keys + result_columns]
+            fighter_b_results = fight_results_df.rename(
+                columns={"fighter_b": "fighter", "fighter_a": "opponent"}
+            )[fight_keys + result_columns]
+            fighter_b_results["outcome"] = (fighter_b_results["outcome"] == 0).astype(
+                int
+            )
+            # a fighter's first result of a bout wins, in the order of fight_results_df
+            fighter_results = (
+                pd.concat(
                     [
-                        "fighter_a",
-                        "fighter_b",
-                        "date",
-                        "outcome",
-                        "method",
-                        "total_time",
-                    ]
-                ][
-                    (
-                        (fight_results_df["fighter_a"] == fighter)
-                        | (fight_results_df["fighter_b"] == fighter)
-                    )
-                    & (fight_results_df["event"] == event)
-                    & (fight_results_df["bout"] == bout)
-                ]
-                if fight_results_row.empty:
-                    return [None, None, None, None, None]
-                outcome = fight_results_row["outcome"].values[0]
-                method = fight_results_row["method"].values[0]
-                if fight_results_row["fighter_a"].values[0] == fighter:
-                    return [
-                        fight_results_row["fighter_b"].values[0],
-                        fight_results_row["date"].values[0],
-                        outcome,
-                        method,
-                        fight_results_row["total_time"].values[0],
+                        fighter_a_results.assign(
+                            position=np.arange(len(fighter_a_results)), side=0
+                        ),
+                        fighter_b_results.assign(
+                            position=np.arange(len(fighter_b_results)), side=1
+                        ),
                     ]
-                return [
-                    fight_results_row["fighter_a"].values[0],
-                    fight_results_row["date"].values[0],
-                    1 if outcome == 0 else 0,
-                    method,
-                    fight_results_row["total_time"].values[0],
-                ]
-
-            def apply_fight_data(row):
-                (
-                    row["opponent"],
-                    row["date"],
-                    row["outcome"],
-                    row["method"],
-                    row["total_time"],
-                ) = get_fight_data(row["fighter"], row["event"], row["bout"])
-                return row
-
-            fight_stats_df = fight_stats_df.apply(apply_fight_data, axis=1).dropna()
-
-            def get_fighter_stats(fighter, event, bout):
-                fighter_results = fight_stats_df[
-                    (fight_stats_df["fighter"] == fighter)
-                    & (fight_stats_df["event"] == event)
-                    & (fight_stats_df["bout"] == bout)
-                ]
-                if fighter_results.shape[0] == 0:
-                    return None
-                fight_date = fighter_results["date"].head(1).item()
-                fighter_results = fighter_results.drop(
-                    columns=["fighter", "event", "bout", "round"]
                 )
-                fighter_stats = fighters_df[
-                    ["weight", "height", "reach", "date_of_birth"]
-                ][fighters_df["name"] == fighter].head(1)
-                if fighter_stats.shape[0] == 0:
-                    return None
-                opponent_name = fighter_results["opponent"].head(1).item()
-                age = fight_date - fighter_stats["date_of_birth"].item()
-                age = age.days / 365.25
-                returner = {
-                    "date": fight_date,
-                    "event": event,
-                    "bout": bout,
-                    "fighter": fighter,
-                    "opponent": opponent_name,
-                    "weight": float(fighter_stats["weight"].astype(float).values[0]),
-                    "height": float(fighter_stats["height"].astype(float).values[0]),
-                    "reach": float(fighter_stats["reach"].astype(float).values[0]),
-                    "age": float(age),
-                    "outcome": float(
-                        fighter_results["outcome"].astype(float).values[0]
-                    ),
-                    "method": fighter_results["method"].values[0],
-                    "total_time": float(
-                        fighter_results["total_time"].astype(float).values[0]
-                    ),
-                }
-                for col in filter(
-                    lambda x: x.endswith("landed")
-                    or x.endswith("attempted")
-                    or x == "control_time",
-                    fighter_results.columns,
-                ):
-                    returner[col] = float(fighter_results[col].sum())
-                return returner
+                .sort_values(["position", "side"], kind="stable")
+                .drop_duplicates(subset=fight_keys)
+                .drop(columns=["position", "side"])
+            )
 
-            def apply_get_fighter_stats(row):
-                return get_fighter_stats(row["fighter"], row["event"], row["bout"])
+            # every round with the result of its fight, rounds without a result are dropped
+            fight_stats_df = fight_stats_df.merge(
+                fighter_results, on=fight_keys, how="left"
+            ).dropna()
 
-            unique_fights = fight_stats_df[
-                ["fighter", "event", "bout"]
-            ].drop_duplicates()
-            unique_fights["fighter"] = unique_fights["fighter"].str.strip().dropna()
-            unique_fights["event"] = unique_fights["event"].str.strip().dropna()
-            unique_fights["bout"] = unique_fights["bout"].str.strip().dropna()
+            # one row per fighter of each fight, the stats of its rounds summed
+            stat_columns = [
+                col
+                for col in fight_stats_df.columns
+                if col.endswith("landed")
+                or col.endswith("attempted")
+                or col == "control_time"
+            ]
+            fight_groups = fight_stats_df.groupby(fight_keys, sort=False)
             fights_df = (
-                unique_fights.apply(apply_get_fighter_stats, axis=1)
-                .apply(pd.Series)
-                .dropna()
+                fight_groups[result_columns]
+                .first()
+                .join(fight_groups[stat_columns].sum())
+                .reset_index()
             )
 
-            for index, row in fights_df.iterrows():
-                print("\n\nfight %s - %s" % (row["event"], row["bout"]))
-                fighter = fighters_df[(fighters_df["name"] == row["fighter"])]
-                if fighter.empty:
-                    continue
-                opponent = fighters_df[(fighters_df["name"] == row["opponent"])]
-                if opponent.empty:
-                    continue
-                fighter_id = int(fighter["row_id"].values[0])
-                opponent_id = int(opponent["row_id"].values[0])
-                # Can't just upsert because the fighter could be the fighter or the opponent and we don't want to create two rows per fight
-                existing_id = self._pg.one(
-                    "SELECT id FROM fights WHERE date = %s AND (fighter_id = %s OR fighter_id = %s) AND (opponent_id = %s OR opponent_id = %s)",
-                    (
-                        row["date"].to_datetime64().astype(str),
-                        fighter_id,
-                        opponent_id,
-                        fighter_id,
-                        opponent_id,
-                    ),
-                )
-                row_id = None
-                if existing_id:
-                    row_id = existing_id
-                else:
-                    row_id = self._pg.insert(
-                        "INSERT INTO fights (date, method, duration, fighter_id, opponent_id, winner_id) VALUES (%s, %s, %s, %s, %s, %s) ON CONFLICT (fighter_id, opponent_id, date) DO NOTHING RETURNING id",
-                        (
-                            row["date"].to_datetime64().astype(str),
-                            row["method"],
-                            row["total_time"],
-                            fighter_id,
-                            opponent_id,
-                            (fighter_id if row["outcome"] < 1.0 else opponent_id),
-                        ),
-                    )
-                fights_df.at[index, "row_id"] = row_id
-                for from_stat, to_stat in [
-                    ("total_str", "total_strikes"),
-                    ("sig_str", "significant_strikes"),
-                    ("td", "takedowns"),
-                    ("head", "head_strikes"),
-                    ("body", "body_strikes"),
-                    ("leg", "leg_strikes"),
-                    ("distance", "distance_strikes"),
-                    ("clinch", "clinch_strikes"),
-                    ("ground", "ground_strikes"),
-                    ("submissions", "submissions"),
-                    ("reversals", "reversals"),
-                    ("knockdowns", "knockdowns"),
-                ]:
-                    for k in ["attempted", "landed"]:
-                        if from_stat + "_" + k not in row:
-                            continue
-                        v = row[from_stat + "_" + k]
-                        print("%s_%s: %s" % (from_stat, k, v))
-                        if v is None:
-                            continue
-                        self._pg.insert(
-                            "insert into fight_stats (property, modifier, type, value, fighter_id, fight_id) values (%s, %s, %s, %s, %s, %s) on conflict (fight_id, fighter_id, property, modifier, type) do update set value = excluded.value returning id",
-                            (
-                                to_stat,
-                                k,
-                                "total",
-                                v,
-                                fighter_id,
-                                row_id,
-                            ),
-                        )
+            # measurements and age of each fighter, fighters that aren't stored are dropped
+            fighter_ids = ids.map(fights_df["fighter"])
+            stored = fighter_ids.isin(fighters_df.index)
+            fights_df = fights_df[stored]
+            fighter_attributes = fighters_df.loc[
+                fighter_ids[stored].astype(int),
+                ["weight", "height", "reach", "date_of_birth"],
+            ]
+            fighter_attributes.index = fights_df.index
+            fights_df = fights_df.join(fighter_attributes)
+            fights_df["age"] = (
+                fights_df["date"] - fights_df["date_of_birth"]
+            ).dt.days / 365.25
+            fights_df = fights_df.astype(
+                {
+                    col: float
+                    for col in ["weight", "height", "reach", "outcome", "total_time"]
+                    + stat_columns
+                }
+            )
+            fights_df = fights_df[
+                [
+                    "date",
+                    "event",
+                    "bout",
+                    "fighter",
+                    "opponent",
+                    "weight",
+                    "height",
+                    "reach",
+                    "age",
+                    "outcome",
+                    "method",
+                    "total_time",
+                ]
+                + stat_columns
+            ].dropna()
 
-                self._pg.insert(
-                    "insert into fight_stats (property, modifier, type, value, fighter_id, fight_id) values (%s, %s, %s, %s, %s, %s) on conflict (fight_id, fighter_id, property, modifier, type) do update set value = excluded.value returning id",
-                    (
-                        "control_time",
-                        None,
-                        "total",
-                        row["control_time"],
-                        fighter_id,
-                        row_id,
-                    ),
-                )
-                self._pg.insert(
-                    "insert into fight_stats (property, modifier, type, value, fighter_id, fight_id) values (%s, %s, %s, %s, %s, %s) on conflict (fight_id, fighter_id, property, modifier, type) do update set value = excluded.value returning id",
-                    (
-                        "age",
-                        None,
-                        "total",
-                        row["age"],
-                        fighter_id,
-                        row_id,
-                    ),
-                )
+            self._upsert(fights_df, ids)
@@ -0,0 +1,55 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# parsers of the string fields scraped from ufcstats.com
+# every parser takes a whole column and returns floats, values that do not parse become NaN
+
+
+def _extract(column: pd.Series, pattern: str) -> pd.DataFrame:
+    # numbers captured by the named groups of pattern, one regex pass over the column
+    # the regex runs in arrow, pandas' str.extract runs python's re on every value
+    matches = pc.extract_regex(
+        pa.array(column.astype(object), type=pa.string(), from_pandas=True), pattern
+    )
+    return pd.DataFrame(
+        {
+            field.name: pc.cast(
+                pc.struct_field(matches, field.name), pa.float64()
+            ).to_numpy(zero_copy_only=False)
+            for field in matches.type
+        },
+        index=column.index,
+    )
+
+
+def height_to_inches(height: pd.Series) -> pd.Series:
+    # 5' 11"
+    parts = _extract(height, r"^(?P<feet>\d+)' (?P<inches>\d+)\"?$")
+    return parts["feet"] * 12 + parts["inches"]
+
+
+def reach_to_inches(reach: pd.Series) -> pd.Series:
+    # 72"
+    return _extract(reach, r"^(?P<inches>\d+)\"?$")["inches"]
+
+
+def weight_to_num(weight: pd.Series) -> pd.Series:
+    # 155 lbs.
+    return _extract(weight, r"^(?P<pounds>\d+) lbs\.$")["pounds"]
+
+
+def time_to_seconds(time: pd.Series) -> pd.Series:
+    # 4:05, "--" when there is no time
+    parts = _extract(time, r"^(?P<minutes>\d+):(?P<seconds>\d+)$")
+    return parts["minutes"] * 60 + parts["seconds"]
+
+
+def round_to_int(round: pd.Series) -> pd.Series:
+    # Round 2
+    return _extract(round, r"^\S+ (?P<round>\d+)$")["round"]
+
+
+def landed_of_attempted(stat: pd.Series) -> pd.DataFrame:
+    # 12 of 30, split into landed and attempted
+    return _extract(stat, r"^(?P<landed>\d+) of (?P<attempted>\d+)$")
@@ -1,6 +0,0 @@
-SELECT
-  id
-FROM
-  fighters
-WHERE
-  name = %s;
@@ -0,0 +1,9 @@
+SELECT
+  fighter_id,
+  property,
+  type,
+  value
+FROM
+  fighter_stats
+ORDER BY
+  id DESC
@@ -0,0 +1,154 @@
+import glob
+import hashlib
+import inspect
+import os
+import weakref
+import pandas as pd
+
+# a pipeline of stages whose results are cached on disk
+# a stage is cached under a hash of its code, its sources and the hashes of its inputs, so
+# editing a stage, or anything upstream of it, recomputes it and every stage downstream of it,
+# while everything else is loaded from the cache
+
+
+def _code_names(code) -> set[str]:
+    # global names used by code and by the lambdas and comprehensions inside it
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _in_project(obj, root: str) -> bool:
+    path = getattr(inspect.getmodule(obj), "__file__", None)
+    if path is None:
+        return False
+    path = os.path.abspath(path)
+    return path.startswith(root + os.sep) and "site-packages" not in path
+
+
+def code_hash(function: callable) -> str:
+    # hash of the source of function and of everything of the project it uses, i.e. the
+    # functions, classes, modules and constants it refers to and, in turn, what those refer to
+    root = os.path.dirname(os.path.abspath(inspect.getfile(function)))
+    sources = []
+    seen = set()
+
+    def add(obj):
+        if id(obj) in seen:
+            return
+        seen.add(id(obj))
+        if inspect.ismodule(obj) or inspect.isclass(obj):
+            if _in_project(obj, root):
+                sources.append(inspect.getsource(obj))
+        elif inspect.isfunction(obj):
+            if _in_project(obj, root):
+                sources.append(inspect.getsource(obj))
+                for name in sorted(_code_names(obj.__code__)):
+                    if name in obj.__globals__:
+                        add(obj.__globals__[name])
+        elif isinstance(obj, (bool, int, float, str, tuple, list, dict)):
+            sources.append(repr(obj))
+
+    add(function)
+    return hashlib.sha256("\n".join(sources).encode("utf-8")).hexdigest()
+
+
+class Pipeline:
+    def stage(
+        self,
+        name: str,
+        function: callable,
+        inputs: list[str] = [],
+        sources: list[str] = [],
+    ) -> None:
+        # function takes the results of inputs in order, sources identify the data it reads
+        # itself, e.g. staging.fingerprint() of its files
+        for input in inputs:
+            if input not in self._stages:
+                raise ValueError("stage %s needs unknown stage %s" % (name, input))
+        self._stages[name] = {
+            "function": function,
+            "inputs": list(inputs),
+            "sources": list(sources),
+        }
+
+    def key(self, name: str) -> str:
+        if name not in self._keys:
+            stage = self._stages[name]
+            self._keys[name] = hashlib.sha256(
+                "\n".join(
+                    [name, code_hash(stage["function"])]
+                    + stage["sources"]
+                    + [self.key(input) for input in stage["inputs"]]
+                ).encode("utf-8")
+            ).hexdigest()
+        return self._keys[name]
+
+    def names(self) -> list[str]:
+        # stages in the order they were added, i.e. every stage after its inputs
+        return list(self._stages)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._directory, "%s.%s.pkl" % (name, self.key(name)[:16]))
+
+    def inputs(self, name: str, **options) -> list:
+        return [self.run(input, **options) for input in self._stages[name]["inputs"]]
+
+    def compute(self, name: str, inputs: list, **options) -> any:
+        # options are passed on to the stage functions that take them, and must not change
+        # their results, e.g. a number of worker processes
+        function = self._stages[name]["function"]
+        parameters = inspect.signature(function).parameters
+        return function(
+            *inputs,
+            **{key: value for key, value in options.items() if key in parameters},
+        )
+
+    def save(self, name: str, result: any) -> None:
+        if not self._use_cache:
+            return
+        # only the latest result of a stage is kept
+        for stale in glob.glob(os.path.join(self._directory, name + ".*.pkl")):
+            os.remove(stale)
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._path(name)
+        pd.to_pickle(result, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def run(self, name: str, **options) -> any:
+        # result of a stage, the one of this run while the caller still holds it, else from the
+        # cache when it is there, else computed from its inputs
+        returner = self._results.get(name)
+        if returner is not None:
+            return returner
+        path = self._path(name)
+        if self._use_cache and os.path.exists(path):
+            print("using cached %s" % name)
+            returner = pd.read_pickle(path)
+        else:
+            returner = self.compute(name, self.inputs(name, **options), **options)
+            self.save(name, returner)
+        # results are only referenced weakly, so a result the caller let go of is freed, which
+        # keeps the peak memory of a run down, tuples can't be referenced weakly and are not kept
+        try:
+            self._results[name] = returner
+        except TypeError:
+            pass
+        if self._on_stage is not None:
+            self._on_stage(name)
+        return returner
+
+    def __init__(
+        self,
+        directory: str,
+        use_cache: bool = True,
+        on_stage: callable = None,
+    ):
+        self._directory = directory
+        self._use_cache = use_cache
+        self._on_stage = on_stage
+        self._stages = {}
+        self._keys = {}
+        self._results = weakref.WeakValueDictionary()
@@ -1,24 +1,46 @@
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
 import xgboost as xgb
 from odds import Odds
+from fighter_ids import normalize, normalize_names
 from datetime import datetime, timedelta
 import sql as sql
 
 oddsApi = Odds()
 
 
+def read_fighter_stats(path="fighter_stats.parquet"):
+    # Stats rebuilds histories from the stats of each fight and reads averages in fighter_stats(),
+    # the other precomputed columns are not loaded
+    columns = [
+        col
+        for col in pq.read_schema(path).names
+        if not col.startswith(("precomp_", "opponent_precomp_")) or "avg" in col
+    ]
+    return pd.read_parquet(path, columns=columns)
+
+
 class Stats:
+    def fighter_rows(self, fighter):
+        # rows of a fighter from the name index, without a scan of self.df
+        # names match exactly, else normalized unless two names normalize alike
+        positions = self._rows.get(fighter)
+        if positions is None:
+            positions = self._rows.get(self._names.get(normalize(fighter)), [])
+        return self.df.iloc[positions]
+
     def fighter_stats(self, fighter, before=np.datetime64("now")):
         returner = {}
+        rows = self.fighter_rows(fighter)
         latest = (
-            self.df[
+            rows[
                 filter(
                     lambda x: ("avg" in x)
                     or x in ["age", "height", "weight", "reach", "date"],
-                    self.df.columns,
+                    rows.columns,
                 )
-            ][(self.df["fighter"] == fighter) & (self.df["date"] < before)]
+            ][rows["date"] < before]
             .head(1)
             .squeeze()
             .to_dict()
@@ -28,9 +50,8 @@ class Stats:
         return pd.Series(returner)
 
     def fighter_history(self, fighter, date):
-        full_history = self.df[
-            (self.df["fighter"] == fighter) & (self.df["date"] < date)
-        ]
+        rows = self.fighter_rows(fighter)
+        full_history = rows[rows["date"] < date]
         recent_history = full_history[
             full_history["date"] >= date - pd.Timedelta(days=730)
         ]
@@ -213,11 +234,18 @@ class Stats:
 
     def __init__(
         self,
-        dataframe=pd.read_csv("fighter_stats.csv"),
+        dataframe=read_fighter_stats(),
         model_path="model.json",
     ):
         self.df = dataframe.copy()
         self.df["date"] = pd.to_datetime(self.df["date"])
+        # name -> positions of the rows of that fighter
+        self._rows = self.df.groupby(self.df["fighter"].astype(str), sort=False).indices
+        # normalized name -> name, for normalized names of a single name
+        names = pd.Series(list(self._rows), dtype=object)
+        normalized = normalize_names(names)
+        unique = ~normalized.duplicated(keep=False)
+        self._names = dict(zip(normalized[unique], names[unique]))
         print("Copied dataframe size: %d" % self.df.shape[0])
         self.model = xgb.Booster()
         self.model.load_model(model_path)
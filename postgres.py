@@ -1,5 +1,7 @@
+import io
 import os
 import psycopg2
+import psycopg2.extras
 import sqlalchemy.pool as pool
 
 from dotenv import load_dotenv
@@ -58,6 +60,69 @@ class Postgres:
     def insert(self, query: str, params: tuple | None = None) -> int | None:
         return self.one(query, params)
 
+    def values(
+        self, query: str, rows: list[tuple], page_size: int = 1000
+    ) -> list[tuple] | None:
+        # run a multi-row statement whose VALUES %s takes rows, one page of rows per statement,
+        # in one transaction, and return what it returns
+        returner = None
+        conn = self._pool.connect().dbapi_connection
+        cursor = conn.cursor()
+        try:
+            returner = psycopg2.extras.execute_values(
+                cursor, query, rows, page_size=page_size, fetch=True
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print("values err", {"query": query, "rows": len(rows), "err": e})
+        finally:
+            cursor.close()
+        return returner
+
+    def copy_in(
+        self,
+        copies: list[tuple[str, str]],
+        queries: list[tuple[str, tuple | None]] | None = None,
+        after: list[tuple[str, tuple | None]] | None = None,
+    ) -> bool:
+        # run queries, then COPY ... FROM STDIN statements with their csv data, then the queries
+        # in after, in one transaction
+        returner = False
+        conn = self._pool.connect().dbapi_connection
+        cursor = conn.cursor()
+        try:
+            for query, params in queries or []:
+                cursor.execute(query, params)
+            for statement, data in copies:
+                cursor.copy_expert(statement, io.StringIO(data))
+            for query, params in after or []:
+                cursor.execute(query, params)
+            conn.commit()
+            returner = True
+        except Exception as e:
+            conn.rollback()
+            print("copy err", {"statements": [c[0] for c in copies], "err": e})
+        finally:
+            cursor.close()
+        return returner
+
+    def copy_out(self, statement: str) -> str | None:
+        # run a COPY ... TO STDOUT statement and return its output
+        returner = None
+        conn = self._pool.connect().dbapi_connection
+        cursor = conn.cursor()
+        buffer = io.StringIO()
+        try:
+            cursor.copy_expert(statement, buffer)
+            returner = buffer.getvalue()
+        except Exception as e:
+            print("copy err", {"statement": statement, "err": e})
+        finally:
+            cursor.close()
+            conn.commit()
+        return returner
+
     def __init__(self, **kwargs):
         self._cfg = {
             "user": kwargs.get("user", USER),
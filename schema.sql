@@ -28,7 +28,7 @@ DROP TYPE IF EXISTS "e_fighter_property" CASCADE;
 CREATE TYPE "e_fighter_property" AS ENUM (
   'height',
   'weight',
-  'reach',
+  'reach'
 );
 DROP TYPE IF EXISTS "e_stat_type" CASCADE;
 CREATE TYPE "e_stat_type" AS ENUM (
@@ -65,9 +65,10 @@ CREATE TABLE "fights" (
   "duration" FLOAT(53) NOT NULL,
   "fighter_id" INTEGER NOT NULL REFERENCES "fighters" ("id"),
   "opponent_id" INTEGER NOT NULL REFERENCES "fighters" ("id"),
-  "winner_id" INTEGER NOT NULL REFERENCES "fighters" ("id"),
-  UNIQUE ("fighter_id", "opponent_id", "date")
+  "winner_id" INTEGER NOT NULL REFERENCES "fighters" ("id")
 ) WITH (oids = FALSE);
+-- a fight is the same fight whichever of its fighters is fighter_id
+CREATE UNIQUE INDEX "fights_fighters_date_idx" ON "fights" (LEAST("fighter_id", "opponent_id"), GREATEST("fighter_id", "opponent_id"), "date");
 
 DROP TYPE IF EXISTS "e_fight_property_modifier" CASCADE;
 CREATE TYPE "e_fight_property_modifier" AS ENUM (
@@ -108,5 +109,100 @@ CREATE TABLE "fight_stats" (
   "value" FLOAT(53) NOT NULL,
   "fighter_id" INTEGER NOT NULL REFERENCES "fighters" ("id"),
   "fight_id" INTEGER NOT NULL REFERENCES "fights" ("id"),
-  UNIQUE ("fight_id", "fighter_id", "property", "modifier", "type")
+  UNIQUE NULLS NOT DISTINCT ("fight_id", "fighter_id", "property", "modifier", "type")
+) WITH (oids = FALSE);
+
+-- raw staging tables written by the scraper when DATA_SOURCE=postgres
+-- each mirrors one of the scraped csv files, with text columns named after the csv header
+-- "_run" is the scrape run that wrote a row and "_row" the order rows were written in
+DROP TABLE IF EXISTS "raw_event_details" CASCADE;
+CREATE TABLE "raw_event_details" (
+  "_row" BIGSERIAL PRIMARY KEY,
+  "_run" BIGINT NOT NULL,
+  "EVENT" TEXT,
+  "URL" TEXT,
+  "DATE" TEXT,
+  "LOCATION" TEXT
+) WITH (oids = FALSE);
+
+DROP TABLE IF EXISTS "raw_fight_details" CASCADE;
+CREATE TABLE "raw_fight_details" (
+  "_row" BIGSERIAL PRIMARY KEY,
+  "_run" BIGINT NOT NULL,
+  "EVENT" TEXT,
+  "BOUT" TEXT,
+  "URL" TEXT
 ) WITH (oids = FALSE);
+
+CREATE INDEX "raw_fight_details_run_idx" ON "raw_fight_details" ("_run");
+
+DROP TABLE IF EXISTS "raw_fight_results" CASCADE;
+CREATE TABLE "raw_fight_results" (
+  "_row" BIGSERIAL PRIMARY KEY,
+  "_run" BIGINT NOT NULL,
+  "EVENT" TEXT,
+  "BOUT" TEXT,
+  "OUTCOME" TEXT,
+  "WEIGHTCLASS" TEXT,
+  "METHOD" TEXT,
+  "ROUND" TEXT,
+  "TIME" TEXT,
+  "TIME FORMAT" TEXT,
+  "REFEREE" TEXT,
+  "DETAILS" TEXT,
+  "URL" TEXT
+) WITH (oids = FALSE);
+
+CREATE INDEX "raw_fight_results_run_idx" ON "raw_fight_results" ("_run");
+
+DROP TABLE IF EXISTS "raw_fight_stats" CASCADE;
+CREATE TABLE "raw_fight_stats" (
+  "_row" BIGSERIAL PRIMARY KEY,
+  "_run" BIGINT NOT NULL,
+  "EVENT" TEXT,
+  "BOUT" TEXT,
+  "ROUND" TEXT,
+  "FIGHTER" TEXT,
+  "KD" TEXT,
+  "SIG.STR." TEXT,
+  "SIG.STR. %" TEXT,
+  "TOTAL STR." TEXT,
+  "TD" TEXT,
+  "TD %" TEXT,
+  "SUB.ATT" TEXT,
+  "REV." TEXT,
+  "CTRL" TEXT,
+  "HEAD" TEXT,
+  "BODY" TEXT,
+  "LEG" TEXT,
+  "DISTANCE" TEXT,
+  "CLINCH" TEXT,
+  "GROUND" TEXT
+) WITH (oids = FALSE);
+
+CREATE INDEX "raw_fight_stats_run_idx" ON "raw_fight_stats" ("_run");
+
+DROP TABLE IF EXISTS "raw_fighter_details" CASCADE;
+CREATE TABLE "raw_fighter_details" (
+  "_row" BIGSERIAL PRIMARY KEY,
+  "_run" BIGINT NOT NULL,
+  "FIRST" TEXT,
+  "LAST" TEXT,
+  "NICKNAME" TEXT,
+  "URL" TEXT
+) WITH (oids = FALSE);
+
+DROP TABLE IF EXISTS "raw_fighter_tott" CASCADE;
+CREATE TABLE "raw_fighter_tott" (
+  "_row" BIGSERIAL PRIMARY KEY,
+  "_run" BIGINT NOT NULL,
+  "FIGHTER" TEXT,
+  "HEIGHT" TEXT,
+  "WEIGHT" TEXT,
+  "REACH" TEXT,
+  "STANCE" TEXT,
+  "DOB" TEXT,
+  "URL" TEXT
+) WITH (oids = FALSE);
+
+CREATE INDEX "raw_fighter_tott_url_idx" ON "raw_fighter_tott" ("URL");
@@ -0,0 +1,232 @@
+'''
+Overview
+
+persistent on-disk cache of scraped pages
+
+pages are stored compressed and content-addressed, i.e. under the sha256 of their content,
+so identical pages are only stored once
+a small index file per url points at the content and records when it was fetched
+
+how long a cached page stays fresh depends on the type of page
+completed events and fight details never change once published so they never expire,
+while listing pages gain new rows and have to be fetched again after a while
+
+in 'replay' mode pages are only ever served from the cache, and a missing page is an error
+this lets parser development and CI runs work without making any network calls
+
+'''
+
+# imports
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+
+# import url classification
+from scrape_ufc_stats_fetcher import url_class
+
+
+
+# default seconds a cached page stays fresh, by url class
+# None means the page never expires
+DEFAULT_TTL = {
+    'event_listing': 24 * 60 * 60,
+    'fighter_listing': 24 * 60 * 60,
+    'fighter': 7 * 24 * 60 * 60,
+    'event': None,
+    'fight': None,
+    'other': 24 * 60 * 60,
+}
+
+# supported cache modes
+MODES = ['normal', 'replay', 'off']
+
+
+
+class CacheMissError(Exception):
+    '''
+    raised in replay mode when a url has not been cached
+    '''
+
+
+
+class ResponseCache:
+    '''
+    on-disk cache of page content keyed by url
+
+    arguments:
+    directory (str): directory to store the cache in
+    mode (str): 'normal' to read and write the cache, 'replay' to only read it
+    ttl (dict): seconds a page stays fresh by url class, None for never expires
+    '''
+
+    def _index_path(self, url):
+        '''
+        path of the index entry of a url
+
+        arguments:
+        url (str): url of page
+
+        returns:
+        path of index file
+        '''
+
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self._cfg['directory'], 'index', key[:2], key + '.json')
+
+    def _object_path(self, content_hash):
+        '''
+        path of the compressed content with the given hash
+
+        arguments:
+        content_hash (str): sha256 of the content
+
+        returns:
+        path of object file
+        '''
+
+        return os.path.join(self._cfg['directory'], 'objects', content_hash[:2], content_hash + '.z')
+
+    def _write_atomic(self, path, data):
+        '''
+        write bytes to a file so that readers never see a partial file
+        the data is written to a temporary file first and then renamed into place
+
+        arguments:
+        path (str): path of file to write
+        data (bytes): data to write
+        '''
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read_entry(self, url):
+        '''
+        read the index entry of a url
+
+        arguments:
+        url (str): url of page
+
+        returns:
+        dict with url, hash and fetched_at, or None if the url is not cached
+        '''
+
+        try:
+            with open(self._index_path(url), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _read_object(self, content_hash):
+        '''
+        read and decompress cached content
+
+        arguments:
+        content_hash (str): sha256 of the content
+
+        returns:
+        content as bytes, or None if the object is missing
+        '''
+
+        try:
+            with open(self._object_path(content_hash), 'rb') as f:
+                return zlib.decompress(f.read())
+        except (FileNotFoundError, zlib.error):
+            return None
+
+    @property
+    def replay(self):
+        return self._cfg['mode'] == 'replay'
+
+    def is_fresh(self, entry):
+        '''
+        check if a cached entry is still fresh for its url class
+
+        arguments:
+        entry (dict): index entry of a url
+
+        returns:
+        True if the entry has not expired
+        '''
+
+        ttl = self._cfg['ttl'].get(url_class(entry['url']))
+        if ttl is None:
+            return True
+        return time.time() - entry['fetched_at'] < ttl
+
+    def get(self, url):
+        '''
+        get cached content of a url
+        expired entries are treated as missing, except in replay mode
+
+        arguments:
+        url (str): url of page
+
+        returns:
+        content as bytes, or None if there is no fresh copy
+        '''
+
+        entry = self._read_entry(url)
+        content = None
+        if entry is not None and (self.replay or self.is_fresh(entry)):
+            content = self._read_object(entry['hash'])
+        if content is None and self.replay:
+            raise CacheMissError('page not in cache: %s' % url)
+
+        # return
+        return content
+
+    def put(self, url, content):
+        '''
+        store content of a url
+        content is only written if no identical content is stored already
+
+        arguments:
+        url (str): url of page
+        content (bytes): content of page
+        '''
+
+        content_hash = hashlib.sha256(content).hexdigest()
+        if not os.path.exists(self._object_path(content_hash)):
+            self._write_atomic(self._object_path(content_hash), zlib.compress(content, 6))
+        entry = {'url': url, 'hash': content_hash, 'fetched_at': time.time()}
+        self._write_atomic(self._index_path(url), json.dumps(entry).encode('utf-8'))
+
+    def items(self, page_type=None):
+        '''
+        iterate over every cached page
+        used to replay a saved corpus of pages, e.g. for benchmarks
+
+        arguments:
+        page_type (str): only yield urls of this class, see url_class()
+
+        returns:
+        a generator of (url, content) tuples
+        '''
+
+        index_directory = os.path.join(self._cfg['directory'], 'index')
+        for root, _, files in os.walk(index_directory):
+            for file_name in sorted(files):
+                if not file_name.endswith('.json'):
+                    continue
+                with open(os.path.join(root, file_name), 'r') as f:
+                    entry = json.load(f)
+                if page_type is not None and url_class(entry['url']) != page_type:
+                    continue
+                content = self._read_object(entry['hash'])
+                if content is not None:
+                    yield entry['url'], content
+
+    def __init__(self, directory, mode='normal', ttl=None):
+        if mode not in MODES:
+            raise ValueError('unknown cache mode %s, expected one of %s' % (mode, MODES))
+        self._cfg = {
+            'directory': directory,
+            'mode': mode,
+            'ttl': dict(DEFAULT_TTL, **(ttl or {})),
+        }
@@ -0,0 +1,246 @@
+'''
+Overview
+
+concurrent fetch layer for the scraper
+
+every page is fetched through one shared requests session so that connections to
+ufcstats.com are kept alive and reused, instead of opening a new connection per url
+a bounded thread pool fetches several urls at once while results are handed back in
+the same order as the urls were given, so callers can zip urls and pages together
+
+requests go through a throttle that limits the rate and concurrency per host,
+failed requests are retried with backoff, and a page is only returned if its status is 200
+anything else raises a FetchError, so error pages are never parsed as data
+when fetching a list of urls, a page that raised can be handed to a callback and skipped instead,
+so one missing page does not stop the crawl
+
+'''
+
+# imports
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import time
+
+# import throttle
+from scrape_ufc_stats_throttle import Throttle, FetchError, CircuitOpenError, parse_retry_after
+
+
+
+# classify url by type of page
+def url_class(url):
+    '''
+    classify a ufcstats url by the type of page it points to
+    the class decides how long a cached copy of the page stays fresh
+
+    arguments:
+    url (str): url of page
+
+    returns:
+    one of 'event_listing', 'event', 'fight', 'fighter_listing', 'fighter', 'other'
+    '''
+
+    if '/statistics/events' in url:
+        return 'event_listing'
+    if '/event-details/' in url:
+        return 'event'
+    if '/fight-details/' in url:
+        return 'fight'
+    if '/statistics/fighters' in url:
+        return 'fighter_listing'
+    if '/fighter-details/' in url:
+        return 'fighter'
+    return 'other'
+
+
+
+class Fetcher:
+    '''
+    fetch pages over a shared keep-alive connection pool
+    using a bounded number of worker threads
+
+    arguments:
+    max_workers (int): number of urls fetched at the same time
+    timeout (float): seconds to wait for a response before giving up
+    cache (ResponseCache): optional on-disk cache consulted before the network
+    throttle (Throttle): rate limits, retries and circuit breakers, defaults to a Throttle with default settings
+    metrics (Metrics): optional collector of request metrics
+    '''
+
+    def _get_session(self):
+        '''
+        create the shared session on first use
+        the connection pool is sized to the number of workers so that
+        every worker can hold a keep-alive connection to the same host
+
+        returns:
+        a requests session
+        '''
+
+        with self._lock:
+            if self._session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=self._cfg['max_workers'],
+                    pool_maxsize=self._cfg['max_workers'],
+                )
+                self._session = requests.Session()
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+        return self._session
+
+    def _get_executor(self):
+        '''
+        create the worker thread pool on first use
+
+        returns:
+        a thread pool executor
+        '''
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._cfg['max_workers'])
+        return self._executor
+
+    def get_page(self, url):
+        '''
+        get raw content of a page
+        throttled, failed and 5xx responses are retried with backoff
+
+        arguments:
+        url (str): url of page to fetch
+
+        returns:
+        content of the page as bytes
+
+        raises:
+        FetchError if the page could not be fetched with status 200
+        '''
+
+        # serve from cache if there is a fresh copy
+        # in replay mode the cache raises on a miss instead of returning None
+        if self._cache is not None:
+            content = self._cache.get(url)
+            if content is not None:
+                if self._metrics is not None:
+                    self._metrics.record_cache_hit(url, len(content))
+                return content
+
+        attempt = 0
+        while True:
+            # get page of url through the shared session
+            # once the host's circuit breaker, rate limit and concurrency cap allow it
+            status_code, retry_after, reason = None, None, None
+            with self._throttle.slot(url):
+                start = time.monotonic()
+                try:
+                    page = self._get_session().get(url, timeout=self._cfg['timeout'])
+                    status_code = page.status_code
+                    retry_after = parse_retry_after(page.headers.get('Retry-After'))
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    reason = repr(e)
+                latency = time.monotonic() - start
+            self._throttle.record(url, status_code, latency)
+            if self._metrics is not None:
+                nbytes = len(page.content) if status_code is not None else 0
+                self._metrics.record_request(url, status_code, latency, nbytes, attempt)
+
+            # only complete pages are cached and returned
+            if status_code == 200:
+                if self._cache is not None:
+                    self._cache.put(url, page.content)
+                return page.content
+
+            # retry or give up
+            if not self._throttle.should_retry(attempt, status_code):
+                raise FetchError(url, status_code, reason)
+            self._throttle.backoff(attempt, retry_after)
+            attempt += 1
+
+    def map(self, urls, on_error=None):
+        '''
+        fetch a list of urls concurrently
+        at most max_workers urls are in flight, plus the same number of fetched pages
+        waiting to be consumed, so memory use does not grow with the length of the list
+        pages are yielded in the same order as urls
+        with on_error, a page that could not be fetched is passed to it and skipped instead of
+        stopping the whole list, a CircuitOpenError still stops it as the host is down
+
+        arguments:
+        urls (list): list of urls to fetch
+        on_error (function): called with the url and FetchError of a page that could not be fetched
+
+        returns:
+        a generator of (url, content) tuples
+        '''
+
+        executor = self._get_executor()
+        # window of submitted fetches, oldest first
+        in_flight = deque()
+        for url in urls:
+            # wait for the oldest fetch once the window is full
+            if len(in_flight) >= self._cfg['max_workers'] * 2:
+                yield from self._result(*in_flight.popleft(), on_error)
+            in_flight.append((url, executor.submit(self.get_page, url)))
+        # drain remaining fetches
+        while in_flight:
+            yield from self._result(*in_flight.popleft(), on_error)
+
+    def _result(self, url, future, on_error=None):
+        '''
+        wait for a fetch submitted by map()
+
+        arguments:
+        url (str): url of page
+        future (Future): fetch of the page
+        on_error (function): called with the url and FetchError if the page could not be fetched
+
+        returns:
+        a generator of the (url, content) tuple, empty if the page was passed to on_error
+        '''
+
+        try:
+            content = future.result()
+        except CircuitOpenError:
+            raise
+        except FetchError as e:
+            if on_error is None:
+                raise
+            on_error(url, e)
+            return
+        yield url, content
+
+    def close(self):
+        '''
+        shut down the worker threads and close pooled connections
+        fetches that have not started yet are cancelled, e.g. when the crawl failed
+        '''
+
+        # workers still running may need the lock to get the session, so it is not held while waiting for them
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def __init__(self, max_workers=8, timeout=30, cache=None, throttle=None, metrics=None):
+        self._cfg = {
+            'max_workers': max(1, int(max_workers)),
+            'timeout': timeout,
+        }
+        self._cache = cache
+        self._throttle = throttle if throttle is not None else Throttle()
+        self._metrics = metrics
+        self._lock = threading.Lock()
+        self._session = None
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
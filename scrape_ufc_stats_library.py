@@ -9,35 +9,183 @@ library of functions to scrape ufc stats
 import pandas as pd
 import numpy as np
 import re
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import itertools
 import string
+import hashlib
+
+# import fetcher
+from scrape_ufc_stats_fetcher import Fetcher, url_class
+
+
+
+# shared fetcher used when no fetcher is given
+_default_fetcher = None
+
+# html parser backend used to build soups
+# 'html.parser' is pure python, 'lxml' is C-backed and several times faster
+_html_parser = {'parser': 'html.parser', 'restricted': False}
+
+# classes of the tags each type of page is parsed for
+# in restricted mode only these tags and their children are built into the soup
+# a tag is kept if any of its classes is listed, so every tag searched for by the parse_* functions
+# of that page type, or one of its ancestors, has to be matched here
+PARSE_ONLY_CLASSES = {
+    'event_listing': [
+        'b-link_style_black',
+        'b-statistics__date',
+        'b-statistics__table-col_style_big-top-padding',
+    ],
+    'event': [
+        'b-content__title',
+        'js-fight-details-click',
+        'b-link_style_black',
+    ],
+    'fight': [
+        'b-content__title',
+        'b-fight-details__person',
+        'b-fight-details__fight-head',
+        'b-fight-details__text',
+        'b-fight-details__table-col',
+    ],
+    'fighter_listing': [
+        'b-statistics__table-row',
+    ],
+    'fighter': [
+        'b-content__title-highlight',
+        'b-list__box-list',
+    ],
+}
+
+
+
+# get the shared fetcher
+def get_fetcher():
+    '''
+    get the fetcher shared by get_soup() and get_soups() when no fetcher is given
+    the fetcher is created on first use
+
+    arguments:
+    none
+
+    returns:
+    a Fetcher
+    '''
+
+    global _default_fetcher
+    # create fetcher on first use
+    if _default_fetcher is None:
+        _default_fetcher = Fetcher()
+
+    # return
+    return _default_fetcher
 
 
 
 # get soup from url
-def get_soup(url):
+def get_soup(url, fetcher=None):
     '''
     get soup from url using beautifulsoup
 
     arguments:
     url (str): url of page to parse
+    fetcher (Fetcher): fetcher to get the page with, defaults to the shared fetcher
 
     returns:
     soup
+
+    raises:
+    FetchError if the page could not be fetched, a throttled or error page is never made into a soup
     '''
-    
+
     # get page of url
-    page = requests.get(url)
+    content = (fetcher or get_fetcher()).get_page(url)
     # create soup
-    soup = BeautifulSoup(page.content, 'html.parser')
+    soup = make_soup(content, url_class(url))
 
     # return
     return soup
 
 
 
+# get soups from list of urls
+def get_soups(urls, fetcher=None):
+    '''
+    get soups from a list of urls using beautifulsoup
+    pages are fetched concurrently by the fetcher
+    soups are returned in the same order as urls so they can be zipped together
+
+    arguments:
+    urls (list): list of urls of pages to parse
+    fetcher (Fetcher): fetcher to get the pages with, defaults to the shared fetcher
+
+    returns:
+    a generator of soups
+    '''
+
+    # fetch pages concurrently, in order of urls
+    for url, content in (fetcher or get_fetcher()).map(urls):
+        # create soup
+        yield make_soup(content, url_class(url))
+
+
+
+# set html parser backend
+def set_html_parser(parser='html.parser', restricted=False):
+    '''
+    set the html parser backend used by make_soup(), get_soup() and get_soups()
+    parse results are the same for every backend, only speed differs
+    benchmark_html_parsers.py compares backends on a corpus of cached pages
+
+    arguments:
+    parser (str): beautifulsoup parser, e.g. 'html.parser' or 'lxml'
+    restricted (bool): only build the parts of each page the parse_* functions read
+
+    returns:
+    none
+    '''
+
+    _html_parser['parser'] = parser
+    _html_parser['restricted'] = restricted
+
+
+
+# make soup from page content
+def make_soup(content, page_type=None, parser=None, restricted=None):
+    '''
+    make soup from raw page content using beautifulsoup
+    used when the caller also needs the raw content, e.g. to hash it
+    in restricted mode only tags listed in PARSE_ONLY_CLASSES for the page type are built,
+    pages of an unknown type are always parsed in full
+
+    arguments:
+    content (bytes): content of page, e.g. from Fetcher.get_page()
+    page_type (str): type of page, see url_class(), e.g. 'fight'
+    parser (str): parser backend, defaults to the one set with set_html_parser()
+    restricted (bool): restrict parsing to tags of the page type, defaults to set_html_parser()
+
+    returns:
+    soup
+    '''
+
+    # use configured backend by default
+    parser = parser or _html_parser['parser']
+    restricted = _html_parser['restricted'] if restricted is None else restricted
+
+    # only build the tags the page type is parsed for
+    parse_only = None
+    if restricted and page_type in PARSE_ONLY_CLASSES:
+        classes = set(PARSE_ONLY_CLASSES[page_type])
+        # match on any single class, the class attribute may hold several separated by spaces
+        parse_only = SoupStrainer(
+            class_=lambda value: value is not None and not classes.isdisjoint(value.split())
+        )
+
+    # return
+    return BeautifulSoup(content, parser, parse_only=parse_only)
+
+
+
 # parse event details
 def parse_event_details(soup):
     '''
@@ -192,22 +340,20 @@ def parse_fight_results(soup):
 
 
 
-# organise fight results
-def organise_fight_results(results_from_soup, fight_results_column_names):
+# organise fight results into a record
+def organise_fight_results_record(results_from_soup):
     '''
-    organise list of fight results
+    organise list of fight results into a record
     fighters' names should be from index 1 and 2
     fight outcome should be from index 3 and 4
     other results includes from index 5 onwards
-    weightclass, method, round, time, time format, referee, and details, should be 
-    append all results into list and convert to a df
+    weightclass, method, round, time, time format, referee, and details
 
     arguments:
     results_from_soup (list): list of results from parse_fight_results()
-    fight_results_column_names (list): list of column names for fight results
 
     returns:
-    an organised list of fight results
+    a tuple of fight results, in the order of the fight results column names
     '''
 
     # create empty list to store results
@@ -223,13 +369,27 @@ def organise_fight_results(results_from_soup, fight_results_column_names):
     # remove and a single ' ', if any,  after the ':'
     fight_results_clean.extend([re.sub('^(.+?): ?', '', text) for text in results_from_soup[5:]])
 
-    # create empty df to store results
-    fight_result_df = pd.DataFrame(columns=fight_results_column_names)
-    # append each round of totals stats from first half of list to totals_df
-    fight_result_df.loc[len(fight_result_df)] = fight_results_clean
+    # return
+    return tuple(fight_results_clean)
+
+
+
+# organise fight results
+def organise_fight_results(results_from_soup, fight_results_column_names):
+    '''
+    organise list of fight results and convert to a df
+    see organise_fight_results_record()
+
+    arguments:
+    results_from_soup (list): list of results from parse_fight_results()
+    fight_results_column_names (list): list of column names for fight results
+
+    returns:
+    a df of fight results
+    '''
 
     # return
-    return fight_result_df
+    return pd.DataFrame([organise_fight_results_record(results_from_soup)], columns=fight_results_column_names)
 
 
 
@@ -312,16 +472,36 @@ def organise_fight_stats(stats_from_soup):
 
 
 
-# convert list of fighter stats into a structured dataframe
-def convert_fight_stats_to_df(clean_fighter_stats, totals_column_names, significant_strikes_column_names):
+# get column names of merged fight stats
+def fight_stats_record_column_names(totals_column_names, significant_strikes_column_names):
     '''
-    convert a list of fighter stats from organise_fight_stats() into a structured dataframe
+    get column names of the records returned by convert_fight_stats_to_records()
+    totals columns come first, followed by significant strike columns that are not totals columns
+
+    arguments:
+    totals_column_names (list): list of column names for totals type stats
+    significant_strikes_column_names (list): list of column names for significant strike type stats
+
+    returns:
+    a list of column names
+    '''
+
+    # return
+    return list(totals_column_names) + [col for col in significant_strikes_column_names if col not in totals_column_names]
+
+
+
+# convert list of fighter stats into records
+def convert_fight_stats_to_records(clean_fighter_stats, totals_column_names, significant_strikes_column_names):
+    '''
+    convert a list of fighter stats from organise_fight_stats() into a list of records, one per round
     check if list of stats is empty, there are old fights that do not have stats
-    if fight has no stats, then fill stat columns with nans
+    if fight has no stats, then return a single record of nans
     if fight has stats continue and get number of rounds in the fight
     for each round in fight, get stats for totals and significant strikes
     the summary of stats for the fights are ignored
-    merge totals and significant stike stats together and return as one df
+    totals and significant strike stats of a round are joined on the columns they share,
+    a round is dropped if the shared columns do not match, the same as an inner merge
 
     arguments:
     clean_fighter_stats (list): list of fighter stats from organise_fight_stats()
@@ -329,69 +509,88 @@ def convert_fight_stats_to_df(clean_fighter_stats, totals_column_names, signific
     significant_strikes_column_names (list): list of column names for significant strike type stats
 
     returns:
-    a dataframe of fight stats
+    a list of tuples, in the order of fight_stats_record_column_names()
     '''
 
-    # create empty df to store each type of stat
-    totals_df = pd.DataFrame(columns=totals_column_names)
-    significant_strikes_df = pd.DataFrame(columns=significant_strikes_column_names)
+    # get positions of shared columns in each type of stat
+    # and of significant strike columns that are not totals columns
+    shared_columns = [col for col in totals_column_names if col in significant_strikes_column_names]
+    totals_key = [totals_column_names.index(col) for col in shared_columns]
+    significant_strikes_key = [significant_strikes_column_names.index(col) for col in shared_columns]
+    significant_strikes_extra = [
+        index for index, col in enumerate(significant_strikes_column_names) if col not in totals_column_names
+    ]
 
     # check if list of stats is empty 
     # meaning that stats are unavailable for the fight
     if len(clean_fighter_stats) == 0:
-        # append nans to totals_df and significant_strikes_df
-        totals_df.loc[len(totals_df)] = [np.nan] * len(list(totals_df))
-        significant_strikes_df.loc[len(significant_strikes_df)] = [np.nan] * len(list(significant_strikes_df))
-    
-    # if list of stats is no empty
-    else:
-        # get number of rounds in fight
-        # fight stats has two summary rows and two rows of stats for each round
-        # subtract two summary rows and divide the remaining rows by two to get the number of rounds
-        number_of_rounds = int((len(clean_fighter_stats) - 2) / 2)
-
-        # create empty df to store each type of stat
-        totals_df = pd.DataFrame(columns=totals_column_names)
-        significant_strikes_df = pd.DataFrame(columns=significant_strikes_column_names)
-
-        # for each round in fight, get stats for totals and significant strikes
-        # the first half of stats are totals type and the second half are significant strike type
-        # [[totals - summary], [totals - round 1], [totals - round n]..., [significant strikes - summary], [significant strikes - round 1], [significant strikes - round n]...] 
-        for round in range(number_of_rounds):
-            # append each round of totals stats from first half of list to totals_df
-            totals_df.loc[len(totals_df)] = ['Round '+str(round+1)] + clean_fighter_stats[round+1]
-            # append each round of significant strike stats from second half of list to significant_strikes_df
-            significant_strikes_df.loc[len(significant_strikes_df)] = ['Round '+str(round+1)] + clean_fighter_stats[round+1+int((len(clean_fighter_stats) / 2))]
-
-    # merge totals and significant stike stats together as one df
-    fighter_stats_df = totals_df.merge(significant_strikes_df, how='inner')
+        # return a single record of nans
+        return [(np.nan,) * (len(totals_column_names) + len(significant_strikes_extra))]
+
+    # get number of rounds in fight
+    # fight stats has two summary rows and two rows of stats for each round
+    # subtract two summary rows and divide the remaining rows by two to get the number of rounds
+    number_of_rounds = int((len(clean_fighter_stats) - 2) / 2)
+
+    # create empty list to store records
+    fighter_stats_records = []
+
+    # for each round in fight, get stats for totals and significant strikes
+    # the first half of stats are totals type and the second half are significant strike type
+    # [[totals - summary], [totals - round 1], [totals - round n]..., [significant strikes - summary], [significant strikes - round 1], [significant strikes - round n]...] 
+    for round in range(number_of_rounds):
+        totals = ['Round '+str(round+1)] + clean_fighter_stats[round+1]
+        significant_strikes = ['Round '+str(round+1)] + clean_fighter_stats[round+1+int((len(clean_fighter_stats) / 2))]
+        # check each round has a stat for every column
+        if len(totals) != len(totals_column_names) or len(significant_strikes) != len(significant_strikes_column_names):
+            raise ValueError('cannot set a row with mismatched columns')
+        # join totals and significant strike stats on their shared columns
+        if [totals[i] for i in totals_key] == [significant_strikes[i] for i in significant_strikes_key]:
+            fighter_stats_records.append(tuple(totals) + tuple(significant_strikes[i] for i in significant_strikes_extra))
 
     # return
-    return fighter_stats_df
+    return fighter_stats_records
 
 
 
-# combine fighter stats into one
-def combine_fighter_stats_dfs(fighter_a_stats_df, fighter_b_stats_df, soup):
+# convert list of fighter stats into a structured dataframe
+def convert_fight_stats_to_df(clean_fighter_stats, totals_column_names, significant_strikes_column_names):
     '''
-    concat both fighter's stats into one df
-    create new event and bout column as a key
-    results in a dataframe of stats for both fighters for a fight
+    convert a list of fighter stats from organise_fight_stats() into a structured dataframe
+    see convert_fight_stats_to_records()
 
     arguments:
-    fighter_a_stats_df (df): a df output from convert_fight_stats_to_df()
-    fighter_b_stats_df (df): a df output from convert_fight_stats_to_df()
-    soup (html): output of get_soup() parser
+    clean_fighter_stats (list): list of fighter stats from organise_fight_stats()
+    totals_column_names (list): list of column names for totals type stats
+    significant_strikes_column_names (list): list of column names for significant strike type stats
 
-    returns
-    a dataframe of stats for the fight
+    returns:
+    a dataframe of fight stats
     '''
 
-    # concat both fighters' stats into one df
-    fight_stats = pd.concat([fighter_a_stats_df, fighter_b_stats_df])
+    # return
+    return pd.DataFrame(
+        convert_fight_stats_to_records(clean_fighter_stats, totals_column_names, significant_strikes_column_names),
+        columns=fight_stats_record_column_names(totals_column_names, significant_strikes_column_names),
+    )
+
+
+
+# parse event and bout of a fight from soup
+def parse_event_and_bout(soup):
+    '''
+    parse name of event and bout from soup of a fight
+    the bout is named with both fighters' names, e.g. fighter_a vs. fighter_b
+
+    arguments:
+    soup (html): output of get_soup() parser
+
+    returns:
+    a tuple of event and bout
+    '''
 
     # get name of event from soup
-    fight_stats['EVENT'] = soup.find('h2', class_='b-content__title').text.strip()
+    event = soup.find('h2', class_='b-content__title').text.strip()
 
     # create empty list to store fighters' names
     fighters_names = []
@@ -399,35 +598,77 @@ def combine_fighter_stats_dfs(fighter_a_stats_df, fighter_b_stats_df, soup):
     for tag in soup.find_all('a', class_='b-link b-fight-details__person-link'):
         fighters_names.append(tag.text.strip())
 
-    # get name of bout with using fighters' names
-    fight_stats['BOUT'] = ' vs. '.join(fighters_names)
+    # return
+    return event, ' vs. '.join(fighters_names)
+
 
-    # reorder columns
-    fight_stats = move_columns(fight_stats, ['EVENT', 'BOUT'], 'ROUND', 'before')
+
+# combine fighter stats records into one
+def combine_fighter_stats_records(fighter_a_stats_records, fighter_b_stats_records, soup):
+    '''
+    combine both fighter's stats records into one list
+    each record is prefixed with the event and bout as a key
+
+    arguments:
+    fighter_a_stats_records (list): output of convert_fight_stats_to_records()
+    fighter_b_stats_records (list): output of convert_fight_stats_to_records()
+    soup (html): output of get_soup() parser
+
+    returns:
+    a list of tuples, in the order of the fight stats column names
+    '''
+
+    # get event and bout of fight
+    key = parse_event_and_bout(soup)
 
     # return
-    return fight_stats
+    return [key + record for record in itertools.chain(fighter_a_stats_records, fighter_b_stats_records)]
 
 
 
-# parse and organise fight results and fight stats
-def parse_organise_fight_results_and_stats(soup, url, fight_results_column_names, totals_column_names, significant_strikes_column_names):
+# combine fighter stats into one
+def combine_fighter_stats_dfs(fighter_a_stats_df, fighter_b_stats_df, soup):
     '''
-    parse and organise fight results and fight stats from soup
-    this function combines other functions that parse fight results and stats into one
-    and returns two dfs, one for fight results and the other for fight stats
+    concat both fighter's stats into one df
+    create new event and bout column as a key
+    results in a dataframe of stats for both fighters for a fight
+
+    arguments:
+    fighter_a_stats_df (df): a df output from convert_fight_stats_to_df()
+    fighter_b_stats_df (df): a df output from convert_fight_stats_to_df()
+    soup (html): output of get_soup() parser
+
+    returns
+    a dataframe of stats for the fight
+    '''
+
+    # combine records of both fighters
+    fight_stats_records = combine_fighter_stats_records(
+        fighter_a_stats_df.itertuples(index=False, name=None),
+        fighter_b_stats_df.itertuples(index=False, name=None),
+        soup,
+    )
+
+    # return
+    return pd.DataFrame(fight_stats_records, columns=['EVENT', 'BOUT'] + fighter_a_stats_df.columns.tolist())
+
+
+
+# parse and organise fight results and fight stats into records
+def parse_organise_fight_results_and_stats_records(soup, url, totals_column_names, significant_strikes_column_names):
+    '''
+    parse and organise fight results and fight stats from soup into records
+    no dataframes are built, records can be written to a sink as they are
+    and converted to a df once for many fights
 
     arguments:
     soup (html): output of get_soup() parser
     url (str): url of fight
-    fight_results_df (df): an df
-    fight_results_column_names (list): list of column names for fight results
-    fight_stats_df (df):
     totals_column_names (list): list of column names for totals type stats
     significant_strikes_column_names (list): list of column names for significant strike type stats
 
     returns:
-    two dfs for fight results and stats
+    two lists of tuples for fight results and stats
     '''
 
     # parse fight results
@@ -437,7 +678,7 @@ def parse_organise_fight_results_and_stats(soup, url, fight_results_column_names
     # append fight url 
     fight_results.append('URL:'+url)
     # organise fight results
-    fight_results_df = organise_fight_results(fight_results, fight_results_column_names)
+    fight_results_records = [organise_fight_results_record(fight_results)]
 
     # parse fight stats
 
@@ -446,11 +687,46 @@ def parse_organise_fight_results_and_stats(soup, url, fight_results_column_names
     # organise stats extracted from soup
     fighter_a_stats_clean = organise_fight_stats(fighter_a_stats)
     fighter_b_stats_clean = organise_fight_stats(fighter_b_stats)
-    # convert list of fighter stats into a structured dataframe
-    fighter_a_stats_df = convert_fight_stats_to_df(fighter_a_stats_clean, totals_column_names, significant_strikes_column_names)
-    fighter_b_stats_df = convert_fight_stats_to_df(fighter_b_stats_clean, totals_column_names, significant_strikes_column_names)
+    # convert list of fighter stats into records
+    fighter_a_stats_records = convert_fight_stats_to_records(fighter_a_stats_clean, totals_column_names, significant_strikes_column_names)
+    fighter_b_stats_records = convert_fight_stats_to_records(fighter_b_stats_clean, totals_column_names, significant_strikes_column_names)
     # combine fighter stats into one
-    fight_stats_df = combine_fighter_stats_dfs(fighter_a_stats_df, fighter_b_stats_df, soup)
+    fight_stats_records = combine_fighter_stats_records(fighter_a_stats_records, fighter_b_stats_records, soup)
+
+    # return
+    return fight_results_records, fight_stats_records
+
+
+
+# parse and organise fight results and fight stats
+def parse_organise_fight_results_and_stats(soup, url, fight_results_column_names, totals_column_names, significant_strikes_column_names):
+    '''
+    parse and organise fight results and fight stats from soup
+    this function combines other functions that parse fight results and stats into one
+    and returns two dfs, one for fight results and the other for fight stats
+
+    arguments:
+    soup (html): output of get_soup() parser
+    url (str): url of fight
+    fight_results_column_names (list): list of column names for fight results
+    totals_column_names (list): list of column names for totals type stats
+    significant_strikes_column_names (list): list of column names for significant strike type stats
+
+    returns:
+    two dfs for fight results and stats
+    '''
+
+    # parse fight results and fight stats into records
+    fight_results_records, fight_stats_records = parse_organise_fight_results_and_stats_records(
+        soup, url, totals_column_names, significant_strikes_column_names
+    )
+
+    # convert records to dfs
+    fight_results_df = pd.DataFrame(fight_results_records, columns=fight_results_column_names)
+    fight_stats_df = pd.DataFrame(
+        fight_stats_records,
+        columns=['EVENT', 'BOUT'] + fight_stats_record_column_names(totals_column_names, significant_strikes_column_names),
+    )
 
     # return
     return fight_results_df, fight_stats_df
@@ -458,7 +734,7 @@ def parse_organise_fight_results_and_stats(soup, url, fight_results_column_names
 
 
 # generate list of urls for fighter details
-def generate_alphabetical_urls():
+def generate_alphabetical_urls(base_url='http://ufcstats.com'):
     '''
     generate a list of alphabetical urls for fighter details
     fighter urls are split by their last name and categorised alphabetically
@@ -466,7 +742,7 @@ def generate_alphabetical_urls():
     return all fighter urls as a list
 
     arguments:
-    none
+    base_url (str): scheme and host of the stats website, e.g. a local test server
 
     returns:
     a list of urls of fighter details
@@ -477,7 +753,7 @@ def generate_alphabetical_urls():
     # fighters are split in alphabetically
     # generate url for each alphabet and append to list
     for character in list(string.ascii_lowercase):
-        list_of_alphabetical_urls.append('http://ufcstats.com/statistics/fighters?char='+character+'&page=all')
+        list_of_alphabetical_urls.append(base_url+'/statistics/fighters?char='+character+'&page=all')
     
     # return
     return list_of_alphabetical_urls
@@ -528,6 +804,39 @@ def parse_fighter_details(soup, fighter_details_column_names):
 
 
 
+# parse signatures of fighters on listing page
+def parse_fighter_listing_signatures(soup):
+    '''
+    parse a signature of each fighter's row on an alphabetical listing page
+    each row holds the fighter's name, height, weight, reach, stance and record
+    the signature is a hash of the row's text, so it changes when the fighter's record changes
+    rows without a fighter url, e.g. the empty first row, are skipped
+
+    arguments:
+    soup (html): output of get_soup() parser
+
+    returns:
+    a dict of fighter url to signature
+    '''
+
+    # create empty dict to store signatures
+    fighter_signatures = {}
+    # loop through each row of the listing
+    for row in soup.find_all('tr', class_='b-statistics__table-row'):
+        # get fighter url from first link in row
+        link = row.find('a', class_='b-link b-link_style_black')
+        if link is None:
+            continue
+        # join text of every column, collapsing whitespace
+        row_text = '|'.join(' '.join(tag.text.split()) for tag in row.find_all('td'))
+        # hash row text
+        fighter_signatures[link['href']] = hashlib.sha1(row_text.encode('utf-8')).hexdigest()
+
+    # return
+    return fighter_signatures
+
+
+
 # parse fighter tale of the tape
 def parse_fighter_tott(soup):
     '''
@@ -565,33 +874,48 @@ def parse_fighter_tott(soup):
 
 
 
-# organise fighter tale of the tape
-def organise_fighter_tott(tott_from_soup, fighter_tott_column_names, url):
+# organise fighter tale of the tape into a record
+def organise_fighter_tott_record(tott_from_soup, url):
     '''
-    organise list of fighter tale of the tape
+    organise list of fighter tale of the tape into a record
     remove label of tale of the tape using regex
     e.g. 'Height:5'7"' to '5'7"
-    convert and return list as df
 
     arguments:
     tott_from_soup (list): list of fighter tale of the tale from parse_fighter_tott()
-    fighter_tott_column_names (list): list of column names for fighter tale of the tape
     url (str): url of fighter
 
     results:
-    a df of fighter tale of the tape
+    a tuple of fighter tale of the tape, in the order of the fighter tale of the tape column names
     '''
     # remove label of results using regex
     fighter_tott_clean = [re.sub('^(.+?): ?', '', text) for text in tott_from_soup]
     # append url to fighter_tott_clean
     fighter_tott_clean.append(url)
-    # create empty df to store fighter's details
-    fighter_tott_df = pd.DataFrame(columns=fighter_tott_column_names)
-    # append fighter's details to fighter_details_df
-    fighter_tott_df.loc[(len(fighter_tott_df))] = fighter_tott_clean
 
     # return
-    return fighter_tott_df
+    return tuple(fighter_tott_clean)
+
+
+
+# organise fighter tale of the tape
+def organise_fighter_tott(tott_from_soup, fighter_tott_column_names, url):
+    '''
+    organise list of fighter tale of the tape
+    convert and return list as df
+    see organise_fighter_tott_record()
+
+    arguments:
+    tott_from_soup (list): list of fighter tale of the tale from parse_fighter_tott()
+    fighter_tott_column_names (list): list of column names for fighter tale of the tape
+    url (str): url of fighter
+
+    results:
+    a df of fighter tale of the tape
+    '''
+
+    # return
+    return pd.DataFrame([organise_fighter_tott_record(tott_from_soup, url)], columns=fighter_tott_column_names)
 
 
 
@@ -0,0 +1,196 @@
+'''
+Overview
+
+persisted crawl manifest for incremental scraping
+
+the manifest records every url the scraper has finished with, together with its status,
+when it was fetched and a hash of its content
+lookups are dict based so finding new work is linear in the number of urls on a listing page
+
+fighter pages also record a signature of the fighter's row on the alphabetical listing
+the row holds the fighter's record, so a changed signature means the fighter has fought
+since the last crawl and their tale of the tape page has to be fetched again
+
+'''
+
+# imports
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+
+# hash content of a page
+def content_hash(content):
+    '''
+    hash content of a page
+
+    arguments:
+    content (bytes or str): content to hash
+
+    returns:
+    sha256 hex digest
+    '''
+
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+
+class CrawlManifest:
+    '''
+    map of url to status, fetched_at, content hash and listing signature
+    persisted as a json file
+
+    arguments:
+    path (str): path of manifest file
+    '''
+
+    def _load(self):
+        '''
+        load manifest entries from file, if it exists
+
+        returns:
+        dict of url to entry
+        '''
+
+        if not os.path.exists(self._cfg['path']):
+            return {}
+        with open(self._cfg['path'], 'r') as f:
+            return json.load(f)
+
+    @property
+    def exists(self):
+        return os.path.exists(self._cfg['path'])
+
+    def is_done(self, url):
+        '''
+        check if a url has been crawled successfully
+
+        arguments:
+        url (str): url to check
+
+        returns:
+        True if the url is done
+        '''
+
+        entry = self._entries.get(url)
+        return entry is not None and entry['status'] == 'done'
+
+    def pending(self, urls):
+        '''
+        filter a list of urls down to the ones that have not been crawled
+        order of urls is kept and duplicates are dropped
+
+        arguments:
+        urls (list): list of urls
+
+        returns:
+        list of urls that are not done
+        '''
+
+        seen = set()
+        returner = []
+        for url in urls:
+            if url in seen or self.is_done(url):
+                continue
+            seen.add(url)
+            returner.append(url)
+        return returner
+
+    def changed(self, url, signature):
+        '''
+        check if a crawled url needs to be crawled again
+        a url needs crawling if it is not done or its listing signature differs from the recorded one
+        urls without a recorded signature, e.g. seeded from existing files, are treated as unchanged
+
+        arguments:
+        url (str): url to check
+        signature (str): current listing signature of the url
+
+        returns:
+        True if the url has to be crawled
+        '''
+
+        if not self.is_done(url):
+            return True
+        recorded = self._entries[url].get('signature')
+        return recorded is not None and recorded != signature
+
+    def mark(self, url, status='done', content=None, signature=None, digest=None):
+        '''
+        record the outcome of crawling a url
+
+        arguments:
+        url (str): url that was crawled
+        status (str): 'done' or 'failed'
+        content (bytes): content of the page, used for the content hash
+        signature (str): listing signature of the url, if any
+        digest (str): content hash of the page, if it was hashed already
+        '''
+
+        with self._lock:
+            entry = dict(self._entries.get(url, {}))
+            entry['status'] = status
+            entry['fetched_at'] = time.time()
+            if content is not None:
+                digest = content_hash(content)
+            if digest is not None:
+                entry['hash'] = digest
+            if signature is not None:
+                entry['signature'] = signature
+            self._entries[url] = entry
+
+    def sign(self, signatures):
+        '''
+        record listing signatures of crawled urls without marking them as fetched
+        used to adopt signatures for urls seeded from existing files
+
+        arguments:
+        signatures (dict): url to listing signature
+        '''
+
+        with self._lock:
+            for url, signature in signatures.items():
+                if url in self._entries and self._entries[url].get('signature') is None:
+                    self._entries[url]['signature'] = signature
+
+    def seed(self, urls):
+        '''
+        mark urls as done without fetching them
+        used once to build a manifest from previously scraped files
+
+        arguments:
+        urls (list): list of urls already crawled
+        '''
+
+        with self._lock:
+            for url in urls:
+                if url not in self._entries:
+                    self._entries[url] = {'status': 'done', 'fetched_at': None}
+
+    def save(self):
+        '''
+        write the manifest to file
+        the file is written to a temporary file first so a crash never leaves a partial manifest
+        '''
+
+        with self._lock:
+            tmp_path = self._cfg['path'] + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self._cfg['path'])
+
+    def __init__(self, path):
+        self._cfg = {'path': path}
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,232 @@
+'''
+Overview
+
+telemetry of a scrape run
+
+the fetcher records every request, with its latency, size of response and status code,
+and every page served from the response cache
+the pipeline records how long each page took to parse, from raw html to records, and how many rows it produced
+sinks record how long each batch took to write
+
+at the end of a run the metrics are written to a json file, with every request and parse,
+and summarised per type of page with p50, p95 and p99, so a slow run can be traced back to
+the network, the parser or writing to file
+
+'''
+
+# imports
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+# import fetcher
+from scrape_ufc_stats_fetcher import url_class
+
+
+
+# percentiles reported in the summary
+PERCENTILES = [50, 95, 99]
+
+
+
+# count rows produced by a parse function
+def count_rows(parsed):
+    '''
+    count rows in the output of a parse function
+    outputs are a df, a list of records, or a tuple of those, e.g. fight results and fight stats
+
+    arguments:
+    parsed: output of a parse function
+
+    returns:
+    number of rows
+    '''
+
+    if isinstance(parsed, (pd.DataFrame, list)):
+        return len(parsed)
+    if isinstance(parsed, tuple):
+        return sum(count_rows(part) for part in parsed)
+    return 0
+
+
+
+# summarise a list of values
+def describe(values):
+    '''
+    summarise a list of values with count, total, mean and percentiles
+
+    arguments:
+    values (list): list of numbers
+
+    returns:
+    dict of summary statistics
+    '''
+
+    if not values:
+        return {'count': 0}
+    values = np.asarray(values, dtype=float)
+    summary = {'count': int(values.size), 'total': float(values.sum()), 'mean': float(values.mean())}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary['p%d' % percentile] = float(value)
+    return summary
+
+
+
+class Metrics:
+    '''
+    thread-safe collector of request, parse and write metrics of a scrape run
+    '''
+
+    def record_request(self, url, status_code, latency, nbytes, attempt=0):
+        '''
+        record a request sent to the network
+
+        arguments:
+        url (str): url that was requested
+        status_code (int): status code of the response, None if there was no response
+        latency (float): seconds until the response was read
+        nbytes (int): size of the response body
+        attempt (int): number of attempts already made for the url, starting at 0
+        '''
+
+        with self._lock:
+            self._requests.append({
+                'url': url,
+                'page_type': url_class(url),
+                'status': status_code,
+                'latency': latency,
+                'bytes': nbytes,
+                'attempt': attempt,
+            })
+
+    def record_cache_hit(self, url, nbytes):
+        '''
+        record a page served from the response cache
+
+        arguments:
+        url (str): url of the page
+        nbytes (int): size of the cached page
+        '''
+
+        with self._lock:
+            self._cache_hits.append({'url': url, 'page_type': url_class(url), 'bytes': nbytes})
+
+    def record_parse(self, url, seconds, rows):
+        '''
+        record parsing a page, from raw html to records
+
+        arguments:
+        url (str): url of the page
+        seconds (float): time taken to make the soup and run the parse functions
+        rows (int): number of rows produced
+        '''
+
+        with self._lock:
+            self._parses.append({'url': url, 'page_type': url_class(url), 'seconds': seconds, 'rows': rows})
+
+    def record_write(self, table, seconds, rows):
+        '''
+        record writing a batch of rows to file
+
+        arguments:
+        table (str): name of table
+        seconds (float): time taken to write and sync the batch
+        rows (int): number of rows written
+        '''
+
+        with self._lock:
+            self._writes.append({'table': table, 'seconds': seconds, 'rows': rows})
+
+    def summarise(self):
+        '''
+        summarise metrics per type of page and per table written
+
+        returns:
+        dict of page type to summaries of latency, bytes, parse time and rows,
+        and of table to summaries of write time and rows
+        '''
+
+        with self._lock:
+            requests = list(self._requests)
+            cache_hits = list(self._cache_hits)
+            parses = list(self._parses)
+            writes = list(self._writes)
+
+        page_types = {}
+        for page_type in dict.fromkeys([r['page_type'] for r in requests + cache_hits + parses]):
+            page_requests = [r for r in requests if r['page_type'] == page_type]
+            page_parses = [p for p in parses if p['page_type'] == page_type]
+            status = {}
+            for r in page_requests:
+                status[str(r['status'])] = status.get(str(r['status']), 0) + 1
+            page_types[page_type] = {
+                'requests': len(page_requests),
+                'retries': sum(1 for r in page_requests if r['attempt'] > 0),
+                'cache_hits': sum(1 for c in cache_hits if c['page_type'] == page_type),
+                'status': status,
+                'latency': describe([r['latency'] for r in page_requests]),
+                'bytes': describe([r['bytes'] for r in page_requests if r['status'] == 200]),
+                'parse_time': describe([p['seconds'] for p in page_parses]),
+                'rows': describe([p['rows'] for p in page_parses]),
+            }
+
+        tables = {}
+        for table in dict.fromkeys([w['table'] for w in writes]):
+            table_writes = [w for w in writes if w['table'] == table]
+            tables[table] = {
+                'write_time': describe([w['seconds'] for w in table_writes]),
+                'rows': describe([w['rows'] for w in table_writes]),
+            }
+
+        return {'page_types': page_types, 'tables': tables}
+
+    def summary_table(self):
+        '''
+        summary of metrics as a table, one row per type of page or table and metric
+
+        returns:
+        a df with count, total, mean and percentiles
+        '''
+
+        summary = self.summarise()
+        rows = []
+        for page_type, page_summary in summary['page_types'].items():
+            for metric in ['latency', 'bytes', 'parse_time', 'rows']:
+                rows.append({'name': page_type, 'metric': metric, **page_summary[metric]})
+        for table, table_summary in summary['tables'].items():
+            for metric in ['write_time', 'rows']:
+                rows.append({'name': 'write ' + table, 'metric': metric, **table_summary[metric]})
+        columns = ['name', 'metric', 'count', 'total', 'mean'] + ['p%d' % p for p in PERCENTILES]
+        return pd.DataFrame(rows, columns=columns)
+
+    def save(self, path):
+        '''
+        write metrics to a json file, with the summary and every recorded request, parse and write
+
+        arguments:
+        path (str): path of metrics file
+        '''
+
+        with self._lock:
+            data = {
+                'started_at': self._started_at,
+                'finished_at': time.time(),
+                'requests': list(self._requests),
+                'cache_hits': list(self._cache_hits),
+                'parses': list(self._parses),
+                'writes': list(self._writes),
+            }
+        data['wall_time'] = data['finished_at'] - data['started_at']
+        data['summary'] = self.summarise()
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1)
+
+    def __init__(self):
+        self._started_at = time.time()
+        self._requests = []
+        self._cache_hits = []
+        self._parses = []
+        self._writes = []
+        self._lock = threading.Lock()
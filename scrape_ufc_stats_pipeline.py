@@ -0,0 +1,305 @@
+'''
+Overview
+
+staged fetch, parse and write pipeline for the scraper
+
+fetching is I/O bound and parsing html is CPU bound, so they run in separate stages
+1. fetch: worker threads of the fetcher download pages over the shared connection pool
+2. parse: a pool of worker processes turns raw html into records with the scrape_ufc_stats_library parse functions
+3. write: the caller consumes parsed records in a single thread, e.g. writes them to a sink
+
+parsing in processes means throughput scales with the number of cores instead of being capped
+by one interpreter, while pages are still fetched and written in the same order as their urls
+both stages hand over through bounded windows, so a slow stage holds back the stages before it
+and memory use does not grow with the number of pages
+
+the parse_* functions of this module run in the worker processes, so they only take picklable
+arguments and read column names from the config given to the pool
+
+'''
+
+# imports
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+
+# import library
+import scrape_ufc_stats_library as LIB
+from scrape_ufc_stats_metrics import count_rows
+
+
+
+# config of the current process, set by init_worker()
+_worker_config = {}
+
+
+
+# set up a parse worker
+def init_worker(config):
+    '''
+    set up a parse worker process
+    runs once in every worker process, and in the main process when parsing inline
+
+    arguments:
+    config (dict): scraper config, html parser and column names are read from it
+    '''
+
+    _worker_config.clear()
+    _worker_config.update(config)
+    LIB.set_html_parser(config['html_parser'], config['restricted_parse'])
+
+
+
+# time a parse function
+def timed_parse(parse, url, content):
+    '''
+    run a parse function and time it
+
+    arguments:
+    parse (function): one of the parse_* functions of this module
+    url (str): url of page
+    content (bytes): raw html of page
+
+    returns:
+    output of the parse function and seconds taken
+    '''
+
+    start = time.perf_counter()
+    parsed = parse(url, content)
+    return parsed, time.perf_counter() - start
+
+
+
+# parse event details of the event listing
+def parse_event_listing(url, content):
+    '''
+    parse event details from raw html of the completed events listing
+
+    arguments:
+    url (str): url of listing
+    content (bytes): raw html of listing
+
+    returns:
+    a df of event details
+    '''
+
+    # make soup
+    soup = LIB.make_soup(content, 'event_listing')
+
+    # return
+    return LIB.parse_event_details(soup)
+
+
+
+# parse fighter details of an alphabetical listing page
+def parse_fighter_listing(url, content):
+    '''
+    parse fighter details and listing signatures from raw html of an alphabetical listing page
+
+    arguments:
+    url (str): url of listing page
+    content (bytes): raw html of listing page
+
+    returns:
+    a df of fighter details and a dict of fighter url to listing signature
+    '''
+
+    # make soup
+    soup = LIB.make_soup(content, 'fighter_listing')
+
+    # return
+    return (
+        LIB.parse_fighter_details(soup, _worker_config['fighter_details_column_names']),
+        LIB.parse_fighter_listing_signatures(soup),
+    )
+
+
+
+# parse fight details of an event page
+def parse_event(url, content):
+    '''
+    parse fight details from raw html of an event page
+
+    arguments:
+    url (str): url of event
+    content (bytes): raw html of event page
+
+    returns:
+    a list of fight details records
+    '''
+
+    # make soup
+    soup = LIB.make_soup(content, 'event')
+
+    # parse fight links
+    fight_details_df = LIB.parse_fight_details(soup)
+
+    # return
+    return list(fight_details_df.itertuples(index=False, name=None))
+
+
+
+# parse fight results and fight stats of a fight page
+def parse_fight(url, content):
+    '''
+    parse fight results and fight stats from raw html of a fight page
+
+    arguments:
+    url (str): url of fight
+    content (bytes): raw html of fight page
+
+    returns:
+    two lists of records for fight results and stats
+    '''
+
+    # make soup
+    soup = LIB.make_soup(content, 'fight')
+
+    # return
+    return LIB.parse_organise_fight_results_and_stats_records(
+        soup,
+        url,
+        _worker_config['totals_column_names'],
+        _worker_config['significant_strikes_column_names'],
+    )
+
+
+
+# parse tale of the tape of a fighter page
+def parse_fighter(url, content):
+    '''
+    parse tale of the tape from raw html of a fighter page
+
+    arguments:
+    url (str): url of fighter
+    content (bytes): raw html of fighter page
+
+    returns:
+    a list with one fighter tale of the tape record
+    '''
+
+    # make soup
+    soup = LIB.make_soup(content, 'fighter')
+
+    # parse fighter tale of the tape
+    fighter_tott = LIB.parse_fighter_tott(soup)
+
+    # return
+    return [LIB.organise_fighter_tott_record(fighter_tott, url)]
+
+
+
+class Pipeline:
+    '''
+    fetch pages with a fetcher and parse them in a pool of worker processes
+
+    arguments:
+    fetcher (Fetcher): fetcher used for the fetch stage
+    config (dict): scraper config given to every parse worker
+    parse_workers (int): number of parse processes, None for one per core, 0 parses in the calling thread
+    queue_size (int): number of fetched pages waiting for or being parsed, defaults to twice the parse workers
+    metrics (Metrics): optional collector of parse metrics
+    '''
+
+    def _get_executor(self):
+        '''
+        create the parse process pool on first use
+
+        returns:
+        a process pool executor
+        '''
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._cfg['parse_workers'],
+                initializer=init_worker,
+                initargs=(self._config,),
+            )
+        return self._executor
+
+    def map(self, urls, parse, on_error=None):
+        '''
+        fetch and parse a list of urls
+        pages are parsed as soon as they are fetched, while later pages are still being fetched
+        results are yielded in the same order as urls
+        pages that could not be fetched are skipped if on_error is given, see Fetcher.map()
+
+        arguments:
+        urls (list): list of urls to fetch
+        parse (function): one of the parse_* functions of this module
+        on_error (function): called with the url and FetchError of a page that could not be fetched
+
+        returns:
+        a generator of (url, content, parsed) tuples
+        '''
+
+        # parse in the calling thread
+        if self._cfg['parse_workers'] == 0:
+            for url, content in self._fetcher.map(urls, on_error):
+                yield url, content, self._record(url, *timed_parse(parse, url, content))
+            return
+
+        executor = self._get_executor()
+        # window of submitted parses, oldest first
+        in_flight = deque()
+        for url, content in self._fetcher.map(urls, on_error):
+            # wait for the oldest parse once the window is full
+            # this stops pulling pages from the fetcher, which in turn stops fetching
+            if len(in_flight) >= self._cfg['queue_size']:
+                pending_url, pending_content, future = in_flight.popleft()
+                yield pending_url, pending_content, self._record(pending_url, *future.result())
+            in_flight.append((url, content, executor.submit(timed_parse, parse, url, content)))
+        # drain remaining parses
+        while in_flight:
+            pending_url, pending_content, future = in_flight.popleft()
+            yield pending_url, pending_content, self._record(pending_url, *future.result())
+
+    def _record(self, url, parsed, seconds):
+        '''
+        record parse metrics of a page
+
+        arguments:
+        url (str): url of page
+        parsed: output of the parse function
+        seconds (float): time taken to parse the page
+
+        returns:
+        output of the parse function
+        '''
+
+        if self._metrics is not None:
+            self._metrics.record_parse(url, seconds, count_rows(parsed))
+        return parsed
+
+    def close(self):
+        '''
+        shut down the parse processes
+        parses that have not started yet are cancelled, e.g. when the crawl failed
+        '''
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __init__(self, fetcher, config, parse_workers=None, queue_size=None, metrics=None):
+        if parse_workers is None:
+            parse_workers = os.cpu_count() or 1
+        parse_workers = max(0, int(parse_workers))
+        self._cfg = {
+            'parse_workers': parse_workers,
+            'queue_size': max(1, int(queue_size or parse_workers * 2)),
+        }
+        self._fetcher = fetcher
+        self._config = config
+        self._metrics = metrics
+        self._executor = None
+        # parsing inline uses the config of the calling process
+        if parse_workers == 0:
+            init_worker(config)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
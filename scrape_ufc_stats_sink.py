@@ -0,0 +1,335 @@
+'''
+Overview
+
+streaming, checkpointed writer for scraped rows
+
+parsed rows are buffered per page and appended in batches to a '.partial' file next to each output file
+after every batch the files are flushed to disk and the pages in the batch are committed,
+e.g. marked as done in the crawl manifest
+a crash therefore loses at most one batch, and a restarted run carries on from the last committed page
+every row in a partial file is tagged with its page and batch, so a page that was written but not committed
+before a crash, and is written again by the restarted run, only keeps the rows of its latest batch
+
+memory use only depends on the batch size, not on the number of pages crawled
+once the crawl is complete the partial file is merged into the output file by copying it line by line
+the partial file is moved aside to a '.merging' file just before the merged file replaces the output file,
+so a crash during the merge is completed by the next run instead of merging the same rows twice
+
+the postgres sink writes the same batches with COPY into the raw staging tables of schema.sql instead,
+so downstream stages can read the staging tables without going through csv files
+
+'''
+
+# imports
+import csv
+import os
+import time
+import shutil
+import pandas as pd
+
+# import staging tables
+import staging
+from postgres import Postgres
+
+
+# columns identifying the page and batch of each row in a partial file
+PAGE_COLUMNS = ['_page', '_batch']
+
+
+
+class CsvSink:
+    '''
+    append rows of one or more tables to csv files in committed batches
+
+    arguments:
+    tables (dict): name of table to (path of output file, list of column names)
+    batch_size (int): number of pages to buffer before writing a batch
+    on_commit (function): called with a list of (url, tag) tuples after each batch is on disk
+    metrics (Metrics): optional collector of write metrics
+    '''
+
+    def _partial_path(self, name):
+        '''
+        path of the partial file of a table
+
+        arguments:
+        name (str): name of table
+
+        returns:
+        path of partial file
+        '''
+
+        return self._tables[name][0] + '.partial'
+
+    def _read_partial(self, partial_path):
+        '''
+        read the rows of a partial file without the columns identifying their page and batch
+        a page written more than once, because a batch was not committed before a crash,
+        only keeps the rows of its latest batch
+        the file is read twice instead of being loaded into memory
+
+        arguments:
+        partial_path (str): path of partial file
+
+        returns:
+        a generator of the header, then the rows, as lists of strings
+        '''
+
+        with open(partial_path, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            # partial files of earlier versions have no page columns
+            if header[:2] != PAGE_COLUMNS:
+                yield header
+                yield from reader
+                return
+
+            # latest batch of every page
+            latest = {}
+            for row in reader:
+                latest[row[0]] = max(latest.get(row[0], 0), int(row[1]))
+
+            f.seek(0)
+            reader = csv.reader(f)
+            next(reader)
+            yield header[2:]
+            for row in reader:
+                if int(row[1]) == latest[row[0]]:
+                    yield row[2:]
+
+    def _last_batch(self, partial_path):
+        '''
+        highest batch number in a partial file
+
+        arguments:
+        partial_path (str): path of partial file
+
+        returns:
+        highest batch number, 0 if the file has no tagged rows
+        '''
+
+        if not os.path.exists(partial_path):
+            return 0
+        with open(partial_path, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            # partial files of earlier versions have no page columns
+            if header is None or header[:2] != PAGE_COLUMNS:
+                return 0
+            return max((int(row[1]) for row in reader), default=0)
+
+    def _recover(self):
+        '''
+        complete merges interrupted by a crash
+        a '.merging' file means the merged file was complete when the partial file was moved aside,
+        so the merged file still has to replace the output file if it did not already
+        batches of a restarted run are numbered on from the highest batch in the partial files
+        '''
+
+        for name, (path, columns) in self._tables.items():
+            merging_path = path + '.merging'
+            if not os.path.exists(merging_path):
+                continue
+            tmp_path = path + '.tmp'
+            if os.path.exists(tmp_path):
+                os.replace(tmp_path, path)
+            os.remove(merging_path)
+
+        self._batch = max((self._last_batch(self._partial_path(name)) for name in self._tables), default=0)
+
+    def write(self, url, tag=None, **rows):
+        '''
+        buffer the rows parsed from one page
+        a batch is written once batch_size pages are buffered
+
+        arguments:
+        url (str): url of the page the rows were parsed from
+        tag (dict): passed back to on_commit with the url, e.g. a content hash
+        rows: name of table to rows, as a dataframe or a list of records
+        '''
+
+        for name, table_rows in rows.items():
+            # convert dataframe to records so buffering never copies a growing frame
+            if isinstance(table_rows, pd.DataFrame):
+                table_rows = list(table_rows.itertuples(index=False, name=None))
+            self._buffers[name].extend(table_rows)
+            self._pages[name].extend([url] * len(table_rows))
+        self._pending.append((url, tag or {}))
+
+        # write batch once it is full
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        append buffered rows to the partial files, sync them to disk and commit the batch
+        '''
+
+        if not self._pending:
+            return
+
+        # rows are tagged with their page and batch, see _read_partial()
+        self._batch += 1
+        batch = self._batch
+        for name, (path, columns) in self._tables.items():
+            start = time.perf_counter()
+            partial_path = self._partial_path(name)
+            # write header when starting a new partial file
+            write_header = not os.path.exists(partial_path)
+            with open(partial_path, 'a', newline='') as f:
+                df = pd.DataFrame(self._buffers[name], columns=columns)
+                df.insert(0, '_page', self._pages[name])
+                df.insert(1, '_batch', batch)
+                df.to_csv(f, header=write_header, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+            if self._metrics is not None:
+                self._metrics.record_write(name, time.perf_counter() - start, len(self._buffers[name]))
+            self._buffers[name] = []
+            self._pages[name] = []
+
+        # commit pages of batch
+        committed, self._pending = self._pending, []
+        if self._on_commit is not None:
+            self._on_commit(committed)
+
+    def finalize(self, new_first=True, dedupe_on=None):
+        '''
+        flush remaining rows and merge partial files into the output files
+        partial files left over from an earlier, interrupted run are merged as well
+        the partial file is moved aside before the output file is replaced, see _recover()
+
+        arguments:
+        new_first (bool): place new rows above existing rows, otherwise below
+        dedupe_on (list): columns identifying a row, new rows replace existing rows with the same values
+        '''
+
+        self.flush()
+
+        for name, (path, columns) in self._tables.items():
+            partial_path = self._partial_path(name)
+            if not os.path.exists(partial_path):
+                continue
+            tmp_path = path + '.tmp'
+
+            # deduplicating needs both files in memory
+            if dedupe_on is not None:
+                existing_df = pd.read_csv(path) if os.path.exists(path) else pd.DataFrame(columns=columns)
+                new_df = pd.read_csv(partial_path)
+                if list(new_df.columns[:2]) == PAGE_COLUMNS:
+                    latest = new_df.groupby('_page')['_batch'].transform('max')
+                    new_df = new_df[new_df['_batch'] == latest].drop(columns=PAGE_COLUMNS)
+                merged_df = pd.concat([new_df, existing_df] if new_first else [existing_df, new_df])
+                merged_df = merged_df.drop_duplicates(subset=dedupe_on, keep='first' if new_first else 'last')
+                with open(tmp_path, 'w', newline='') as out:
+                    merged_df.to_csv(out, index=False)
+                    out.flush()
+                    os.fsync(out.fileno())
+
+            # otherwise copy both files line by line, keeping a single header
+            else:
+                sources = [partial_path, path] if new_first else [path, partial_path]
+                with open(tmp_path, 'w', newline='') as out:
+                    pd.DataFrame(columns=columns).to_csv(out, index=False)
+                    for source in sources:
+                        if source == partial_path:
+                            rows = self._read_partial(partial_path)
+                            # skip header
+                            next(rows, None)
+                            # quoted like pandas' to_csv, which wrote the output file
+                            csv.writer(out, lineterminator=os.linesep).writerows(rows)
+                            continue
+                        if not os.path.exists(source):
+                            continue
+                        with open(source, 'r', newline='') as f:
+                            # skip header
+                            f.readline()
+                            shutil.copyfileobj(f, out)
+                    out.flush()
+                    os.fsync(out.fileno())
+
+            # from here on the merge is completed by _recover() if the run is interrupted
+            merging_path = path + '.merging'
+            os.replace(partial_path, merging_path)
+            os.replace(tmp_path, path)
+            os.remove(merging_path)
+
+    def __init__(self, tables, batch_size=100, on_commit=None, metrics=None):
+        self._tables = tables
+        self._batch_size = max(1, int(batch_size))
+        self._on_commit = on_commit
+        self._metrics = metrics
+        self._buffers = {name: [] for name in tables}
+        # url of the page of every buffered row
+        self._pages = {name: [] for name in tables}
+        self._pending = []
+        # number of the last batch written, set by _recover()
+        self._batch = 0
+        self._recover()
+
+
+
+class PostgresSink(CsvSink):
+    '''
+    append rows of one or more tables to raw staging tables with COPY in committed batches
+    all tables of a batch are copied in one transaction, so a batch is either fully loaded or not at all
+
+    arguments:
+    tables (dict): name of table to (path of output file, list of column names), the path is not used
+    batch_size (int): number of pages to buffer before writing a batch
+    on_commit (function): called with a list of (url, tag) tuples after each batch is committed
+    metrics (Metrics): optional collector of write metrics
+    pg (Postgres): database connection, defaults to a new connection pool
+    run (int): id of the scrape run, stored with every row
+    '''
+
+    def flush(self):
+        '''
+        copy buffered rows into the staging tables and commit the batch
+        '''
+
+        if not self._pending:
+            return
+
+        start = time.perf_counter()
+        copies = [
+            (staging.copy_statement(name, columns), staging.copy_data(self._buffers[name], columns, self._run))
+            for name, (path, columns) in self._tables.items()
+        ]
+        if not self._pg.copy_in(copies):
+            raise RuntimeError('could not copy batch into staging tables')
+        seconds = time.perf_counter() - start
+
+        for name in self._tables:
+            if self._metrics is not None:
+                self._metrics.record_write(name, seconds, len(self._buffers[name]))
+            self._buffers[name] = []
+            self._pages[name] = []
+
+        # commit pages of batch
+        committed, self._pending = self._pending, []
+        if self._on_commit is not None:
+            self._on_commit(committed)
+
+    def finalize(self, new_first=True, dedupe_on=None):
+        '''
+        flush remaining rows and drop replaced rows from the staging tables
+        rows are kept in the order they were written, readers list the latest run first where the csv file would
+
+        arguments:
+        new_first (bool): not used, the order is set per staging table
+        dedupe_on (list): columns identifying a row, new rows replace existing rows with the same values
+        '''
+
+        self.flush()
+
+        if dedupe_on is not None:
+            for name in self._tables:
+                staging.dedupe(name, dedupe_on, self._pg)
+
+    def __init__(self, tables, batch_size=100, on_commit=None, metrics=None, pg=None, run=None):
+        super().__init__(tables, batch_size, on_commit, metrics)
+        self._pg = pg if pg is not None else Postgres()
+        self._run = run if run is not None else int(time.time())
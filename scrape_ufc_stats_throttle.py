@@ -0,0 +1,367 @@
+'''
+Overview
+
+rate limiting, retries and circuit breaking for the fetcher
+
+every host gets a token bucket that sets how many requests per second are sent to it
+the rate adapts to how the host responds, it is halved on a throttled response (429 or 503)
+and slowly raised again while responses are fast, so the crawl runs as fast as the host allows
+a cap on requests in flight per host stops a burst of workers from piling onto one host
+
+failed requests are retried with jittered exponential backoff, honouring any Retry-After header
+if a host keeps failing, its circuit breaker opens and every request to it waits until the host
+has had time to recover, pausing the crawl instead of parsing error pages as data
+after too many trips in a row the breaker gives up and raises, so nothing is written from a broken host
+
+'''
+
+# imports
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+from contextlib import contextmanager
+
+
+
+# status codes that mean the host wants fewer requests
+THROTTLED_STATUS_CODES = {429, 503}
+# status codes worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+
+class FetchError(Exception):
+    '''
+    a page could not be fetched, either its response was not retryable or retries ran out
+    '''
+
+    def __init__(self, url, status_code=None, reason=None):
+        self.url = url
+        self.status_code = status_code
+        super().__init__('%s: %s' % (url, reason or 'status %s' % status_code))
+
+
+
+class CircuitOpenError(FetchError):
+    '''
+    a host kept failing after its circuit breaker tripped the maximum number of times
+    '''
+
+
+
+# get delay before a retry
+def backoff_delay(attempt, base=0.5, cap=30, retry_after=None):
+    '''
+    get delay before retrying a request, using exponential backoff with full jitter
+    the delay is a random number between 0 and base * 2^attempt, capped at cap
+    a Retry-After header sent by the host is used as the minimum delay
+
+    arguments:
+    attempt (int): number of attempts already made, starting at 0
+    base (float): seconds of the first backoff
+    cap (float): maximum seconds of backoff
+    retry_after (float): seconds the host asked to wait, if any
+
+    returns:
+    seconds to wait
+    '''
+
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(cap, retry_after))
+    return delay
+
+
+
+# parse Retry-After header
+def parse_retry_after(value):
+    '''
+    parse a Retry-After header given in seconds
+    dates are not used by ufcstats.com and are ignored
+
+    arguments:
+    value (str): value of header, may be None
+
+    returns:
+    seconds as a float, or None
+    '''
+
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+
+class TokenBucket:
+    '''
+    token bucket whose rate adapts to throttled responses and latency
+    additive increase while responses are fast, multiplicative decrease when throttled or slow
+    the rate is lowered at most once per second, as requests in flight when a host starts
+    throttling all come back throttled and only count as one signal
+
+    arguments:
+    rate (float): starting requests per second
+    burst (float): maximum tokens saved up while idle
+    min_rate (float): lowest requests per second
+    max_rate (float): highest requests per second
+    target_latency (float): seconds of latency above which the rate is lowered
+    increase (float): requests per second added after each fast response
+    '''
+
+    def acquire(self):
+        '''
+        take a token, waiting until one is available
+        tokens are reserved in the order of calls, so waiting threads are served fairly
+        '''
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._cfg['burst'], self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def record(self, throttled, latency=None):
+        '''
+        adapt the rate to a response
+
+        arguments:
+        throttled (bool): the host asked for fewer requests
+        latency (float): seconds the response took, if there was one
+        '''
+
+        with self._lock:
+            now = time.monotonic()
+            if throttled or (latency is not None and latency > self._cfg['target_latency']):
+                if now - self._last_decrease >= 1:
+                    self.rate = max(self._cfg['min_rate'], self.rate * (0.5 if throttled else 0.9))
+                    self._last_decrease = now
+            else:
+                self.rate = min(self._cfg['max_rate'], self.rate + self._cfg['increase'])
+
+    def __init__(self, rate=10, burst=10, min_rate=0.5, max_rate=50, target_latency=2.0, increase=0.5):
+        self._cfg = {
+            'burst': max(1.0, float(burst)),
+            'min_rate': float(min_rate),
+            'max_rate': float(max_rate),
+            'target_latency': float(target_latency),
+            'increase': float(increase),
+        }
+        self.rate = min(max(float(rate), self._cfg['min_rate']), self._cfg['max_rate'])
+        self._tokens = self._cfg['burst']
+        self._last = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+
+
+class CircuitBreaker:
+    '''
+    circuit breaker for one host
+    opens after a number of failures in a row and stays open for a cooldown,
+    every trip in a row doubles the cooldown, a success closes the breaker again
+
+    arguments:
+    failure_threshold (int): failures in a row that open the breaker
+    cooldown (float): seconds the breaker stays open after the first trip
+    max_trips (int): trips in a row after which the host is given up on
+    '''
+
+    def wait(self, url):
+        '''
+        wait until the breaker lets a request through
+
+        arguments:
+        url (str): url about to be requested, used in the error
+
+        returns:
+        seconds waited
+        '''
+
+        with self._lock:
+            if self._trips >= self._cfg['max_trips']:
+                raise CircuitOpenError(url, reason='circuit breaker open after %d trips' % self._trips)
+            wait = self._open_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+            return wait
+        return 0
+
+    def record(self, success):
+        '''
+        record the outcome of a request
+
+        arguments:
+        success (bool): the request got a usable response
+        '''
+
+        with self._lock:
+            if success:
+                self._failures = 0
+                self._trips = 0
+                return
+            # requests sent before the breaker opened are still failing, they are not a new trip
+            if time.monotonic() < self._open_until:
+                return
+            self._failures += 1
+            if self._failures >= self._cfg['failure_threshold']:
+                # after the cooldown a single failure trips the breaker again
+                self._failures = self._cfg['failure_threshold'] - 1
+                self._open_until = time.monotonic() + self._cfg['cooldown'] * 2 ** self._trips
+                self._trips += 1
+
+    @property
+    def is_open(self):
+        return time.monotonic() < self._open_until
+
+    def __init__(self, failure_threshold=10, cooldown=30, max_trips=5):
+        self._cfg = {
+            'failure_threshold': max(1, int(failure_threshold)),
+            'cooldown': float(cooldown),
+            'max_trips': max(1, int(max_trips)),
+        }
+        self._failures = 0
+        self._trips = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+
+
+class Throttle:
+    '''
+    per-host rate limits, concurrency caps, circuit breakers and retry policy used by the fetcher
+
+    arguments:
+    rate (float): starting requests per second per host
+    burst (float): requests a host can get at once after being idle
+    min_rate (float): lowest requests per second per host
+    max_rate (float): highest requests per second per host
+    target_latency (float): seconds of latency above which the rate is lowered
+    increase (float): requests per second added after each fast response
+    max_per_host (int): requests in flight per host
+    retries (int): retries of a failed request
+    backoff_base (float): seconds of the first backoff
+    backoff_max (float): maximum seconds of backoff
+    failure_threshold (int): failures in a row that open a host's circuit breaker
+    cooldown (float): seconds a circuit breaker stays open after its first trip
+    max_trips (int): circuit breaker trips in a row after which the crawl stops
+    '''
+
+    def _host(self, url):
+        '''
+        get limits of the host of a url, creating them on first use
+
+        arguments:
+        url (str): url of page
+
+        returns:
+        dict of bucket, semaphore and breaker
+        '''
+
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = {
+                    'bucket': TokenBucket(**self._bucket_cfg),
+                    'semaphore': threading.BoundedSemaphore(self._cfg['max_per_host']),
+                    'breaker': CircuitBreaker(**self._breaker_cfg),
+                }
+        return self._hosts[host]
+
+    @contextmanager
+    def slot(self, url):
+        '''
+        wait for the circuit breaker, a token and a free slot of the host before sending a request
+
+        arguments:
+        url (str): url about to be requested
+        '''
+
+        host = self._host(url)
+        host['breaker'].wait(url)
+        host['bucket'].acquire()
+        with host['semaphore']:
+            yield
+
+    def record(self, url, status_code=None, latency=None):
+        '''
+        record the outcome of a request
+        a status_code of None means the request failed without a response
+
+        arguments:
+        url (str): url that was requested
+        status_code (int): status code of the response
+        latency (float): seconds the response took
+        '''
+
+        host = self._host(url)
+        host['bucket'].record(status_code in THROTTLED_STATUS_CODES, latency)
+        host['breaker'].record(status_code is not None and status_code not in RETRY_STATUS_CODES)
+
+    def should_retry(self, attempt, status_code=None):
+        '''
+        check if a request should be retried
+        requests without a response, i.e. connection errors and timeouts, are retried
+
+        arguments:
+        attempt (int): number of attempts already made, starting at 0
+        status_code (int): status code of the response
+
+        returns:
+        True if the request should be retried
+        '''
+
+        return attempt < self._cfg['retries'] and (status_code is None or status_code in RETRY_STATUS_CODES)
+
+    def backoff(self, attempt, retry_after=None):
+        '''
+        wait before retrying a request
+
+        arguments:
+        attempt (int): number of attempts already made, starting at 0
+        retry_after (float): seconds the host asked to wait, if any
+        '''
+
+        time.sleep(backoff_delay(attempt, self._cfg['backoff_base'], self._cfg['backoff_max'], retry_after))
+
+    def rate(self, url):
+        '''
+        get current requests per second of the host of a url
+
+        arguments:
+        url (str): url of page
+
+        returns:
+        requests per second
+        '''
+
+        return self._host(url)['bucket'].rate
+
+    def __init__(self, rate=10, burst=10, min_rate=0.5, max_rate=50, target_latency=2.0, increase=0.5,
+                 max_per_host=8, retries=5, backoff_base=0.5, backoff_max=30,
+                 failure_threshold=10, cooldown=30, max_trips=5):
+        self._cfg = {
+            'max_per_host': max(1, int(max_per_host)),
+            'retries': max(0, int(retries)),
+            'backoff_base': float(backoff_base),
+            'backoff_max': float(backoff_max),
+        }
+        self._bucket_cfg = {
+            'rate': rate,
+            'burst': burst,
+            'min_rate': min_rate,
+            'max_rate': max_rate,
+            'target_latency': target_latency,
+            'increase': increase,
+        }
+        self._breaker_cfg = {
+            'failure_threshold': failure_threshold,
+            'cooldown': cooldown,
+            'max_trips': max_trips,
+        }
+        self._hosts = {}
+        self._lock = threading.Lock()
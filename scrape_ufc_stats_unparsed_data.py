@@ -3,22 +3,39 @@ Overview
 run the notebook 'scape_ufc_stats_all_historical_data.ipynb' first to parse all available past fight data
 and the notebook ' scrape_ufc_stats_fighter_tott.ipynb' to parse all available fighter data
 
-this code checks existing files for previously parsed data
-if there are no new or unparsed events, script stops
+this code checks the crawl manifest for previously parsed pages
+if there are no new or unparsed events, fights or fighters, script stops
 
 if there are any unparsed events, script continues with parsing
 combine new data and existing data into one and write to file
 
+the crawl manifest records every event, fight and fighter url that has been parsed
+on the first run it is seeded from the existing data files
+fighters are only parsed again when their row on the fighter listing changes, i.e. they have fought since
+
 this notebook can be run manually when desired
 the script, 'scrape_ufc_stats_unparsed_data.py' is the same code that can be set to run on a schedule
 """
 
 # imports
+import os
+import time
+import functools
 import pandas as pd
 from tqdm import tqdm
 
 # import library
 import scrape_ufc_stats_library as LIB
+from scrape_ufc_stats_fetcher import Fetcher
+from scrape_ufc_stats_throttle import Throttle
+import scrape_ufc_stats_pipeline as PIPE
+from scrape_ufc_stats_pipeline import Pipeline
+from scrape_ufc_stats_cache import ResponseCache
+from scrape_ufc_stats_manifest import CrawlManifest, content_hash
+from scrape_ufc_stats_sink import CsvSink, PostgresSink
+import staging
+from postgres import Postgres
+from scrape_ufc_stats_metrics import Metrics
 
 # import config
 import yaml
@@ -26,211 +43,340 @@ import yaml
 config = yaml.safe_load(open("scrape_ufc_stats_config.yaml"))
 
 
-### check if there are any unparsed events ###
-
-# read existing event details
-parsed_event_details_df = pd.read_csv(config["event_details_file_name"])
-# get list of parsed event names
-list_of_parsed_events = list(parsed_event_details_df["EVENT"])
-
-# get soup
-soup = LIB.get_soup(config["completed_events_all_url"])
-# parse event details
-updated_event_details_df = LIB.parse_event_details(soup)
-# get list of all event names
-list_of_all_events = list(updated_event_details_df["EVENT"])
-
-# find list event names that have not been parsed
-list_of_unparsed_events = [
-    event for event in list_of_all_events if event not in list_of_parsed_events
-]
-
-# check if there are any unparsed events
-unparsed_events = False
-# if list_of_unparsed_events is empty then all available events have been parsed
-if not list_of_unparsed_events:
-    print("All available events have been parsed.")
-else:
-    # set unparsed_events to true
-    unparsed_events = True
-    # show list of unparsed events
-    print(list_of_unparsed_events)
-    # write event details to file
-    updated_event_details_df.to_csv(config["event_details_file_name"], index=False)
-
-
-### parse all missing events ###
-# if unparsed_events = True
-# the code below continues to run to parse all missing events
-# new data is added to existing data and is written to file
-
-if unparsed_events == True:
-    # read existing data files
-    parsed_fight_details_df = pd.read_csv(config["fight_details_file_name"])
-    parsed_fight_results_df = pd.read_csv(config["fight_results_file_name"])
-    parsed_fight_stats_df = pd.read_csv(config["fight_stats_file_name"])
-
-    ### parse fight details ###
-
-    # define list of urls of missing fights to parse
-    list_of_unparsed_events_urls = list(
-        updated_event_details_df["URL"].loc[
-            (updated_event_details_df["EVENT"].isin(list_of_unparsed_events))
-        ]
-    )
-
-    # create empty df to store fight details
-    unparsed_fight_details_df = pd.DataFrame(
-        columns=config["fight_details_column_names"]
+def scrape(metrics):
+    # set html parser backend
+    LIB.set_html_parser(config["html_parser"], config["restricted_parse"])
+
+    # create response cache
+    # set SCRAPE_CACHE_MODE=replay to run from cached pages only
+    cache_mode = os.environ.get("SCRAPE_CACHE_MODE", config["cache_mode"])
+    cache = None
+    if cache_mode != "off":
+        cache = ResponseCache(config["cache_dir"], cache_mode, config["cache_ttl"])
+
+    # create fetcher shared by every loop
+    # pages are fetched concurrently over one keep-alive connection pool
+    # the throttle adapts the request rate to the host and retries failed requests
+    # if the host keeps failing the crawl pauses, and stops before anything is written from error pages
+    # a single page that cannot be fetched is skipped and left for the next run
+    fetcher = Fetcher(
+        max_workers=config["max_workers"],
+        timeout=config["request_timeout"],
+        cache=cache,
+        throttle=Throttle(**config["throttle"]),
+        metrics=metrics,
     )
 
-    # loop through each event and parse fight details
-    for url in tqdm(list_of_unparsed_events_urls):
-
-        # get soup
-        soup = LIB.get_soup(url)
-
-        # parse fight links
-        fight_details_df = LIB.parse_fight_details(soup)
-
-        # concat fight details to parsed fight details
-        # concat update fight details to the top of existing df
-        unparsed_fight_details_df = pd.concat(
-            [unparsed_fight_details_df, fight_details_df]
+    # the workers are shut down also when the crawl fails, e.g. once the circuit breaker opens
+    pipeline = None
+    try:
+        # create pipeline of fetch, parse and write stages
+        # pages are parsed in a pool of worker processes while later pages are being fetched
+        pipeline = Pipeline(
+            fetcher,
+            config,
+            parse_workers=config["parse_workers"],
+            queue_size=config["parse_queue_size"],
+            metrics=metrics,
         )
 
-    # concat unparsed and parsed fight details
-    parsed_fight_details_df = pd.concat(
-        [unparsed_fight_details_df, parsed_fight_details_df]
-    )
-
-    # write fight details to file
-    parsed_fight_details_df.to_csv(config["fight_details_file_name"], index=False)
-
-    ### parse fight results and fight stats
-
-    # define list of urls of fights to parse
-    list_of_unparsed_fight_details_urls = list(unparsed_fight_details_df["URL"])
-
-    # create empty df to store fight results
-    unparsed_fight_results_df = pd.DataFrame(
-        columns=config["fight_results_column_names"]
-    )
-    # create empty df to store fight stats
-    unparsed_fight_stats_df = pd.DataFrame(columns=config["fight_stats_column_names"])
-
-    # loop through each fight and parse fight results and stats
-    for url in tqdm(list_of_unparsed_fight_details_urls):
-
-        # get soup
-        soup = LIB.get_soup(url)
-
-        # parse fight results and fight stats
-        fight_results_df, fight_stats_df = LIB.parse_organise_fight_results_and_stats(
-            soup,
-            url,
-            config["fight_results_column_names"],
-            config["totals_column_names"],
-            config["significant_strikes_column_names"],
+        # choose where scraped rows go, csv files or the raw staging tables of schema.sql
+        # set DATA_SOURCE=postgres to load staging tables with COPY instead of writing csv files
+        data_source = os.environ.get("DATA_SOURCE", config["data_source"])
+        # rows written by this run are tagged with the time it started
+        run = int(time.time())
+        pg = None
+        Sink = CsvSink
+        if data_source == "postgres":
+            pg = Postgres()
+            Sink = functools.partial(PostgresSink, pg=pg, run=run)
+
+        # read a scraped table from its csv file or staging table
+        def load_table(name, usecols=None):
+            return staging.read(
+                name, config[name + "_file_name"], usecols, source=data_source, pg=pg
+            )
+
+        # replace a scraped table in its csv file or staging table
+        def save_table(name, df):
+            if data_source == "postgres":
+                staging.replace(name, df, run, pg)
+            else:
+                df.to_csv(config[name + "_file_name"], index=False)
+
+        # load crawl manifest
+        manifest = CrawlManifest(config["manifest_file_name"])
+
+        # commit pages written by a sink to the crawl manifest
+        def commit_to_manifest(committed):
+            # mark each page as done, with its content hash and listing signature if any
+            for url, tag in committed:
+                manifest.mark(url, **tag)
+            # checkpoint manifest, a restarted run resumes after the last committed page
+            manifest.save()
+
+        # skip a page that could not be fetched, e.g. a 404 or a page still failing after its retries
+        # it is marked as failed in the manifest, so the next run tries it again
+        # listing pages are not skipped, as the tables built from them have to be complete
+        def skip_failed(url, error):
+            print("Skipped page that could not be fetched:", error)
+            manifest.mark(url, status="failed")
+            manifest.save()
+
+        ### seed crawl manifest from existing data files ###
+        # only runs once, when there is no manifest yet
+
+        if not manifest.exists:
+            # events are done once their fights have been written to fight details
+            seed_event_details_df = load_table("event_details")
+            seed_fight_details_df = load_table("fight_details")
+            manifest.seed(
+                seed_event_details_df["URL"].loc[
+                    seed_event_details_df["EVENT"].isin(
+                        set(seed_fight_details_df["EVENT"])
+                    )
+                ]
+            )
+            # fights are done once their results have been written
+            manifest.seed(load_table("fight_results")["URL"])
+            # fighters are done once their tale of the tape has been written
+            manifest.seed(load_table("fighter_tott")["URL"])
+            manifest.save()
+
+        ### check if there are any unparsed events ###
+
+        # get and parse event details
+        url, content, updated_event_details_df = next(
+            pipeline.map([config["completed_events_all_url"]], PIPE.parse_event_listing)
         )
 
-        # concat fight results
-        unparsed_fight_results_df = pd.concat(
-            [unparsed_fight_results_df, fight_results_df]
+        # find list of event urls that have not been parsed
+        list_of_unparsed_events_urls = manifest.pending(updated_event_details_df["URL"])
+
+        # check if there are any unparsed events
+        unparsed_events = False
+        # if list_of_unparsed_events_urls is empty then all available events have been parsed
+        if not list_of_unparsed_events_urls:
+            print("All available events have been parsed.")
+        else:
+            # set unparsed_events to true
+            unparsed_events = True
+            # show list of unparsed events
+            print(
+                list(
+                    updated_event_details_df["EVENT"].loc[
+                        updated_event_details_df["URL"].isin(
+                            set(list_of_unparsed_events_urls)
+                        )
+                    ]
+                )
+            )
+            # write event details to file
+            save_table("event_details", updated_event_details_df)
+
+        ### parse all missing events ###
+        # if unparsed_events = True
+        # the code below continues to run to parse all missing events
+        # new data is added to existing data and is written to file
+
+        # create sink for fight details
+        # rows are appended in batches and each event is committed once its fights are on disk
+        fight_details_sink = Sink(
+            {
+                "fight_details": (
+                    config["fight_details_file_name"],
+                    config["fight_details_column_names"],
+                )
+            },
+            batch_size=config["sink_batch_size"],
+            on_commit=commit_to_manifest,
+            metrics=metrics,
         )
-        # concat fight stats
-        unparsed_fight_stats_df = pd.concat([unparsed_fight_stats_df, fight_stats_df])
 
-    # concat unparsed fight results and fight stats to parsed fight results and fight stats
-    parsed_fight_results_df = pd.concat(
-        [unparsed_fight_results_df, parsed_fight_results_df]
-    )
-    parsed_fight_stats_df = pd.concat([unparsed_fight_stats_df, parsed_fight_stats_df])
+        if unparsed_events == True:
+            ### parse fight details ###
 
-    # write to file
-    parsed_fight_results_df.to_csv(config["fight_results_file_name"], index=False)
-    # write to file
-    parsed_fight_stats_df.to_csv(config["fight_stats_file_name"], index=False)
+            # loop through each event and parse fight details
+            # pages are fetched concurrently, parsed in worker processes and returned in order of urls
+            for url, content, fight_details_records in tqdm(
+                pipeline.map(
+                    list_of_unparsed_events_urls, PIPE.parse_event, on_error=skip_failed
+                ),
+                total=len(list_of_unparsed_events_urls),
+            ):
 
+                # write fight details to sink
+                fight_details_sink.write(url, fight_details=fight_details_records)
 
-### check if there are any unparsed fighters ###
+        # merge new fight details into file
+        # new fight details go to the top of existing file
+        fight_details_sink.finalize(new_first=True)
 
-# read existing fighter details
-parsed_fighter_details_df = pd.read_csv(config["fighter_details_file_name"])
-# get list of parsed fighter urls
-# list_of_parsed_urls = list(parsed_fighter_details_df['URL'])
-list_of_parsed_urls = []
+        ### parse fight results and fight stats
 
-# generate list of urls for fighter details
-list_of_alphabetical_urls = LIB.generate_alphabetical_urls()
-
-# create empty dataframe to store all fighter details
-all_fighter_details_df = pd.DataFrame()
+        # define list of urls of fights to parse
+        # includes fights of earlier runs that did not finish
+        list_of_unparsed_fight_details_urls = manifest.pending(
+            load_table("fight_details", usecols=["URL"])["URL"]
+        )
 
-# loop through list of alphabetical urls
-for url in tqdm(list_of_alphabetical_urls):
-    # get soup
-    soup = LIB.get_soup(url)
-    # parse fighter details
-    fighter_details_df = LIB.parse_fighter_details(
-        soup, config["fighter_details_column_names"]
-    )
-    # concat fighter_details_df to all_fighter_details_df
-    all_fighter_details_df = pd.concat([all_fighter_details_df, fighter_details_df])
-
-# get all fighter urls
-unparsed_fighter_urls = list(all_fighter_details_df["URL"])
-
-# get list of unparsed fighter urls
-list_of_unparsed_fighter_urls = [
-    url for url in unparsed_fighter_urls if url not in list_of_parsed_urls
-]
-
-# check if there are any unparsed fighters
-unparsed_fighters = False
-# if list_of_unparsed_fighter_urls is empty then all available fighters have been parsed
-if not list_of_unparsed_fighter_urls:
-    print("All available fighters have been parsed.")
-else:
-    # set unparsed_fighters to true
-    unparsed_fighters = True
-    # show list of unparsed events
-    print(list_of_unparsed_fighter_urls)
-    # write event details to file
-    all_fighter_details_df.to_csv(config["fighter_details_file_name"], index=False)
-
-
-### parse all missing fighters ###
-# if unparsed_fighters = True
-# the code below continues to run to parse all missing fighters
-# new data is added to existing data and is written to file
-
-if unparsed_fighters == True:
-
-    # read existing data files
-    parsed_fighter_tott_df = pd.read_csv(config["fighter_tott_file_name"])
-
-    # create empty df to store fighters' tale of the tape
-    unparsed_fighter_tott_df = pd.DataFrame(columns=config["fighter_tott_column_names"])
-
-    # loop through list_of_fighter_urls
-    for url in tqdm(list_of_unparsed_fighter_urls):
-        # get soup
-        soup = LIB.get_soup(url)
-        # parse fighter tale of the tape
-        fighter_tott = LIB.parse_fighter_tott(soup)
-        # organise fighter tale of the tape
-        fighter_tott_df = LIB.organise_fighter_tott(
-            fighter_tott, config["fighter_tott_column_names"], url
+        # create sink for fight results and fight stats
+        # both tables of a fight are committed together
+        fights_sink = Sink(
+            {
+                "fight_results": (
+                    config["fight_results_file_name"],
+                    config["fight_results_column_names"],
+                ),
+                "fight_stats": (
+                    config["fight_stats_file_name"],
+                    config["fight_stats_column_names"],
+                ),
+            },
+            batch_size=config["sink_batch_size"],
+            on_commit=commit_to_manifest,
+            metrics=metrics,
         )
-        # concat fighter
-        unparsed_fighter_tott_df = pd.concat(
-            [unparsed_fighter_tott_df, fighter_tott_df]
+
+        if list_of_unparsed_fight_details_urls:
+            # loop through each fight and parse fight results and stats
+            # pages are fetched concurrently, parsed in worker processes and returned in order of urls
+            # records go to the sink as they are, dfs are only built when a batch is written
+            for url, content, (fight_results_records, fight_stats_records) in tqdm(
+                pipeline.map(
+                    list_of_unparsed_fight_details_urls,
+                    PIPE.parse_fight,
+                    on_error=skip_failed,
+                ),
+                total=len(list_of_unparsed_fight_details_urls),
+            ):
+
+                # write fight results and fight stats to sink
+                fights_sink.write(
+                    url,
+                    {"digest": content_hash(content)},
+                    fight_results=fight_results_records,
+                    fight_stats=fight_stats_records,
+                )
+
+        # merge new fight results and fight stats into files
+        # new rows go to the top of existing files
+        fights_sink.finalize(new_first=True)
+
+        ### check if there are any unparsed fighters ###
+
+        # generate list of urls for fighter details
+        list_of_alphabetical_urls = LIB.generate_alphabetical_urls(config["base_url"])
+
+        # create empty list to store fighter details of each listing page
+        all_fighter_details_dfs = []
+        # create empty dict to store signature of each fighter's listing row
+        fighter_signatures = {}
+
+        # loop through list of alphabetical urls
+        # pages are fetched concurrently, parsed in worker processes and returned in order of urls
+        for url, content, (fighter_details_df, signatures) in tqdm(
+            pipeline.map(list_of_alphabetical_urls, PIPE.parse_fighter_listing),
+            total=len(list_of_alphabetical_urls),
+        ):
+            # append fighter_details_df to all_fighter_details_dfs
+            all_fighter_details_dfs.append(fighter_details_df)
+            # add signatures of fighters' listing rows
+            fighter_signatures.update(signatures)
+
+        # concat fighter details of all listing pages
+        all_fighter_details_df = pd.concat(all_fighter_details_dfs)
+
+        # fighters seeded from existing files adopt their current signature
+        manifest.sign(fighter_signatures)
+
+        # get list of unparsed fighter urls
+        # a fighter is unparsed if they are new or their listing row has changed
+        list_of_unparsed_fighter_urls = [
+            url
+            for url in dict.fromkeys(all_fighter_details_df["URL"])
+            if manifest.changed(url, fighter_signatures.get(url))
+        ]
+
+        # check if there are any unparsed fighters
+        unparsed_fighters = False
+        # if list_of_unparsed_fighter_urls is empty then all available fighters have been parsed
+        if not list_of_unparsed_fighter_urls:
+            print("All available fighters have been parsed.")
+        else:
+            # set unparsed_fighters to true
+            unparsed_fighters = True
+            # show list of unparsed events
+            print(list_of_unparsed_fighter_urls)
+            # write event details to file
+            save_table("fighter_details", all_fighter_details_df)
+
+        ### parse all missing fighters ###
+        # if unparsed_fighters = True
+        # the code below continues to run to parse all missing fighters
+        # new data is added to existing data and is written to file
+
+        # create sink for fighters' tale of the tape
+        fighter_tott_sink = Sink(
+            {
+                "fighter_tott": (
+                    config["fighter_tott_file_name"],
+                    config["fighter_tott_column_names"],
+                )
+            },
+            batch_size=config["sink_batch_size"],
+            on_commit=commit_to_manifest,
+            metrics=metrics,
         )
 
-    # concat unparsed fighter tale of the tape to parsed fighter tale of the tape
-    parsed_fighter_tott_df = pd.concat(
-        [parsed_fighter_tott_df, unparsed_fighter_tott_df]
-    )
-    # write to file
-    parsed_fighter_tott_df.to_csv(config["fighter_tott_file_name"], index=False)
+        if unparsed_fighters == True:
+
+            # loop through list_of_fighter_urls
+            # pages are fetched concurrently, parsed in worker processes and returned in order of urls
+            for url, content, fighter_tott_records in tqdm(
+                pipeline.map(
+                    list_of_unparsed_fighter_urls,
+                    PIPE.parse_fighter,
+                    on_error=skip_failed,
+                ),
+                total=len(list_of_unparsed_fighter_urls),
+            ):
+                # write fighter to sink
+                # committed with the signature of their listing row
+                fighter_tott_sink.write(
+                    url,
+                    {
+                        "digest": content_hash(content),
+                        "signature": fighter_signatures.get(url),
+                    },
+                    fighter_tott=fighter_tott_records,
+                )
+
+        # merge new fighters into file
+        # new fighters go below existing fighters and fighters parsed again replace their previous tale of the tape
+        fighter_tott_sink.finalize(new_first=False, dedupe_on=["URL"])
+
+        # save signatures adopted by seeded fighters
+        manifest.save()
+    finally:
+        # shut down parse workers, fetch workers and close pooled connections
+        # fetches and parses that have not started yet are cancelled
+        if pipeline is not None:
+            pipeline.close()
+        fetcher.close()
+
+
+def main():
+    # collect request, parse and write metrics of the run
+    metrics = Metrics()
+    try:
+        scrape(metrics)
+    finally:
+        # write metrics, also when the run failed
+        metrics.save(config["metrics_file_name"])
+        print(metrics.summary_table().to_string(index=False, float_format="%.4g"))
+
+
+# parse workers import this module, so only scrape when run as a script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import io
+import os
+import pandas as pd
+
+from dotenv import load_dotenv
+from postgres import Postgres
+
+load_dotenv()
+
+# where scraped data is written and read, "csv" files or "postgres" staging tables
+SOURCE = os.environ.get("DATA_SOURCE", "csv")
+
+# scraped tables and their raw staging tables from schema.sql
+# staging tables mirror the csv files, every column is text and named after the csv header,
+# "_run" is the scrape run that wrote a row and "_row" the order rows were written in
+# tables with new_first list the rows of the latest run first, the same as their csv files
+TABLES = {
+    "event_details": {"table": "raw_event_details", "new_first": False},
+    "fight_details": {"table": "raw_fight_details", "new_first": True},
+    "fight_results": {"table": "raw_fight_results", "new_first": True},
+    "fight_stats": {"table": "raw_fight_stats", "new_first": True},
+    "fighter_details": {"table": "raw_fighter_details", "new_first": False},
+    "fighter_tott": {"table": "raw_fighter_tott", "new_first": False},
+}
+
+
+def _quote(columns: list[str]) -> str:
+    return ", ".join('"%s"' % col for col in columns)
+
+
+def copy_statement(name: str, columns: list[str]) -> str:
+    return 'COPY "%s" (%s) FROM STDIN WITH CSV' % (
+        TABLES[name]["table"],
+        _quote(list(columns) + ["_run"]),
+    )
+
+
+def copy_data(rows: list[tuple] | pd.DataFrame, columns: list[str], run: int) -> str:
+    # csv data of rows for copy_statement(), missing values become NULL
+    df = pd.DataFrame(rows, columns=columns)
+    df["_run"] = run
+    return df.to_csv(header=False, index=False)
+
+
+def read(
+    name: str,
+    path: str,
+    usecols: list[str] | None = None,
+    source: str | None = None,
+    pg: Postgres | None = None,
+) -> pd.DataFrame:
+    if (source or SOURCE) != "postgres":
+        return pd.read_csv(path, usecols=usecols)
+
+    # read the staging table back as csv, so values are parsed exactly like the csv file
+    order = '"_run" DESC, "_row"' if TABLES[name]["new_first"] else '"_row"'
+    data = (pg or Postgres()).copy_out(
+        'COPY (SELECT %s FROM "%s" ORDER BY %s) TO STDOUT WITH CSV HEADER'
+        % (_quote(usecols) if usecols else "*", TABLES[name]["table"], order)
+    )
+    if data is None:
+        raise RuntimeError("could not read staging table %s" % TABLES[name]["table"])
+    return pd.read_csv(io.StringIO(data)).drop(
+        columns=["_run", "_row"], errors="ignore"
+    )
+
+
+def fingerprint(
+    name: str,
+    path: str,
+    source: str | None = None,
+    pg: Postgres | None = None,
+) -> str:
+    # changes whenever the data read() returns may have changed, without reading it
+    if (source or SOURCE) != "postgres":
+        stat = os.stat(path)
+        return "csv %s %d %d" % (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    # every write copies rows in with new "_row" values, and dedupe() deletes rows
+    table = TABLES[name]["table"]
+    row = (pg or Postgres()).row('SELECT count(*), max("_row") FROM "%s"' % table)
+    if row is None:
+        raise RuntimeError("could not read staging table %s" % table)
+    return "postgres %s %s %s" % (table, row[0], row[1])
+
+
+def replace(name: str, df: pd.DataFrame, run: int, pg: Postgres | None = None) -> None:
+    # replace every row of a staging table, the same as overwriting its csv file
+    copied = (pg or Postgres()).copy_in(
+        [(copy_statement(name, df.columns), copy_data(df, df.columns, run))],
+        [('TRUNCATE "%s"' % TABLES[name]["table"], None)],
+    )
+    if not copied:
+        raise RuntimeError("could not replace staging table %s" % TABLES[name]["table"])
+
+
+def dedupe(name: str, keys: list[str], pg: Postgres | None = None) -> None:
+    # keep only the latest row of each key
+    table = TABLES[name]["table"]
+    conditions = " AND ".join('a."%s" = b."%s"' % (key, key) for key in keys)
+    deduped = (pg or Postgres()).copy_in(
+        [],
+        [
+            (
+                'DELETE FROM "%s" a USING "%s" b WHERE %s AND a."_row" < b."_row"'
+                % (table, table, conditions),
+                None,
+            )
+        ],
+    )
+    if not deduped:
+        raise RuntimeError("could not dedupe staging table %s" % table)
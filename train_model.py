@@ -1,13 +1,18 @@
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
 from sklearn.metrics import accuracy_score
 import xgboost as xgb
 from hyperopt import hp, STATUS_OK, tpe, Trials, fmin
 
-df = pd.read_csv("fighter_stats.csv")
+# only the date, outcome and features are read from the feature matrix
+features = [
+    col for col in pq.read_schema("fighter_stats.parquet").names if "precomp" in col
+]
+df = pd.read_parquet("fighter_stats.parquet", columns=["date", "outcome"] + features)
 
-subset = df.loc[(df["date"] > "2015-12-31")]
-test_df = subset.loc[(df["date"] > "2022-11-31")]
+subset = df.loc[(df["date"] > pd.Timestamp("2015-12-31"))]
+test_df = subset.loc[(df["date"] >= pd.Timestamp("2022-12-01"))]
 train_df = subset.drop(test_df.index)
 y_test = test_df["outcome"]
 X_test = test_df.filter(like="precomp")